@@ -7,9 +7,10 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, select, text, update
 from sqlalchemy.orm import sessionmaker
-from server.models import Base, User, Topic
+from server.models import Base, User, Topic, Answer, CodeFingerprint
+from server.services.submission_totals import recompute_statement
 from shared.constants import ROLE_LECTURER, ROLE_STUDENT
 import bcrypt
 from dotenv import load_dotenv
@@ -19,6 +20,34 @@ load_dotenv()
 DATABASE_PATH = os.getenv("DATABASE_PATH", "database/assessment.db")
 
 
+def add_missing_columns(engine):
+    """
+    Add columns introduced after a database was created (create_all only creates tables).
+    
+    Returns:
+        The added columns as "table.column"
+    """
+    added = []
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = f'"{column.name}" {column.type.compile(engine.dialect)}'
+                if column.default is not None and column.default.is_scalar:
+                    definition += f" DEFAULT {column.default.arg!r}"
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {definition}'))
+                print(f"Added column {table.name}.{column.name}")
+                added.append(f"{table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
+
+
 def init_database():
     """Initialize the database with schema."""
     # Create database directory if it doesn't exist
@@ -29,6 +58,18 @@ def init_database():
     # Create engine and tables
     engine = create_engine(f"sqlite:///{DATABASE_PATH}", echo=False)
     Base.metadata.create_all(engine)
+    added = add_missing_columns(engine)
+    if "submissions.total_score" in added:
+        # Fill in the running totals of existing submissions
+        with engine.begin() as connection:
+            connection.execute(recompute_statement())
+        print("Computed score totals of existing submissions")
+    if "answers.similarity_indexed" in added:
+        # Answers with fingerprints are indexed already
+        with engine.begin() as connection:
+            connection.execute(update(Answer).where(
+                Answer.id.in_(select(CodeFingerprint.answer_id))
+            ).values(similarity_indexed=True))
     
     # Create session
     Session = sessionmaker(bind=engine)
@@ -63,7 +104,7 @@ def init_database():
         print("  Username: admin")
         print("  Password: admin")
         print("  (Please change the password after first login)")
-        
+    
     except Exception as e:
         session.rollback()
         print(f"Error initializing database: {e}")
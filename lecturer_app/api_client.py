@@ -83,10 +83,81 @@ class LecturerAPIClient(APIClient):
             data['feedback'] = feedback
         return self._make_request('PUT', f"{API_BASE}/grading/answers/{answer_id}", data)
     
+    def get_question_answers(self, test_id, question_id, after=None, limit=None, fields=None):
+        """Get a page of the submitted answers to one question of a test."""
+        params = {}
+        if after is not None:
+            params['after'] = after
+        if limit is not None:
+            params['limit'] = limit
+        if fields:
+            params['fields'] = ','.join(fields)
+        return self._make_request('GET', f"{API_BASE}/grading/tests/{test_id}/questions/{question_id}/answers", params)
+    
+    def get_answer_clusters(self, test_id, question_id, near=False, threshold=None):
+        """Get the clusters of equivalent answers to one question of a test."""
+        params = {'near': 1} if near else {}
+        if threshold is not None:
+            params['threshold'] = threshold
+        return self._make_request('GET', f"{API_BASE}/grading/tests/{test_id}/questions/{question_id}/clusters", params)
+    
+    def grade_answer_cluster(self, test_id, question_id, answer_ids, score, feedback=None):
+        """Give every answer of a cluster the same score and feedback."""
+        data = {'answer_ids': answer_ids, 'score': score}
+        if feedback is not None:
+            data['feedback'] = feedback
+        return self._make_request('PUT', f"{API_BASE}/grading/tests/{test_id}/questions/{question_id}/clusters", data)
+    
+    def get_similarity_matches(self, test_id, threshold=None, question_id=None):
+        """Get the pairs of similar code answers involving a test."""
+        params = {}
+        if threshold is not None:
+            params['threshold'] = threshold
+        if question_id is not None:
+            params['question_id'] = question_id
+        return self._make_request('GET', f"{API_BASE}/grading/tests/{test_id}/similarity", params)
+    
+    def index_similarity(self, test_id):
+        """Index the code answers of a test that are not in the similarity index yet."""
+        return self._make_request('POST', f"{API_BASE}/grading/tests/{test_id}/similarity")
+    
+    def grade_answers(self, grades):
+        """Grade several answers in one request; grades are dicts with answer_id, score and feedback."""
+        return self._make_request('PUT', f"{API_BASE}/grading/answers", grades)
+    
     def finalize_grading(self, submission_id):
         """Finalize grading for a submission."""
         return self._make_request('POST', f"{API_BASE}/grading/submissions/{submission_id}/finalize")
     
+    def finalize_test(self, test_id):
+        """Finalize grading for every submitted submission of a test."""
+        return self._make_request('POST', f"{API_BASE}/grading/tests/{test_id}/finalize")
+    
+    def get_grading_cache_stats(self):
+        """Get code grading cache statistics."""
+        return self._make_request('GET', f"{API_BASE}/grading/cache/stats")
+    
+    def regrade_question(self, question_id):
+        """Queue all answers to a code question for regrading after its test cases changed."""
+        return self._make_request('POST', f"{API_BASE}/grading/questions/{question_id}/regrade")
+    
+    def get_grading_queue(self):
+        """Get background grading queue depth."""
+        return self._make_request('GET', f"{API_BASE}/grading/queue")
+    
+    def get_grading_status(self, submission_id):
+        """Get background grading progress of a submission."""
+        return self._make_request('GET', f"{API_BASE}/grading/submissions/{submission_id}/status")
+    
+    def auto_grade_test(self, test_id, submission_ids=None):
+        """Queue the code answers of a test (or of some of its submissions) for grading."""
+        data = {"submission_ids": submission_ids} if submission_ids is not None else {}
+        return self._make_request('POST', f"{API_BASE}/grading/tests/{test_id}/auto-grade", data)
+    
+    def get_auto_grade_progress(self, test_id):
+        """Get background grading progress of a test."""
+        return self._make_request('GET', f"{API_BASE}/grading/tests/{test_id}/auto-grade")
+    
     # Statistics
     def get_statistics_overview(self):
         """Get overview statistics."""
@@ -2,11 +2,14 @@
 
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
                              QTableWidget, QTableWidgetItem, QDialog, QTextEdit, 
-                             QDoubleSpinBox, QMessageBox, QHeaderView, QSplitter)
-from PyQt5.QtCore import Qt
-from server.services.grader import auto_grade_code_answer
-from server.app import db_session
-from server.models import Answer
+                             QDoubleSpinBox, QMessageBox, QHeaderView, QSplitter, QProgressDialog,
+                             QInputDialog)
+from PyQt5.QtCore import Qt, QTimer
+from lecturer_app.windows.question_grading import ClusterGradingDialog, QuestionGradingDialog
+from lecturer_app.windows.similarity import SimilarityDialog
+
+# Milliseconds between progress polls while the server grades
+PROGRESS_POLL_INTERVAL = 1000
 
 
 class GradingWindow(QWidget):
@@ -36,6 +39,31 @@ class GradingWindow(QWidget):
         header.addWidget(title)
         header.addStretch()
         
+        auto_grade_btn = QPushButton("Auto-Grade Test")
+        auto_grade_btn.setToolTip("Grade the code answers of every submission to the selected submission's test")
+        auto_grade_btn.clicked.connect(self.auto_grade_test)
+        header.addWidget(auto_grade_btn)
+        
+        by_question_btn = QPushButton("Grade by Question")
+        by_question_btn.setToolTip("Grade one question of the selected submission's test across all submissions")
+        by_question_btn.clicked.connect(self.grade_by_question)
+        header.addWidget(by_question_btn)
+        
+        by_cluster_btn = QPushButton("Grade by Cluster")
+        by_cluster_btn.setToolTip("Grade identical answers to one question of the selected submission's test at once")
+        by_cluster_btn.clicked.connect(self.grade_by_cluster)
+        header.addWidget(by_cluster_btn)
+        
+        similarity_btn = QPushButton("Check Similarity")
+        similarity_btn.setToolTip("List similar code answers in the selected submission's test")
+        similarity_btn.clicked.connect(self.check_similarity)
+        header.addWidget(similarity_btn)
+        
+        finalize_btn = QPushButton("Finalize Test")
+        finalize_btn.setToolTip("Calculate the final grade of every submission to the selected submission's test")
+        finalize_btn.clicked.connect(self.finalize_test)
+        header.addWidget(finalize_btn)
+        
         refresh_btn = QPushButton("Refresh")
         refresh_btn.clicked.connect(self.load_submissions)
         header.addWidget(refresh_btn)
@@ -43,8 +71,8 @@ class GradingWindow(QWidget):
         
         # Submissions table
         self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["ID", "Test", "Student", "Status", "Actions"])
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["ID", "Test", "Student", "Status", "Score", "Actions"])
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
         self.table.cellDoubleClicked.connect(self.grade_submission)
@@ -72,10 +100,17 @@ class GradingWindow(QWidget):
             self.table.setItem(row, 2, QTableWidgetItem(submission.get('username', 'Unknown')))
             self.table.setItem(row, 3, QTableWidgetItem(submission.get('status', 'Unknown')))
             
+            # Provisional score so far
+            score = f"{submission.get('total_score') or 0:g}"
+            if submission.get('max_score') is not None:
+                score += f" / {submission['max_score']:g}"
+            score += f" ({submission.get('graded_count') or 0} graded)"
+            self.table.setItem(row, 4, QTableWidgetItem(score))
+            
             # Actions
             grade_btn = QPushButton("Grade")
             grade_btn.clicked.connect(lambda checked, s=submission: self.grade_submission_dialog(s))
-            self.table.setCellWidget(row, 4, grade_btn)
+            self.table.setCellWidget(row, 5, grade_btn)
     
     def grade_submission(self, row, col):
         """Grade submission (double-click)."""
@@ -89,6 +124,140 @@ class GradingWindow(QWidget):
         dialog = GradingDialog(self, self.api_client, submission)
         dialog.exec_()
         self.load_submissions()
+    
+    def choose_question(self):
+        """Ask for a question of the selected submission's test; returns (test_id, question) or None."""
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Warning", "Please select a submission of the test to grade")
+            return
+        submission = self.submissions[row]
+        
+        try:
+            questions = self.api_client.get_test(submission['test_id']).get('questions', [])
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load test: {str(e)}")
+            return
+        if not questions:
+            QMessageBox.information(self, "Select Question", "This test has no questions")
+            return
+        
+        labels = [f"Q{i}: {q['content'][:60]}" for i, q in enumerate(questions, 1)]
+        label, ok = QInputDialog.getItem(self, "Select Question", "Question:", labels, 0, False)
+        if not ok:
+            return
+        return submission['test_id'], questions[labels.index(label)]
+    
+    def grade_by_question(self):
+        """Grade one question of the selected submission's test, answer by answer."""
+        choice = self.choose_question()
+        if not choice:
+            return
+        test_id, question = choice
+        dialog = QuestionGradingDialog(self, self.api_client, test_id, question['id'])
+        dialog.exec_()
+        self.load_submissions()
+    
+    def grade_by_cluster(self):
+        """Grade clusters of equivalent answers to one question of the selected submission's test."""
+        choice = self.choose_question()
+        if not choice:
+            return
+        test_id, question = choice
+        dialog = ClusterGradingDialog(self, self.api_client, test_id, question)
+        dialog.exec_()
+        self.load_submissions()
+    
+    def check_similarity(self):
+        """Show similar code answers of the selected submission's test."""
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Warning", "Please select a submission of the test to check")
+            return
+        submission = self.submissions[row]
+        dialog = SimilarityDialog(self, self.api_client, submission['test_id'], submission.get('test_name', 'Test'))
+        dialog.exec_()
+    
+    def finalize_test(self):
+        """Finalize grading for all submissions of the selected submission's test."""
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Warning", "Please select a submission of the test to finalize")
+            return
+        submission = self.submissions[row]
+        
+        reply = QMessageBox.question(
+            self, "Confirm Finalize",
+            f"Finalize grading for every submission of {submission.get('test_name', 'this test')}? "
+            "This will calculate the final grades.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        
+        try:
+            result = self.api_client.finalize_test(submission['test_id'])
+            QMessageBox.information(
+                self, "Success", f"Finalized {result['finalized']} submissions (maximum score {result['max_score']})"
+            )
+            self.load_submissions()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to finalize grading: {str(e)}")
+    
+    def auto_grade_test(self):
+        """Grade all code answers of the selected submission's test on the server."""
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Warning", "Please select a submission of the test to auto-grade")
+            return
+        submission = self.submissions[row]
+        
+        try:
+            result = self.api_client.auto_grade_test(submission['test_id'])
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to start auto-grading: {str(e)}")
+            return
+        
+        progress = result['progress']
+        if progress['complete']:
+            QMessageBox.information(self, "Auto-Grading", "There are no code answers to grade for this test")
+            return
+        
+        dialog = QProgressDialog(
+            f"Grading code answers of {submission.get('test_name', 'the test')}...", "Hide", 0, 100, self
+        )
+        dialog.setWindowTitle("Auto-Grading")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.setValue(int(progress['percent']))
+        
+        timer = QTimer(dialog)
+        
+        def poll():
+            try:
+                progress = self.api_client.get_auto_grade_progress(submission['test_id'])
+            except Exception:
+                return  # Try again on the next tick
+            dialog.setValue(int(progress['percent']))
+            dialog.setLabelText(
+                f"Graded {progress['done'] + progress['failed']} of {progress['total']} code answers "
+                f"({progress['running']} running, {progress['failed']} failed)"
+            )
+            if progress['complete']:
+                timer.stop()
+                dialog.close()
+                QMessageBox.information(
+                    self, "Auto-Grading Complete",
+                    f"Graded {progress['done']} code answers" +
+                    (f"; {progress['failed']} could not be graded" if progress['failed'] else "")
+                )
+                self.load_submissions()
+        
+        timer.timeout.connect(poll)
+        dialog.canceled.connect(timer.stop)
+        timer.start(PROGRESS_POLL_INTERVAL)
+        dialog.show()
 
 
 class GradingDialog(QDialog):
@@ -268,34 +437,46 @@ class GradingDialog(QDialog):
             QMessageBox.critical(self, "Error", f"Failed to save grade: {str(e)}")
     
     def auto_grade_code(self):
-        """Auto-grade all code questions."""
+        """Auto-grade all code questions of this submission on the server."""
         if not self.submission_data:
             return
         
-        graded = 0
-        for q_data in self.submission_data.get('questions', []):
-            if q_data.get('type') == 'code':
-                answer = q_data.get('answer')
-                if answer and answer.get('code'):
-                    # Auto-grade using the service
-                    try:
-                        from server.services.code_executor import grade_code_submission
-                        test_cases = q_data.get('test_cases', [])
-                        points = q_data.get('points', 0)
-                        
-                        result = grade_code_submission(answer['code'], test_cases, points)
-                        
-                        # Update UI
-                        q_data['_score_widget'].setValue(result['score'])
-                        q_data['_feedback_widget'].setPlainText(result['feedback'])
-                        
-                        # Save to database
-                        self.api_client.grade_answer(answer['id'], result['score'], result['feedback'])
-                        graded += 1
-                    except Exception as e:
-                        QMessageBox.warning(self, "Warning", f"Could not auto-grade question: {str(e)}")
-        
-        QMessageBox.information(self, "Auto-Grading Complete", f"Auto-graded {graded} code questions")
+        try:
+            result = self.api_client.auto_grade_test(self.submission_data['test_id'], [self.submission['id']])
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to start auto-grading: {str(e)}")
+            return
+        if not result['queued'] and not result['already_pending']:
+            QMessageBox.information(self, "Auto-Grading", "There are no code answers to grade")
+            return
+        
+        dialog = QProgressDialog("Grading code answers...", "Hide", 0, 0, self)
+        dialog.setWindowTitle("Auto-Grading")
+        dialog.setWindowModality(Qt.WindowModal)
+        timer = QTimer(dialog)
+        
+        def poll():
+            try:
+                status = self.api_client.get_grading_status(self.submission['id'])
+            except Exception:
+                return  # Try again on the next tick
+            if status['complete']:
+                timer.stop()
+                dialog.close()
+                # Jobs are oldest first, so this keeps the latest job of every answer
+                latest = {job['answer_id']: job['status'] for job in status['jobs']}
+                failed = sum(1 for job_status in latest.values() if job_status == 'failed')
+                # Show the new scores and feedback
+                self.load_submission_data()
+                QMessageBox.information(
+                    self, "Auto-Grading Complete",
+                    "Code questions auto-graded" + (f"; {failed} could not be graded" if failed else "")
+                )
+        
+        timer.timeout.connect(poll)
+        dialog.canceled.connect(timer.stop)
+        timer.start(PROGRESS_POLL_INTERVAL)
+        dialog.show()
     
     def finalize_grading(self):
         """Finalize grading for the submission."""
@@ -307,9 +488,18 @@ class GradingDialog(QDialog):
         
         if reply == QMessageBox.Yes:
             try:
-                # Save all grades first
+                # Save all grades first, in one request
+                grades = []
                 for q_data in self.submission_data.get('questions', []):
-                    self.save_grade(q_data)
+                    answer = q_data.get('answer')
+                    if answer and answer.get('id'):
+                        grades.append({
+                            "answer_id": answer['id'],
+                            "score": q_data['_score_widget'].value(),
+                            "feedback": q_data['_feedback_widget'].toPlainText()
+                        })
+                if grades:
+                    self.api_client.grade_answers(grades)
                 
                 # Finalize
                 result = self.api_client.finalize_grading(self.submission['id'])
@@ -280,7 +280,10 @@ class QuestionDialog(QDialog):
             self.type_layout.addWidget(self.correct_answer_edit)
             
             # Load choices and correct answer if editing
-            if self.question and self.question.get('correct_answer'):
+            if self.question and self.question.get('choices'):
+                self.choices_edit.setPlainText('\n'.join(self.question['choices']))
+                self.correct_answer_edit.setText(self.question.get('correct_answer') or '')
+            elif self.question and self.question.get('correct_answer'):
                 try:
                     import json
                     correct_answer_data = json.loads(self.question['correct_answer'])
@@ -301,7 +304,8 @@ class QuestionDialog(QDialog):
             self.type_layout.addWidget(QLabel("Test Cases (JSON format):"))
             self.test_cases_edit = QTextEdit()
             self.test_cases_edit.setPlaceholderText(
-                '[{"input": "5", "output": "25"}, {"input": "10", "output": "100"}]'
+                '[{"input": "5", "output": "25"}, {"input": "10", "output": "100"}]\n'
+                'or, to call a function: [{"function": "square", "args": [5], "expected": 25}]'
             )
             self.test_cases_edit.setMaximumHeight(150)
             self.type_layout.addWidget(self.test_cases_edit)
@@ -309,6 +313,35 @@ class QuestionDialog(QDialog):
             if self.question and self.question.get('test_cases'):
                 import json
                 self.test_cases_edit.setPlainText(json.dumps(self.question['test_cases'], indent=2))
+            
+            self.type_layout.addWidget(QLabel("Reference Solution (optional; computes expected outputs and calibrates timeouts):"))
+            self.reference_solution_edit = QTextEdit()
+            self.reference_solution_edit.setPlaceholderText("x = int(input())\nprint(x * x)")
+            self.reference_solution_edit.setMaximumHeight(150)
+            self.type_layout.addWidget(self.reference_solution_edit)
+            
+            if self.question and self.question.get('reference_solution'):
+                self.reference_solution_edit.setPlainText(self.question['reference_solution'])
+            
+            self.type_layout.addWidget(QLabel("Grading Policy (optional JSON; stops grading early):"))
+            self.grading_policy_edit = QLineEdit()
+            self.grading_policy_edit.setPlaceholderText('{"max_consecutive_timeouts": 2, "stop_on_import_error": true}')
+            self.type_layout.addWidget(self.grading_policy_edit)
+            
+            if self.question and self.question.get('grading_policy'):
+                import json
+                self.grading_policy_edit.setText(json.dumps(self.question['grading_policy']))
+            
+            self.type_layout.addWidget(QLabel("Efficiency Scoring (optional JSON; needs a reference solution):"))
+            self.efficiency_edit = QLineEdit()
+            self.efficiency_edit.setPlaceholderText(
+                '{"weight": 0.25, "benchmark_cases": [3], "repeats": 5, "max_cpu_ratio": 2, "max_memory_ratio": 3}'
+            )
+            self.type_layout.addWidget(self.efficiency_edit)
+            
+            if self.question and self.question.get('efficiency'):
+                import json
+                self.efficiency_edit.setText(json.dumps(self.question['efficiency']))
     
     def save_question(self):
         """Save question."""
@@ -351,12 +384,8 @@ class QuestionDialog(QDialog):
                     QMessageBox.warning(self, "Error", "Correct answer must be one of the choices")
                     return
                 
-                # Store as JSON: {"choices": [...], "correct": "..."}
-                import json
-                question_data['correct_answer'] = json.dumps({
-                    'choices': choices,
-                    'correct': correct_answer
-                })
+                question_data['choices'] = choices
+                question_data['correct_answer'] = correct_answer
         
         elif question_type == QUESTION_TYPE_CODE:
             if hasattr(self, 'test_cases_edit'):
@@ -367,15 +396,41 @@ class QuestionDialog(QDialog):
                 except:
                     QMessageBox.warning(self, "Error", "Invalid JSON format for test cases")
                     return
+            if hasattr(self, 'reference_solution_edit'):
+                question_data['reference_solution'] = self.reference_solution_edit.toPlainText().strip() or None
+            if hasattr(self, 'grading_policy_edit'):
+                policy_text = self.grading_policy_edit.text().strip()
+                try:
+                    import json
+                    question_data['grading_policy'] = json.loads(policy_text) if policy_text else None
+                except json.JSONDecodeError:
+                    QMessageBox.warning(self, "Error", "Invalid JSON format for grading policy")
+                    return
+            if hasattr(self, 'efficiency_edit'):
+                efficiency_text = self.efficiency_edit.text().strip()
+                try:
+                    import json
+                    question_data['efficiency'] = json.loads(efficiency_text) if efficiency_text else None
+                except json.JSONDecodeError:
+                    QMessageBox.warning(self, "Error", "Invalid JSON format for efficiency scoring")
+                    return
         
         try:
             if self.question:
-                self.api_client.update_question(self.question['id'], question_data)
+                saved = self.api_client.update_question(self.question['id'], question_data)
                 QMessageBox.information(self, "Success", "Question updated successfully")
             else:
-                self.api_client.create_question(question_data)
+                saved = self.api_client.create_question(question_data)
                 QMessageBox.information(self, "Success", "Question created successfully")
             
+            mismatches = (saved.get('expected_outputs') or {}).get('mismatches')
+            if mismatches:
+                QMessageBox.warning(
+                    self, "Reference Solution",
+                    "The reference solution's output differs from the typed expected output in test case(s) "
+                    f"{', '.join(str(idx) for idx in mismatches)}. Answers are graded against the reference."
+                )
+            
             self.accept()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save question: {str(e)}")
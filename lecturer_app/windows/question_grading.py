@@ -0,0 +1,345 @@
+"""Grade-by-question window for lecturer."""
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTextEdit,
+                             QDoubleSpinBox, QMessageBox, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QCheckBox)
+from PyQt5.QtCore import QThread, pyqtSignal
+from lecturer_app.api_client import LecturerAPIClient
+
+PAGE_SIZE = 25
+# Fetch the next page once this many answers of the current one are left
+PREFETCH_REMAINING = 5
+
+
+class PageFetcher(QThread):
+    """Loads one page of answers in the background."""
+    
+    loaded = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+    
+    def __init__(self, api_client, test_id, question_id, after):
+        super().__init__()
+        # A separate HTTP session, so the grader's own requests never share it with this thread
+        self.api_client = LecturerAPIClient(api_client.base_url)
+        self.api_client.session.cookies.update(api_client.session.cookies)
+        self.test_id = test_id
+        self.question_id = question_id
+        self.after = after
+    
+    def run(self):
+        try:
+            self.loaded.emit(self.api_client.get_question_answers(
+                self.test_id, self.question_id, after=self.after, limit=PAGE_SIZE
+            ))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class QuestionGradingDialog(QDialog):
+    """Dialog for grading one question of a test across all submissions, one answer at a time."""
+    
+    def __init__(self, parent, api_client, test_id, question_id):
+        super().__init__(parent)
+        self.api_client = api_client
+        self.test_id = test_id
+        self.question_id = question_id
+        self.question = None
+        self.answers = []  # Answers loaded so far, in order
+        self.index = 0
+        self.next_after = None  # Cursor of the next page, None when all are loaded
+        self.fetcher = None
+        self.init_ui()
+        self.load_first_page()
+    
+    def init_ui(self):
+        """Initialize UI."""
+        self.setWindowTitle("Grade by Question")
+        self.setMinimumSize(900, 650)
+        
+        layout = QVBoxLayout()
+        
+        self.question_label = QLabel("Loading...")
+        self.question_label.setWordWrap(True)
+        font = self.question_label.font()
+        font.setBold(True)
+        self.question_label.setFont(font)
+        layout.addWidget(self.question_label)
+        
+        self.position_label = QLabel("")
+        layout.addWidget(self.position_label)
+        
+        self.student_label = QLabel("")
+        layout.addWidget(self.student_label)
+        
+        self.answer_view = QTextEdit()
+        self.answer_view.setReadOnly(True)
+        layout.addWidget(self.answer_view)
+        
+        # Score
+        score_layout = QHBoxLayout()
+        score_layout.addWidget(QLabel("Score:"))
+        self.score_spin = QDoubleSpinBox()
+        self.score_spin.setMinimum(0)
+        score_layout.addWidget(self.score_spin)
+        score_layout.addStretch()
+        layout.addLayout(score_layout)
+        
+        layout.addWidget(QLabel("Feedback:"))
+        self.feedback_edit = QTextEdit()
+        self.feedback_edit.setMaximumHeight(100)
+        layout.addWidget(self.feedback_edit)
+        
+        # Navigation
+        buttons = QHBoxLayout()
+        self.prev_btn = QPushButton("Previous")
+        self.prev_btn.clicked.connect(lambda: self.show_answer(self.index - 1))
+        buttons.addWidget(self.prev_btn)
+        buttons.addStretch()
+        self.skip_btn = QPushButton("Skip")
+        self.skip_btn.clicked.connect(lambda: self.show_answer(self.index + 1))
+        buttons.addWidget(self.skip_btn)
+        self.save_btn = QPushButton("Save && Next")
+        self.save_btn.setStyleSheet("background-color: #28a745; color: white; font-weight: bold;")
+        self.save_btn.setDefault(True)
+        self.save_btn.clicked.connect(self.save_and_next)
+        buttons.addWidget(self.save_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+        
+        self.setLayout(layout)
+    
+    def load_first_page(self):
+        """Load the question and its first page of answers."""
+        try:
+            page = self.api_client.get_question_answers(self.test_id, self.question_id, limit=PAGE_SIZE)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load answers: {str(e)}")
+            return
+        
+        self.question = page['question']
+        self.question_label.setText(f"{self.question['content']} ({self.question['points']} points)")
+        self.score_spin.setMaximum(self.question['points'] or 0)
+        self.score_spin.setSuffix(f" / {self.question['points']}")
+        self.add_page(page)
+        self.show_answer(0)
+    
+    def add_page(self, page):
+        """Append a loaded page."""
+        self.answers.extend(page['answers'])
+        self.next_after = page['next_after']
+    
+    def prefetch(self):
+        """Start loading the next page in the background if it is needed soon."""
+        if self.next_after is None or self.fetcher is not None:
+            return
+        if len(self.answers) - self.index > PREFETCH_REMAINING:
+            return
+        self.fetcher = PageFetcher(self.api_client, self.test_id, self.question_id, self.next_after)
+        self.fetcher.loaded.connect(self.on_page_loaded)
+        self.fetcher.failed.connect(self.on_page_failed)
+        self.fetcher.start()
+    
+    def on_page_loaded(self, page):
+        """Add a prefetched page."""
+        self.fetcher = None
+        waiting = self.index >= len(self.answers)
+        self.add_page(page)
+        if waiting:
+            # The grader got ahead of the prefetch
+            self.show_answer(self.index)
+        else:
+            self.update_position()
+    
+    def on_page_failed(self, error):
+        """Report a failed prefetch; it is retried on the next move."""
+        self.fetcher = None
+        QMessageBox.warning(self, "Warning", f"Could not load more answers: {error}")
+    
+    def update_position(self):
+        """Show how far through the answers the grader is."""
+        more = "+" if self.next_after is not None else ""
+        self.position_label.setText(f"Answer {self.index + 1} of {len(self.answers)}{more}")
+        self.prev_btn.setEnabled(self.index > 0)
+        has_next = self.index + 1 < len(self.answers) or self.next_after is not None
+        self.skip_btn.setEnabled(has_next)
+    
+    def show_answer(self, index):
+        """Show the answer at a position."""
+        if index < 0:
+            return
+        self.index = index
+        if index >= len(self.answers):
+            if self.next_after is None:
+                # Past the last answer
+                self.index = max(0, len(self.answers) - 1)
+                QMessageBox.information(self, "Done", "All answers to this question have been graded")
+                return
+            # Still loading; on_page_loaded shows it
+            self.student_label.setText("Loading...")
+            self.answer_view.clear()
+            self.prefetch()
+            return
+        
+        answer = self.answers[index]
+        student = answer.get('student') or {}
+        self.student_label.setText(
+            f"Student: {student.get('username', 'Unknown')} ({student.get('student_id') or '-'})"
+        )
+        self.answer_view.setPlainText(answer.get('code') or answer.get('answer_text') or "(No text answer)")
+        self.score_spin.setValue(float(answer['score']) if answer.get('score') is not None else 0.0)
+        self.feedback_edit.setPlainText(answer.get('feedback') or '')
+        self.update_position()
+        self.prefetch()
+    
+    def save_and_next(self):
+        """Save the grade of the current answer and move to the next one."""
+        if self.index >= len(self.answers):
+            return
+        answer = self.answers[self.index]
+        score = self.score_spin.value()
+        feedback = self.feedback_edit.toPlainText()
+        try:
+            self.api_client.grade_answer(answer['id'], score, feedback)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to save grade: {str(e)}")
+            return
+        answer['score'] = score
+        answer['feedback'] = feedback
+        self.show_answer(self.index + 1)
+    
+    def done(self, result):
+        """Wait for a running prefetch before closing."""
+        if self.fetcher is not None:
+            self.fetcher.wait()
+        super().done(result)
+
+
+class ClusterGradingDialog(QDialog):
+    """Dialog for grading clusters of equivalent answers to one question at once."""
+    
+    def __init__(self, parent, api_client, test_id, question):
+        super().__init__(parent)
+        self.api_client = api_client
+        self.test_id = test_id
+        self.question = question
+        self.clusters = []
+        self.init_ui()
+        self.load_clusters()
+    
+    def init_ui(self):
+        """Initialize UI."""
+        self.setWindowTitle("Grade by Cluster")
+        self.setMinimumSize(900, 650)
+        
+        layout = QVBoxLayout()
+        
+        question_label = QLabel(f"{self.question['content']} ({self.question['points']} points)")
+        question_label.setWordWrap(True)
+        font = question_label.font()
+        font.setBold(True)
+        question_label.setFont(font)
+        layout.addWidget(question_label)
+        
+        options = QHBoxLayout()
+        self.near_check = QCheckBox("Group near-duplicate text answers")
+        self.near_check.toggled.connect(self.load_clusters)
+        options.addWidget(self.near_check)
+        options.addStretch()
+        self.summary_label = QLabel("")
+        options.addWidget(self.summary_label)
+        layout.addLayout(options)
+        
+        # Clusters table
+        self.table = QTableWidget()
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["Answers", "Graded", "Scores", "Sample"])
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.itemSelectionChanged.connect(self.show_cluster)
+        layout.addWidget(self.table)
+        
+        self.sample_view = QTextEdit()
+        self.sample_view.setReadOnly(True)
+        self.sample_view.setMaximumHeight(160)
+        layout.addWidget(self.sample_view)
+        
+        # Score
+        score_layout = QHBoxLayout()
+        score_layout.addWidget(QLabel("Score:"))
+        self.score_spin = QDoubleSpinBox()
+        self.score_spin.setMinimum(0)
+        self.score_spin.setMaximum(self.question['points'] or 0)
+        self.score_spin.setSuffix(f" / {self.question['points']}")
+        score_layout.addWidget(self.score_spin)
+        score_layout.addStretch()
+        layout.addLayout(score_layout)
+        
+        layout.addWidget(QLabel("Feedback:"))
+        self.feedback_edit = QTextEdit()
+        self.feedback_edit.setMaximumHeight(80)
+        layout.addWidget(self.feedback_edit)
+        
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        apply_btn = QPushButton("Apply to Cluster")
+        apply_btn.setStyleSheet("background-color: #28a745; color: white; font-weight: bold;")
+        apply_btn.clicked.connect(self.grade_cluster)
+        buttons.addWidget(apply_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+        
+        self.setLayout(layout)
+    
+    def load_clusters(self):
+        """Load the clusters of the question's answers."""
+        try:
+            result = self.api_client.get_answer_clusters(
+                self.test_id, self.question['id'], near=self.near_check.isChecked()
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load clusters: {str(e)}")
+            return
+        
+        self.clusters = result['clusters']
+        self.summary_label.setText(f"{result['answers']} answers in {len(self.clusters)} clusters")
+        self.table.setRowCount(len(self.clusters))
+        for row, cluster in enumerate(self.clusters):
+            self.table.setItem(row, 0, QTableWidgetItem(str(cluster['size'])))
+            self.table.setItem(row, 1, QTableWidgetItem(str(cluster['graded'])))
+            self.table.setItem(row, 2, QTableWidgetItem(", ".join(f"{score:g}" for score in cluster['scores'])))
+            self.table.setItem(row, 3, QTableWidgetItem(" ".join(cluster['sample'].split())[:120]))
+        self.sample_view.clear()
+    
+    def show_cluster(self):
+        """Show the sample answer of the selected cluster."""
+        row = self.table.currentRow()
+        if row < 0 or row >= len(self.clusters):
+            return
+        cluster = self.clusters[row]
+        self.sample_view.setPlainText(cluster['sample'] or "(No text answer)")
+        if len(cluster['scores']) == 1:
+            self.score_spin.setValue(float(cluster['scores'][0]))
+    
+    def grade_cluster(self):
+        """Give every answer of the selected cluster the entered score and feedback."""
+        row = self.table.currentRow()
+        if row < 0 or row >= len(self.clusters):
+            QMessageBox.warning(self, "Warning", "Please select a cluster to grade")
+            return
+        cluster = self.clusters[row]
+        try:
+            self.api_client.grade_answer_cluster(
+                self.test_id, self.question['id'], cluster['answer_ids'],
+                self.score_spin.value(), self.feedback_edit.toPlainText() or None
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to grade cluster: {str(e)}")
+            return
+        self.load_clusters()
+        if row < self.table.rowCount():
+            self.table.selectRow(row)
@@ -0,0 +1,81 @@
+"""Code similarity report for lecturer."""
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QDoubleSpinBox, QMessageBox)
+
+
+class SimilarityDialog(QDialog):
+    """Dialog listing pairs of similar code answers of a test."""
+    
+    def __init__(self, parent, api_client, test_id, test_name):
+        super().__init__(parent)
+        self.api_client = api_client
+        self.test_id = test_id
+        self.test_name = test_name
+        self.init_ui()
+        self.index_answers()
+        self.load_matches()
+    
+    def init_ui(self):
+        """Initialize UI."""
+        self.setWindowTitle(f"Code Similarity - {self.test_name}")
+        self.setMinimumSize(800, 500)
+        
+        layout = QVBoxLayout()
+        
+        options = QHBoxLayout()
+        options.addWidget(QLabel("Minimum similarity:"))
+        self.threshold_spin = QDoubleSpinBox()
+        self.threshold_spin.setRange(0, 100)
+        self.threshold_spin.setDecimals(0)
+        self.threshold_spin.setSuffix(" %")
+        self.threshold_spin.setValue(50)
+        options.addWidget(self.threshold_spin)
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.load_matches)
+        options.addWidget(refresh_btn)
+        options.addStretch()
+        self.summary_label = QLabel("")
+        options.addWidget(self.summary_label)
+        layout.addLayout(options)
+        
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["Similarity", "Question", "Student", "Other Student", "Shared"])
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+        
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        
+        self.setLayout(layout)
+    
+    def index_answers(self):
+        """Add answers submitted before the index existed."""
+        try:
+            self.api_client.index_similarity(self.test_id)
+        except Exception as e:
+            QMessageBox.warning(self, "Warning", f"Failed to index older answers: {str(e)}")
+    
+    def load_matches(self):
+        """Load the pairs above the chosen similarity."""
+        try:
+            result = self.api_client.get_similarity_matches(self.test_id, self.threshold_spin.value() / 100)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load similar answers: {str(e)}")
+            return
+        
+        matches = result['matches']
+        self.summary_label.setText(f"{len(matches)} similar pairs")
+        self.table.setRowCount(len(matches))
+        for row, match in enumerate(matches):
+            first, second = match['answers']
+            self.table.setItem(row, 0, QTableWidgetItem(f"{match['similarity'] * 100:.0f} %"))
+            self.table.setItem(row, 1, QTableWidgetItem(str(match['question_id'])))
+            self.table.setItem(row, 2, QTableWidgetItem(f"{first['username']} (submission {first['submission_id']})"))
+            self.table.setItem(row, 3, QTableWidgetItem(f"{second['username']} (submission {second['submission_id']})"))
+            self.table.setItem(row, 4, QTableWidgetItem(str(match['shared'])))
@@ -186,8 +186,8 @@ class StatisticsWindow(QWidget):
         # Question stats
         if stats.get('question_statistics'):
             table = QTableWidget()
-            table.setColumnCount(5)
-            table.setHorizontalHeaderLabels(["Question", "Type", "Avg Score", "Max Points", "Answers"])
+            table.setColumnCount(6)
+            table.setHorizontalHeaderLabels(["Question", "Type", "Avg Score", "Max Points", "Answers", "Efficiency"])
             table.setRowCount(len(stats['question_statistics']))
             
             for row, q_stat in enumerate(stats['question_statistics']):
@@ -196,6 +196,14 @@ class StatisticsWindow(QWidget):
                 table.setItem(row, 2, QTableWidgetItem(str(q_stat.get('average_score', 0))))
                 table.setItem(row, 3, QTableWidgetItem(str(q_stat.get('max_points', 0))))
                 table.setItem(row, 4, QTableWidgetItem(str(q_stat.get('answer_count', 0))))
+                efficiency = q_stat.get('efficiency')
+                if efficiency:
+                    # Average efficiency points and median CPU time relative to the reference
+                    cpu_ratio = efficiency.get('median_cpu_ratio')
+                    text = f"{efficiency['average_points']}/{efficiency['max_points']}"
+                    if cpu_ratio is not None:
+                        text += f" (CPU {cpu_ratio}x)"
+                    table.setItem(row, 5, QTableWidgetItem(text))
             
             table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
             self.stats_layout.addWidget(table)
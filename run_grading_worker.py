@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""Run standalone grading workers that take code-grading jobs from a server."""
+
+import argparse
+import sys
+import os
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from server.services.code_executor import CODE_EXECUTION_WORKERS
+from server.services.grading_worker import GRADING_SERVER_URL, GRADING_WORKER_TOKEN, start_workers
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", default=GRADING_SERVER_URL, help="Server URL (GRADING_SERVER_URL)")
+    parser.add_argument("--token", default=GRADING_WORKER_TOKEN, help="Worker token (GRADING_WORKER_TOKEN)")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    parser.add_argument("--batch-size", type=int, default=CODE_EXECUTION_WORKERS,
+                        help="Jobs each process leases and runs at a time")
+    args = parser.parse_args()
+    
+    if not args.token:
+        parser.error("a worker token is required (--token or GRADING_WORKER_TOKEN)")
+    
+    print(f"Starting {args.processes} grading worker(s) for {args.server}")
+    processes = start_workers(args.processes, args.server, args.token, args.batch_size)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
@@ -9,10 +9,11 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
 # Now import and run the app
-from server.app import app, SERVER_HOST, SERVER_PORT
+from server.app import app, SERVER_HOST, SERVER_PORT, start_grading_workers
 
 if __name__ == "__main__":
     print(f"Starting server on {SERVER_HOST}:{SERVER_PORT}")
     print(f"Database: {os.getenv('DATABASE_PATH', 'database/assessment.db')}")
+    start_grading_workers(debug=True)
     app.run(host=SERVER_HOST, port=SERVER_PORT, debug=True)
 
@@ -51,7 +51,7 @@ def shutdown_session(exception=None):
 
 
 # Import and register routes
-from server.routes import auth, tests, questions, submissions, grading, statistics, students, topics, web
+from server.routes import auth, tests, questions, submissions, grading, statistics, students, topics, web, workers
 
 app.register_blueprint(auth.bp)
 app.register_blueprint(tests.bp)
@@ -62,6 +62,17 @@ app.register_blueprint(statistics.bp)
 app.register_blueprint(students.bp)
 app.register_blueprint(topics.bp)
 app.register_blueprint(web.bp)
+app.register_blueprint(workers.bp)
+
+
+def start_grading_workers(debug: bool = False):
+    """Start the background grading workers for this server process."""
+    # The debug reloader runs the script twice; only its serving child starts workers
+    if debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return
+    
+    from server.services.grading_queue import start_workers
+    start_workers()
 
 
 @app.route('/')
@@ -84,7 +95,8 @@ def api_info():
             "grading": "/api/v1/grading",
             "statistics": "/api/v1/statistics",
             "students": "/api/v1/students",
-            "topics": "/api/v1/topics"
+            "topics": "/api/v1/topics",
+            "workers": "/api/v1/workers"
         }
     }
 
@@ -92,5 +104,6 @@ def api_info():
 if __name__ == "__main__":
     print(f"Starting server on {SERVER_HOST}:{SERVER_PORT}")
     print(f"Database: {DATABASE_PATH}")
+    start_grading_workers(debug=True)
     app.run(host=SERVER_HOST, port=SERVER_PORT, debug=True)
 
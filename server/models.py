@@ -1,13 +1,14 @@
 """Database models for the assessment system."""
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean, JSON, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from shared.constants import (
     ROLE_LECTURER, ROLE_STUDENT,
     QUESTION_TYPE_MULTIPLE_CHOICE, QUESTION_TYPE_CODE, QUESTION_TYPE_DIAGRAM, QUESTION_TYPE_TEXT,
-    SUBMISSION_STATUS_NOT_STARTED, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+    SUBMISSION_STATUS_NOT_STARTED, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED,
+    GRADING_JOB_STATUS_QUEUED
 )
 
 Base = declarative_base()
@@ -49,9 +50,16 @@ class Question(Base):
     topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False)
     type = Column(String(50), nullable=False)  # multiple_choice, code, diagram, text
     content = Column(Text, nullable=False)  # Question text/content
-    correct_answer = Column(Text, nullable=True)  # JSON for multiple choice, expected output for code
-    test_cases = Column(JSON, nullable=True)  # For code questions: [{"input": "...", "output": "..."}]
+    correct_answer = Column(Text, nullable=True)  # Correct option for multiple choice, expected output for code
+    choices = Column(JSON, nullable=True)  # For multiple choice: ["option", ...]
+    test_cases = Column(JSON, nullable=True)  # For code questions: [{"input": "...", "output": "..."}] or [{"function": "...", "args": [...], "kwargs": {...}, "expected": ...}]
     points = Column(Float, default=1.0, nullable=False)
+    reference_solution = Column(Text, nullable=True)  # For code questions: model answer used for calibration
+    reference_timings = Column(JSON, nullable=True)  # Cached run times of the reference per test case
+    expected_outputs = Column(JSON, nullable=True)  # Normalized reference outputs per test case plus checksum
+    grading_policy = Column(JSON, nullable=True)  # Early exit: {"max_consecutive_timeouts": K, "stop_on_import_error": true}
+    efficiency = Column(JSON, nullable=True)  # Efficiency scoring: {"weight", "benchmark_cases", "repeats", "max_cpu_ratio", "max_memory_ratio"}
+    efficiency_baseline = Column(JSON, nullable=True)  # Reference's measured cost per benchmark case
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -103,6 +111,10 @@ class Submission(Base):
     started_at = Column(DateTime, default=datetime.utcnow)
     submitted_at = Column(DateTime, nullable=True)
     status = Column(String(50), default=SUBMISSION_STATUS_NOT_STARTED, nullable=False)
+    # Running totals, kept up to date by submission_totals.set_score
+    total_score = Column(Float, default=0.0, nullable=False)  # Sum of the scored answers so far
+    graded_count = Column(Integer, default=0, nullable=False)  # Number of scored answers
+    max_score = Column(Float, nullable=True)  # Points of the test
     
     # Relationships
     test = relationship("Test", back_populates="submissions")
@@ -123,6 +135,8 @@ class Answer(Base):
     diagram_data = Column(Text, nullable=True)  # Base64 or JSON for diagram questions
     score = Column(Float, nullable=True)  # Points awarded
     feedback = Column(Text, nullable=True)  # Feedback from lecturer
+    efficiency = Column(JSON, nullable=True)  # Efficiency points and cost ratios of efficiency-scored code answers
+    similarity_indexed = Column(Boolean, default=False)  # Code fingerprinted for similarity checks (even if too short)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -146,3 +160,87 @@ class Grade(Base):
     # Relationships
     submission = relationship("Submission", back_populates="grade")
 
+
+class GradingCacheEntry(Base):
+    """Cached execution result of a code answer against a set of test cases."""
+    __tablename__ = "grading_cache"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key = Column(String(64), unique=True, nullable=False)  # SHA-256 of code, test cases and limits
+    result = Column(JSON, nullable=False)  # execute_code() result
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class GradingCacheCounter(Base):
+    """Running count of grading cache lookups of one outcome ("hits" or "misses"), across all processes."""
+    __tablename__ = "grading_cache_counters"
+    
+    name = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class GradingJob(Base):
+    """Queued background auto-grading of a single code answer."""
+    __tablename__ = "grading_jobs"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False, index=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id"), nullable=False, index=True)
+    status = Column(String(20), default=GRADING_JOB_STATUS_QUEUED, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)  # Last failure, if any
+    worker_id = Column(String(100), nullable=True)  # Worker holding the current lease
+    lease_token = Column(String(64), nullable=True)  # Proves a result belongs to the current lease
+    lease_expires_at = Column(DateTime, nullable=True, index=True)  # Running jobs past this are requeued
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    # Relationships
+    answer = relationship("Answer")
+
+
+class TestCaseResult(Base):
+    """Stored outcome of one test case for one code answer."""
+    __tablename__ = "test_case_results"
+    __table_args__ = (UniqueConstraint("answer_id", "case_hash"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False, index=True)
+    case_hash = Column(String(64), nullable=False)  # SHA-256 of the test case and its expected output
+    code_hash = Column(String(64), nullable=False)  # SHA-256 of the answer's code when it ran
+    passed = Column(Boolean, nullable=False)
+    actual_output = Column(Text, nullable=True)  # Truncated
+    error = Column(Text, nullable=True)  # Truncated
+    execution_time = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CodeFingerprint(Base):
+    """One winnowed fingerprint of a code answer; together they form an inverted index per question."""
+    __tablename__ = "code_fingerprints"
+    __table_args__ = (
+        UniqueConstraint("answer_id", "hash"),
+        Index("ix_code_fingerprints_question_hash", "question_id", "hash"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    hash = Column(Integer, nullable=False)  # 63-bit hash of a normalized token k-gram
+
+
+class SimilarityMatch(Base):
+    """Pair of code answers to the same question that share many fingerprints."""
+    __tablename__ = "similarity_matches"
+    __table_args__ = (UniqueConstraint("answer_id", "other_answer_id"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, index=True)
+    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False, index=True)  # The lower answer id
+    other_answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False, index=True)
+    shared = Column(Integer, nullable=False)  # Fingerprints in common
+    similarity = Column(Float, nullable=False)  # Jaccard similarity of the fingerprint sets
+    created_at = Column(DateTime, default=datetime.utcnow)
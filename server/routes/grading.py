@@ -3,6 +3,7 @@
 from flask import Blueprint, request, jsonify, session
 from server.database import db_session
 from server.models import Submission, Answer, Grade, Question
+from server.services.submission_totals import set_score
 from shared.constants import API_GRADING, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
 from datetime import datetime
 
@@ -75,6 +76,9 @@ def get_submission_for_grading(submission_id):
         "started_at": submission.started_at.isoformat() if submission.started_at else None,
         "submitted_at": submission.submitted_at.isoformat() if submission.submitted_at else None,
         "status": submission.status,
+        "total_score": submission.total_score,
+        "graded_count": submission.graded_count,
+        "max_score": submission.max_score,
         "questions": questions_data
     }), 200
 
@@ -110,7 +114,7 @@ def grade_answer(answer_id):
         if score < 0 or score > max_points:
             return jsonify({"error": f"Score must be between 0 and {max_points}"}), 400
         
-        answer.score = score
+        set_score(answer, score)
     
     if feedback is not None:
         answer.feedback = feedback
@@ -125,6 +129,296 @@ def grade_answer(answer_id):
     }), 200
 
 
+@bp.route('/answers', methods=['PUT'])
+def grade_answers():
+    """Grade several answers at once; either all updates are applied or none."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    grades = request.get_json(silent=True)
+    if not isinstance(grades, list) or not grades:
+        return jsonify({"error": "Expected a non-empty list of {answer_id, score, feedback}"}), 400
+    
+    updates = {}
+    for idx, entry in enumerate(grades):
+        if not isinstance(entry, dict):
+            return jsonify({"error": f"Grade {idx + 1} must be an object"}), 400
+        answer_id = entry.get('answer_id')
+        score = entry.get('score')
+        feedback = entry.get('feedback')
+        if not isinstance(answer_id, int) or isinstance(answer_id, bool):
+            return jsonify({"error": f"Grade {idx + 1} needs an answer_id"}), 400
+        if score is not None and (isinstance(score, bool) or not isinstance(score, (int, float))):
+            return jsonify({"error": f"Score of answer {answer_id} must be a number"}), 400
+        if feedback is not None and not isinstance(feedback, str):
+            return jsonify({"error": f"Feedback of answer {answer_id} must be a string"}), 400
+        if answer_id in updates:
+            return jsonify({"error": f"Answer {answer_id} is graded more than once"}), 400
+        updates[answer_id] = (score, feedback)
+    
+    # Every answer with its maximum points, in one query
+    from server.models import TestQuestion
+    from sqlalchemy import and_, func
+    rows = db_session.query(
+        Answer, func.coalesce(TestQuestion.points, Question.points)
+    ).join(
+        Submission, Submission.id == Answer.submission_id
+    ).join(
+        Question, Question.id == Answer.question_id
+    ).outerjoin(
+        TestQuestion, and_(TestQuestion.test_id == Submission.test_id, TestQuestion.question_id == Answer.question_id)
+    ).filter(Answer.id.in_(list(updates))).all()
+    
+    found = {answer.id: (answer, max_points) for answer, max_points in rows}
+    missing = [answer_id for answer_id in updates if answer_id not in found]
+    if missing:
+        return jsonify({"error": "Answers not found", "answer_ids": missing}), 404
+    
+    errors = []
+    for answer_id, (score, _) in updates.items():
+        max_points = found[answer_id][1]
+        if score is not None and (score < 0 or score > max_points):
+            errors.append({"answer_id": answer_id, "error": f"Score must be between 0 and {max_points}"})
+    if errors:
+        return jsonify({"error": "Invalid scores", "errors": errors}), 400
+    
+    now = datetime.utcnow()
+    for answer_id, (score, feedback) in updates.items():
+        answer = found[answer_id][0]
+        if score is not None:
+            set_score(answer, score)
+        if feedback is not None:
+            answer.feedback = feedback
+        answer.updated_at = now
+    db_session.commit()
+    
+    return jsonify([{
+        "id": answer_id,
+        "score": found[answer_id][0].score,
+        "feedback": found[answer_id][0].feedback
+    } for answer_id in updates]), 200
+
+
+# Answer fields that can be requested from the grade-by-question listing
+ANSWER_FIELDS = ("answer_text", "code", "diagram_data", "score", "feedback", "student")
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+@bp.route('/tests/<int:test_id>/questions/<int:question_id>/answers', methods=['GET'])
+def get_question_answers(test_id, question_id):
+    """
+    Page through the submitted answers to one question of a test.
+    
+    Answers are ordered by id; pass the returned ``next_after`` as ``after``
+    to get the next page. ``fields`` is a comma-separated subset of
+    ANSWER_FIELDS (all by default); only those columns are loaded.
+    """
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import TestQuestion, User
+    test_question = db_session.query(TestQuestion).filter_by(test_id=test_id, question_id=question_id).first()
+    if not test_question:
+        return jsonify({"error": "Question not found in test"}), 404
+    
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else list(ANSWER_FIELDS)
+    unknown = set(fields) - set(ANSWER_FIELDS)
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {sorted(unknown)}. Must be among {list(ANSWER_FIELDS)}"}), 400
+    
+    answer_columns = [field for field in fields if field != 'student']
+    columns = [Answer.id, Answer.submission_id] + [getattr(Answer, field) for field in answer_columns]
+    if 'student' in fields:
+        columns += [User.id, User.username, User.student_id]
+    
+    query = db_session.query(*columns).join(
+        Submission, Submission.id == Answer.submission_id
+    ).filter(
+        Answer.question_id == question_id,
+        Submission.test_id == test_id,
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED]),
+        Answer.id > after
+    )
+    if 'student' in fields:
+        query = query.join(User, User.id == Submission.user_id)
+    # One extra row tells whether there is another page
+    rows = query.order_by(Answer.id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    answers = []
+    for row in rows:
+        answer = {"id": row[0], "submission_id": row[1]}
+        answer.update(zip(answer_columns, row[2:2 + len(answer_columns)]))
+        if 'student' in fields:
+            user_id, username, student_id = row[2 + len(answer_columns):]
+            answer['student'] = {"user_id": user_id, "username": username, "student_id": student_id}
+        answers.append(answer)
+    
+    question = test_question.question
+    return jsonify({
+        "test_id": test_id,
+        "question": {
+            "id": question.id,
+            "type": question.type,
+            "content": question.content,
+            "points": test_question.points if test_question.points is not None else question.points,
+            "correct_answer": question.correct_answer
+        },
+        "answers": answers,
+        "next_after": answers[-1]['id'] if has_more else None
+    }), 200
+
+
+@bp.route('/tests/<int:test_id>/questions/<int:question_id>/clusters', methods=['GET'])
+def get_answer_clusters(test_id, question_id):
+    """
+    Group the submitted answers to one question of a test into clusters of
+    equivalent answers.
+    
+    ``near=1`` also merges near-duplicate text answers whose estimated
+    similarity reaches ``threshold`` (0-1).
+    """
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import TestQuestion
+    from server.services.answer_clusters import NEAR_DUPLICATE_THRESHOLD, question_clusters
+    if not db_session.query(TestQuestion).filter_by(test_id=test_id, question_id=question_id).first():
+        return jsonify({"error": "Question not found in test"}), 404
+    
+    near = request.args.get('near', '').lower() in ('1', 'true', 'yes')
+    threshold = request.args.get('threshold', NEAR_DUPLICATE_THRESHOLD, type=float)
+    if not 0 < threshold <= 1:
+        return jsonify({"error": "threshold must be between 0 and 1"}), 400
+    
+    clusters = question_clusters(test_id, question_id, near=near, threshold=threshold)
+    return jsonify({
+        "test_id": test_id,
+        "question_id": question_id,
+        "answers": sum(cluster['size'] for cluster in clusters),
+        "clusters": clusters
+    }), 200
+
+
+@bp.route('/tests/<int:test_id>/questions/<int:question_id>/clusters', methods=['PUT'])
+def grade_answer_cluster(test_id, question_id):
+    """
+    Give every answer of a cluster the same score and feedback.
+    
+    Expects ``answer_ids`` (as listed by the cluster), ``score`` and optional
+    ``feedback``. The answers and their submissions' totals are written with
+    one statement each.
+    """
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    data = request.get_json(silent=True) or {}
+    answer_ids = data.get('answer_ids')
+    score = data.get('score')
+    feedback = data.get('feedback')
+    if not isinstance(answer_ids, list) or not answer_ids or \
+            not all(isinstance(answer_id, int) and not isinstance(answer_id, bool) for answer_id in answer_ids):
+        return jsonify({"error": "answer_ids must be a non-empty list of answer ids"}), 400
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return jsonify({"error": "score must be a number"}), 400
+    if feedback is not None and not isinstance(feedback, str):
+        return jsonify({"error": "feedback must be a string"}), 400
+    
+    from server.models import TestQuestion
+    from server.services.submission_totals import recompute
+    test_question = db_session.query(TestQuestion).filter_by(test_id=test_id, question_id=question_id).first()
+    if not test_question:
+        return jsonify({"error": "Question not found in test"}), 404
+    max_points = test_question.points if test_question.points is not None else test_question.question.points
+    if score < 0 or score > max_points:
+        return jsonify({"error": f"Score must be between 0 and {max_points}"}), 400
+    
+    answer_ids = set(answer_ids)
+    rows = db_session.query(Answer.id, Answer.submission_id).join(
+        Submission, Submission.id == Answer.submission_id
+    ).filter(
+        Answer.id.in_(list(answer_ids)),
+        Answer.question_id == question_id,
+        Submission.test_id == test_id,
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED])
+    ).all()
+    missing = sorted(answer_ids - {answer_id for answer_id, _ in rows})
+    if missing:
+        return jsonify({"error": "Answers not found for this question", "answer_ids": missing}), 404
+    
+    values = {Answer.score: score, Answer.updated_at: datetime.utcnow()}
+    if feedback is not None:
+        values[Answer.feedback] = feedback
+    db_session.query(Answer).filter(Answer.id.in_(list(answer_ids))).update(values, synchronize_session=False)
+    recompute(test_id, {submission_id for _, submission_id in rows})
+    db_session.commit()
+    
+    return jsonify({
+        "test_id": test_id,
+        "question_id": question_id,
+        "graded": len(answer_ids),
+        "score": score,
+        "feedback": feedback
+    }), 200
+
+
+@bp.route('/tests/<int:test_id>/similarity', methods=['GET'])
+def get_similarity_matches(test_id):
+    """
+    List pairs of similar code answers involving a test, most similar first.
+    
+    Optional ``threshold`` (0-1, at least the stored minimum to have any
+    effect) and ``question_id`` narrow the list.
+    """
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import Test
+    from server.services.plagiarism import SIMILARITY_THRESHOLD, test_matches
+    if not db_session.query(Test).filter_by(id=test_id).first():
+        return jsonify({"error": "Test not found"}), 404
+    
+    threshold = request.args.get('threshold', SIMILARITY_THRESHOLD, type=float)
+    if not 0 <= threshold <= 1:
+        return jsonify({"error": "threshold must be between 0 and 1"}), 400
+    question_id = request.args.get('question_id', type=int)
+    
+    return jsonify({
+        "test_id": test_id,
+        "threshold": threshold,
+        "matches": test_matches(test_id, threshold, question_id)
+    }), 200
+
+
+@bp.route('/tests/<int:test_id>/similarity', methods=['POST'])
+def index_similarity(test_id):
+    """Index the code answers of a test submitted before the similarity index existed."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import Test
+    from server.services.plagiarism import index_test
+    if not db_session.query(Test).filter_by(id=test_id).first():
+        return jsonify({"error": "Test not found"}), 404
+    
+    result = index_test(test_id)
+    db_session.commit()
+    return jsonify(result), 200
+
+
 @bp.route('/submissions/<int:submission_id>/finalize', methods=['POST'])
 def finalize_grading(submission_id):
     """Finalize grading for a submission and calculate final grade."""
@@ -136,25 +430,9 @@ def finalize_grading(submission_id):
     if not submission:
         return jsonify({"error": "Submission not found"}), 404
     
-    # Calculate total score
-    total_score = 0.0
-    max_score = 0.0
-    
-    from server.models import TestQuestion
-    test_questions = db_session.query(TestQuestion).filter_by(
-        test_id=submission.test_id
-    ).all()
-    
-    answers = {a.question_id: a for a in submission.answers}
-    
-    for tq in test_questions:
-        question = tq.question
-        points = tq.points if tq.points is not None else question.points
-        max_score += points
-        
-        answer = answers.get(question.id)
-        if answer and answer.score is not None:
-            total_score += answer.score
+    # Running totals, kept up to date as answers are scored
+    total_score = submission.total_score or 0.0
+    max_score = submission.max_score or 0.0
     
     percentage = (total_score / max_score * 100) if max_score > 0 else 0
     
@@ -187,3 +465,148 @@ def finalize_grading(submission_id):
         "grade_id": grade.id
     }), 200
 
+
+@bp.route('/tests/<int:test_id>/finalize', methods=['POST'])
+def finalize_test_grading(test_id):
+    """Finalize grading for every submitted submission of a test at once."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import Test
+    test = db_session.query(Test).filter_by(id=test_id).first()
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+    
+    from server.services.grades import finalize_test
+    summary = finalize_test(test_id, user.id)
+    db_session.commit()
+    
+    return jsonify(summary), 200
+
+
+@bp.route('/cache/stats', methods=['GET'])
+def get_grading_cache_stats():
+    """Get hit/miss statistics of the code grading cache."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.services.grading_cache import get_stats
+    return jsonify(get_stats()), 200
+
+
+@bp.route('/queue', methods=['GET'])
+def get_grading_queue():
+    """Get the number of background grading jobs per status."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.services.grading_queue import get_queue_stats
+    return jsonify(get_queue_stats()), 200
+
+
+@bp.route('/submissions/<int:submission_id>/status', methods=['GET'])
+def get_grading_status(submission_id):
+    """Get background grading progress of a submission."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    submission = db_session.query(Submission).filter_by(id=submission_id).first()
+    if not submission:
+        return jsonify({"error": "Submission not found"}), 404
+    
+    from server.models import GradingJob
+    from shared.constants import GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING
+    jobs = db_session.query(GradingJob).filter_by(
+        submission_id=submission_id
+    ).order_by(GradingJob.id.asc()).all()
+    
+    jobs_data = []
+    for job in jobs:
+        jobs_data.append({
+            "id": job.id,
+            "answer_id": job.answer_id,
+            "question_id": job.answer.question_id if job.answer else None,
+            "status": job.status,
+            "attempts": job.attempts,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        })
+    
+    pending = sum(1 for job in jobs if job.status in (GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING))
+    
+    return jsonify({
+        "submission_id": submission_id,
+        "status": submission.status,
+        "pending": pending,
+        "complete": pending == 0,
+        "jobs": jobs_data
+    }), 200
+
+
+@bp.route('/tests/<int:test_id>/auto-grade', methods=['POST'])
+def auto_grade_test(test_id):
+    """Queue every submitted code answer of a test for background grading."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import Test
+    test = db_session.query(Test).filter_by(id=test_id).first()
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+    
+    data = request.get_json(silent=True) or {}
+    submission_ids = data.get('submission_ids')
+    if submission_ids is not None and (
+            not isinstance(submission_ids, list) or
+            not all(isinstance(sid, int) and not isinstance(sid, bool) for sid in submission_ids)):
+        return jsonify({"error": "submission_ids must be a list of submission ids"}), 400
+    
+    from server.services.grading_queue import enqueue_test, test_progress
+    queued = enqueue_test(test_id, submission_ids)
+    db_session.commit()
+    
+    return jsonify({**queued, "progress": test_progress(test_id)}), 202
+
+
+@bp.route('/tests/<int:test_id>/auto-grade', methods=['GET'])
+def get_auto_grade_progress(test_id):
+    """Get background grading progress of a test's code answers."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    from server.models import Test
+    test = db_session.query(Test).filter_by(id=test_id).first()
+    if not test:
+        return jsonify({"error": "Test not found"}), 404
+    
+    from server.services.grading_queue import test_progress
+    return jsonify(test_progress(test_id)), 200
+
+
+@bp.route('/questions/<int:question_id>/regrade', methods=['POST'])
+def regrade_question(question_id):
+    """Queue all submitted answers to a code question for regrading, re-running only changed test cases."""
+    user, error_response, status = require_lecturer()
+    if error_response:
+        return error_response, status
+    
+    question = db_session.query(Question).filter_by(id=question_id).first()
+    if not question:
+        return jsonify({"error": "Question not found"}), 404
+    
+    if question.type != 'code':
+        return jsonify({"error": "Only code questions can be regraded"}), 400
+    
+    from server.services.grading_queue import enqueue_question
+    queued = enqueue_question(question_id)
+    db_session.commit()
+    
+    return jsonify({"question_id": question_id, **queued}), 202
+
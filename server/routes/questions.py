@@ -3,7 +3,10 @@
 from flask import Blueprint, request, jsonify, session
 from server.database import db_session
 from server.models import Question, Topic
-from shared.constants import API_QUESTIONS, QUESTION_TYPES
+from server.services import answer_key
+from server.services.code_executor import validate_code_syntax
+from server.services.efficiency import refresh_baseline, validate_settings as validate_efficiency
+from shared.constants import API_QUESTIONS, QUESTION_TYPES, QUESTION_TYPE_MULTIPLE_CHOICE
 from datetime import datetime
 
 bp = Blueprint('questions', __name__, url_prefix=API_QUESTIONS)
@@ -23,6 +26,81 @@ def require_lecturer():
     return user, None, None
 
 
+def is_lecturer() -> bool:
+    """Whether the current user is a lecturer."""
+    user, _, _ = require_lecturer()
+    return user is not None
+
+
+def reference_fields(question: Question) -> dict:
+    """Reference solution fields, only ever returned to lecturers."""
+    return {
+        "reference_solution": question.reference_solution,
+        "reference_timings": question.reference_timings,
+        "expected_outputs": question.expected_outputs,
+        "efficiency_baseline": question.efficiency_baseline
+    }
+
+
+def answer_fields(question: Question, lecturer: bool) -> dict:
+    """Options of a multiple-choice question, with the correct answer only for lecturers."""
+    choices = answer_key.parse_choices(question)[0] if question.type == QUESTION_TYPE_MULTIPLE_CHOICE else None
+    return {
+        "correct_answer": question.correct_answer if lecturer else None,
+        "choices": choices
+    }
+
+
+def structured_choices(question_type: str, choices, correct_answer):
+    """
+    Options and correct answer to store for a question.
+    
+    Returns:
+        Tuple of (choices, correct_answer, error message or empty string)
+    """
+    if question_type != QUESTION_TYPE_MULTIPLE_CHOICE:
+        return None, correct_answer, ""
+    if choices is None:
+        # Options sent the old way, as JSON in correct_answer
+        choices, correct_answer = answer_key.split_legacy_answer(correct_answer)
+    if isinstance(correct_answer, str):
+        correct_answer = correct_answer.strip()
+    return choices, correct_answer, answer_key.validate_choices(choices, correct_answer)
+
+
+def validate_grading_policy(policy) -> str:
+    """Return an error message for an invalid grading policy, or an empty string."""
+    if policy is None:
+        return ""
+    if not isinstance(policy, dict):
+        return "grading_policy must be an object"
+    unknown = set(policy) - {"max_consecutive_timeouts", "stop_on_import_error"}
+    if unknown:
+        return f"Unknown grading_policy keys: {sorted(unknown)}"
+    max_timeouts = policy.get("max_consecutive_timeouts")
+    if max_timeouts is not None and (isinstance(max_timeouts, bool) or not isinstance(max_timeouts, int) or max_timeouts < 0):
+        return "max_consecutive_timeouts must be a non-negative integer"
+    if not isinstance(policy.get("stop_on_import_error", False), bool):
+        return "stop_on_import_error must be true or false"
+    return ""
+
+
+def refresh_reference(question: Question):
+    """Run the reference solution on new or changed test cases and benchmarks."""
+    from server.services.reference import refresh, question_timeouts
+    try:
+        refresh(question)
+    except Exception:
+        # Grading falls back to the test cases and the flat timeout, and refreshes again later
+        question.expected_outputs = None
+        question.reference_timings = None
+    try:
+        refresh_baseline(question, question_timeouts(question))
+    except Exception:
+        # Measured again when the first answer is graded
+        question.efficiency_baseline = None
+
+
 @bp.route('', methods=['GET'])
 def get_questions():
     """Get all questions, optionally filtered by topic."""
@@ -33,15 +111,19 @@ def get_questions():
         query = query.filter_by(topic_id=topic_id)
     
     questions = query.order_by(Question.created_at.desc()).all()
+    lecturer = is_lecturer()
     
     return jsonify([{
         "id": q.id,
         "topic_id": q.topic_id,
         "type": q.type,
         "content": q.content,
-        "correct_answer": q.correct_answer,
+        **answer_fields(q, lecturer),
         "test_cases": q.test_cases,
         "points": q.points,
+        "grading_policy": q.grading_policy,
+        "efficiency": q.efficiency,
+        **(reference_fields(q) if lecturer else {}),
         "created_at": q.created_at.isoformat() if q.created_at else None
     } for q in questions]), 200
 
@@ -52,15 +134,19 @@ def get_question(question_id):
     question = db_session.query(Question).filter_by(id=question_id).first()
     if not question:
         return jsonify({"error": "Question not found"}), 404
+    lecturer = is_lecturer()
     
     return jsonify({
         "id": question.id,
         "topic_id": question.topic_id,
         "type": question.type,
         "content": question.content,
-        "correct_answer": question.correct_answer,
+        **answer_fields(question, lecturer),
         "test_cases": question.test_cases,
         "points": question.points,
+        "grading_policy": question.grading_policy,
+        "efficiency": question.efficiency,
+        **(reference_fields(question) if lecturer else {}),
         "created_at": question.created_at.isoformat() if question.created_at else None
     }), 200
 
@@ -79,6 +165,9 @@ def create_question():
     correct_answer = data.get('correct_answer')
     test_cases = data.get('test_cases')
     points = data.get('points', 1.0)
+    reference_solution = data.get('reference_solution') or None
+    grading_policy = data.get('grading_policy') or None
+    efficiency = data.get('efficiency') or None
     
     if not topic_id or not question_type or not content:
         return jsonify({"error": "topic_id, type, and content are required"}), 400
@@ -86,6 +175,25 @@ def create_question():
     if question_type not in QUESTION_TYPES:
         return jsonify({"error": f"Invalid question type. Must be one of: {QUESTION_TYPES}"}), 400
     
+    choices, correct_answer, choices_error = structured_choices(question_type, data.get('choices'), correct_answer)
+    if choices_error:
+        return jsonify({"error": choices_error}), 400
+    
+    if reference_solution:
+        is_valid, syntax_error = validate_code_syntax(reference_solution)
+        if not is_valid:
+            return jsonify({"error": f"Reference solution: {syntax_error}"}), 400
+    
+    policy_error = validate_grading_policy(grading_policy)
+    if policy_error:
+        return jsonify({"error": policy_error}), 400
+    
+    efficiency_error = validate_efficiency(efficiency, test_cases)
+    if efficiency and not reference_solution:
+        efficiency_error = "Efficiency scoring requires a reference solution"
+    if efficiency_error:
+        return jsonify({"error": efficiency_error}), 400
+    
     # Verify topic exists
     topic = db_session.query(Topic).filter_by(id=topic_id).first()
     if not topic:
@@ -96,10 +204,15 @@ def create_question():
         type=question_type,
         content=content,
         correct_answer=correct_answer,
+        choices=choices,
         test_cases=test_cases,
-        points=points
+        points=points,
+        reference_solution=reference_solution,
+        grading_policy=grading_policy,
+        efficiency=efficiency
     )
     
+    refresh_reference(question)
     db_session.add(question)
     db_session.commit()
     
@@ -108,9 +221,12 @@ def create_question():
         "topic_id": question.topic_id,
         "type": question.type,
         "content": question.content,
-        "correct_answer": question.correct_answer,
+        **answer_fields(question, True),
         "test_cases": question.test_cases,
         "points": question.points,
+        "grading_policy": question.grading_policy,
+        "efficiency": question.efficiency,
+        **reference_fields(question),
         "created_at": question.created_at.isoformat() if question.created_at else None
     }), 201
 
@@ -138,23 +254,64 @@ def update_question(question_id):
         question.type = data['type']
     if 'content' in data:
         question.content = data['content']
-    if 'correct_answer' in data:
-        question.correct_answer = data['correct_answer']
+    if 'correct_answer' in data or 'choices' in data or 'type' in data:
+        choices, correct_answer, choices_error = structured_choices(
+            question.type,
+            data['choices'] if 'choices' in data else question.choices,
+            data['correct_answer'] if 'correct_answer' in data else question.correct_answer
+        )
+        if choices_error:
+            return jsonify({"error": choices_error}), 400
+        question.choices = choices
+        question.correct_answer = correct_answer
     if 'test_cases' in data:
         question.test_cases = data['test_cases']
     if 'points' in data:
         question.points = data['points']
+    if 'reference_solution' in data:
+        reference_solution = data['reference_solution'] or None
+        if reference_solution:
+            is_valid, syntax_error = validate_code_syntax(reference_solution)
+            if not is_valid:
+                return jsonify({"error": f"Reference solution: {syntax_error}"}), 400
+        question.reference_solution = reference_solution
+    if 'grading_policy' in data:
+        grading_policy = data['grading_policy'] or None
+        policy_error = validate_grading_policy(grading_policy)
+        if policy_error:
+            return jsonify({"error": policy_error}), 400
+        question.grading_policy = grading_policy
+    if 'efficiency' in data or 'test_cases' in data:
+        # New test cases may no longer have the benchmark cases of the current settings
+        efficiency = (data['efficiency'] or None) if 'efficiency' in data else question.efficiency
+        efficiency_error = validate_efficiency(efficiency, question.test_cases)
+        if efficiency and not question.reference_solution:
+            efficiency_error = "Efficiency scoring requires a reference solution"
+        if efficiency_error:
+            return jsonify({"error": efficiency_error}), 400
+        question.efficiency = efficiency
     
+    # No-op unless the reference solution or the test cases changed
+    refresh_reference(question)
+    if 'points' in data:
+        from server.services.submission_totals import recompute
+        for test_id in {tq.test_id for tq in question.test_questions}:
+            recompute(test_id)
     db_session.commit()
+    # The question may be part of any test
+    answer_key.invalidate()
     
     return jsonify({
         "id": question.id,
         "topic_id": question.topic_id,
         "type": question.type,
         "content": question.content,
-        "correct_answer": question.correct_answer,
+        **answer_fields(question, True),
         "test_cases": question.test_cases,
         "points": question.points,
+        "grading_policy": question.grading_policy,
+        "efficiency": question.efficiency,
+        **reference_fields(question),
         "created_at": question.created_at.isoformat() if question.created_at else None
     }), 200
 
@@ -172,6 +329,7 @@ def delete_question(question_id):
     
     db_session.delete(question)
     db_session.commit()
+    answer_key.invalidate()
     
     return jsonify({"message": "Question deleted successfully"}), 200
 
@@ -1,5 +1,6 @@
 """Statistics and analytics routes."""
 
+import statistics
 from flask import Blueprint, request, jsonify, session
 from server.database import db_session
 from server.models import User, Submission, Answer, Grade, Question, Topic, Test
@@ -181,6 +182,20 @@ def get_test_statistics(test_id):
             avg_score_q = 0
             max_points = tq.points if tq.points is not None else question.points
         
+        efficiency_stats = None
+        if question.efficiency:
+            # Efficiency-scored code question: how close answers came to the reference
+            summaries = [a.efficiency for a in answers if a.efficiency and a.efficiency.get('measured')]
+            cpu_ratios = [s['cpu_ratio'] for s in summaries if s.get('cpu_ratio') is not None]
+            memory_ratios = [s['memory_ratio'] for s in summaries if s.get('memory_ratio') is not None]
+            efficiency_stats = {
+                "measured_answers": len(summaries),
+                "average_points": round(sum(s['points'] for s in summaries) / len(summaries), 2) if summaries else 0,
+                "max_points": round(max_points * question.efficiency['weight'], 2),
+                "median_cpu_ratio": round(statistics.median(cpu_ratios), 2) if cpu_ratios else None,
+                "median_memory_ratio": round(statistics.median(memory_ratios), 2) if memory_ratios else None
+            }
+        
         question_stats.append({
             "question_id": question.id,
             "order": tq.order,
@@ -188,7 +203,8 @@ def get_test_statistics(test_id):
             "content": question.content[:100] + "..." if len(question.content) > 100 else question.content,
             "average_score": round(avg_score_q, 2),
             "max_points": max_points,
-            "answer_count": len(answers)
+            "answer_count": len(answers),
+            "efficiency": efficiency_stats
         })
     
     return jsonify({
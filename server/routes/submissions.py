@@ -3,8 +3,13 @@
 from flask import Blueprint, request, jsonify, session
 from server.database import db_session
 from server.models import Submission, Answer, Test, Question, TestQuestion
-from shared.constants import API_SUBMISSIONS, SUBMISSION_STATUS_NOT_STARTED, SUBMISSION_STATUS_IN_PROGRESS, SUBMISSION_STATUS_SUBMITTED
+from shared.constants import (
+    API_SUBMISSIONS, QUESTION_TYPE_CODE, SUBMISSION_STATUS_NOT_STARTED, SUBMISSION_STATUS_IN_PROGRESS,
+    SUBMISSION_STATUS_SUBMITTED
+)
 from datetime import datetime
+from sqlalchemy import select
+import math
 
 bp = Blueprint('submissions', __name__, url_prefix=API_SUBMISSIONS)
 
@@ -31,6 +36,7 @@ def get_submissions():
         query = query.filter_by(test_id=test_id)
     
     submissions = query.order_by(Submission.started_at.desc()).all()
+    lecturer = user.role != 'student'
     
     return jsonify([{
         "id": s.id,
@@ -40,7 +46,13 @@ def get_submissions():
         "username": s.user.username if s.user else None,
         "started_at": s.started_at.isoformat() if s.started_at else None,
         "submitted_at": s.submitted_at.isoformat() if s.submitted_at else None,
-        "status": s.status
+        "status": s.status,
+        # Provisional score, before grading is finalized
+        **({
+            "total_score": s.total_score,
+            "graded_count": s.graded_count,
+            "max_score": s.max_score
+        } if lecturer else {})
     } for s in submissions]), 200
 
 
@@ -127,10 +139,12 @@ def create_submission():
     if test.available_until and now > test.available_until:
         return jsonify({"error": "Test no longer available"}), 400
     
+    from server.services.submission_totals import test_max_score
     submission = Submission(
         test_id=test_id,
         user_id=user_id,
-        status=SUBMISSION_STATUS_IN_PROGRESS
+        status=SUBMISSION_STATUS_IN_PROGRESS,
+        max_score=db_session.execute(select(test_max_score(test_id))).scalar()
     )
     
     db_session.add(submission)
@@ -209,6 +223,80 @@ def save_answer(submission_id):
     }), 200
 
 
+@bp.route('/<int:submission_id>/answers/<int:question_id>/run', methods=['POST'])
+def run_answer(submission_id, question_id):
+    """Run the code of an answer in progress on the student's own input."""
+    from server.services import student_runs
+    from server.services.code_executor import compile_code
+    
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    submission = db_session.query(Submission).filter_by(id=submission_id).first()
+    if not submission:
+        return jsonify({"error": "Submission not found"}), 404
+    
+    if submission.user_id != user_id:
+        return jsonify({"error": "Access denied"}), 403
+    
+    # Runs are for answers being written: not after submitting or grading
+    if submission.status != SUBMISSION_STATUS_IN_PROGRESS:
+        return jsonify({"error": "Submission is not in progress"}), 400
+    
+    test = submission.test
+    now = datetime.utcnow()
+    if test.available_from and now < test.available_from:
+        return jsonify({"error": "Test not yet available"}), 400
+    if test.available_until and now > test.available_until:
+        return jsonify({"error": "Test no longer available"}), 400
+    
+    test_question = db_session.query(TestQuestion).filter_by(
+        test_id=submission.test_id, question_id=question_id
+    ).first()
+    if not test_question:
+        return jsonify({"error": "Question not found in test"}), 404
+    if test_question.question.type != QUESTION_TYPE_CODE:
+        return jsonify({"error": "Only code questions can be run"}), 400
+    
+    data = request.get_json() or {}
+    code = data.get('code')
+    stdin = data.get('input', '')
+    if not isinstance(code, str) or not code.strip():
+        return jsonify({"error": "code is required"}), 400
+    if not isinstance(stdin, str):
+        return jsonify({"error": "input must be a string"}), 400
+    if len(code.encode('utf-8', errors='surrogatepass')) > student_runs.MAX_RUN_CODE_BYTES:
+        return jsonify({"error": f"code is larger than {student_runs.MAX_RUN_CODE_BYTES // 1024}KB"}), 400
+    if len(stdin.encode('utf-8', errors='surrogatepass')) > student_runs.MAX_RUN_INPUT_BYTES:
+        return jsonify({"error": f"input is larger than {student_runs.MAX_RUN_INPUT_BYTES // 1024}KB"}), 400
+    
+    # Syntax errors are reported without using up a run
+    _, syntax_error = compile_code(code)
+    if syntax_error:
+        return jsonify({"success": False, "output": "", "error": syntax_error,
+                        "execution_time": 0.0, "cached": False}), 200
+    
+    retry_after = student_runs.check_rate(user_id)
+    if retry_after:
+        response = jsonify({
+            "error": f"Run limit of {student_runs.STUDENT_RUN_RATE} per minute reached; try again in {retry_after:g}s",
+            "retry_after": retry_after
+        })
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+        return response, 429
+    
+    # The database connection is not needed while the program runs
+    db_session.remove()
+    result, cached = student_runs.run(code, stdin)
+    if result is None:
+        response = jsonify({"error": "Too many programs are running right now; try again shortly"})
+        response.headers['Retry-After'] = "5"
+        return response, 503
+    
+    return jsonify({**result, "cached": cached}), 200
+
+
 @bp.route('/<int:submission_id>/submit', methods=['POST'])
 def submit_submission(submission_id):
     """Submit a test."""
@@ -228,11 +316,20 @@ def submit_submission(submission_id):
     
     submission.status = SUBMISSION_STATUS_SUBMITTED
     submission.submitted_at = datetime.utcnow()
+    
+    # Multiple-choice answers are scored right away; code answers are graded
+    # and indexed for similarity checks in the background
+    from server.services.answer_key import score_submission
+    from server.services.grading_queue import enqueue_submission
+    auto_scored = score_submission(submission)
+    grading_jobs = enqueue_submission(submission)
     db_session.commit()
     
     return jsonify({
         "id": submission.id,
         "status": submission.status,
-        "submitted_at": submission.submitted_at.isoformat() if submission.submitted_at else None
+        "submitted_at": submission.submitted_at.isoformat() if submission.submitted_at else None,
+        "auto_scored": auto_scored,
+        "grading_jobs": grading_jobs
     }), 200
 
@@ -3,7 +3,9 @@
 from flask import Blueprint, request, jsonify, session
 from server.database import db_session
 from server.models import Test, TestQuestion, Question
-from shared.constants import API_TESTS
+from server.services import answer_key
+from server.services.submission_totals import recompute as recompute_totals
+from shared.constants import API_TESTS, QUESTION_TYPE_MULTIPLE_CHOICE
 from datetime import datetime
 
 bp = Blueprint('tests', __name__, url_prefix=API_TESTS)
@@ -79,6 +81,9 @@ def get_test(test_id):
         test_id=test_id
     ).order_by(TestQuestion.order).all()
     
+    # Students taking the test must not see the answers
+    lecturer, _, _ = require_lecturer()
+    
     questions = []
     for tq in test_questions:
         q = tq.question
@@ -88,7 +93,8 @@ def get_test(test_id):
             "points": tq.points if tq.points is not None else q.points,
             "type": q.type,
             "content": q.content,
-            "correct_answer": q.correct_answer,
+            "correct_answer": q.correct_answer if lecturer else None,
+            "choices": answer_key.parse_choices(q)[0] if q.type == QUESTION_TYPE_MULTIPLE_CHOICE else None,
             "test_cases": q.test_cases if q.type == 'code' else None
         })
     
@@ -221,8 +227,12 @@ def update_test(test_id):
                     points=points
                 )
                 db_session.add(test_question)
+        
+        # Questions or their points changed
+        recompute_totals(test_id)
     
     db_session.commit()
+    answer_key.invalidate(test_id)
     
     return jsonify({
         "id": test.id,
@@ -247,6 +257,7 @@ def delete_test(test_id):
     
     db_session.delete(test)
     db_session.commit()
+    answer_key.invalidate(test_id)
     
     return jsonify({"message": "Test deleted successfully"}), 200
 
@@ -0,0 +1,70 @@
+"""Routes for standalone grading workers."""
+
+import hmac
+from flask import Blueprint, request, jsonify
+from server.services.grading_queue import GRADING_LEASE_SECONDS, GRADING_WORKER_TOKEN, complete_job, lease_jobs
+from shared.constants import API_WORKERS
+
+bp = Blueprint('workers', __name__, url_prefix=API_WORKERS)
+
+# Most jobs a worker may lease at once
+MAX_LEASE_JOBS = 64
+
+
+def require_worker():
+    """Check the worker token sent as ``Authorization: Bearer <token>``; workers have no user."""
+    if not GRADING_WORKER_TOKEN:
+        return None, jsonify({"error": "Standalone grading workers are disabled"}), 403
+    
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {GRADING_WORKER_TOKEN}".encode('utf-8')):
+        return None, jsonify({"error": "Invalid worker token"}), 401
+    
+    return None, None, None
+
+
+@bp.route('/lease', methods=['POST'])
+def lease():
+    """Lease queued grading jobs to a worker."""
+    _, error_response, status = require_worker()
+    if error_response:
+        return error_response, status
+    
+    data = request.get_json() or {}
+    worker_id = str(data.get('worker_id') or '').strip()
+    limit = data.get('limit', 1)
+    lease_seconds = data.get('lease_seconds', GRADING_LEASE_SECONDS)
+    
+    if not worker_id:
+        return jsonify({"error": "worker_id is required"}), 400
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_LEASE_JOBS:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LEASE_JOBS}"}), 400
+    if not isinstance(lease_seconds, int) or lease_seconds < 1:
+        return jsonify({"error": "lease_seconds must be a positive integer"}), 400
+    
+    return jsonify({"jobs": lease_jobs(worker_id[:100], limit, lease_seconds)}), 200
+
+
+@bp.route('/jobs/<int:job_id>/result', methods=['POST'])
+def report_result(job_id):
+    """Record the execution result (or the failure) of a leased job."""
+    _, error_response, status = require_worker()
+    if error_response:
+        return error_response, status
+    
+    data = request.get_json() or {}
+    lease_token = data.get('lease_token')
+    result = data.get('result')
+    error = data.get('error')
+    
+    if not lease_token:
+        return jsonify({"error": "lease_token is required"}), 400
+    if error is None and (not isinstance(result, dict) or not isinstance(result.get('test_results'), list)):
+        return jsonify({"error": "Either result (with test_results) or error is required"}), 400
+    
+    accepted, outcome = complete_job(job_id, lease_token, data.get('args_hash'), result, error and str(error))
+    if not accepted:
+        return jsonify({"error": outcome}), 409
+    
+    return jsonify({"job_id": job_id, "status": outcome}), 200
+
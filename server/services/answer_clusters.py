@@ -0,0 +1,223 @@
+"""Clusters of identical and near-identical answers to one question.
+
+Answers are grouped by a hash of their normalized content, so answers that
+differ only in whitespace (and, for text, letter case) land in the same
+cluster and can be graded once:
+
+* code is compared token by token, keeping indentation and comments;
+* text and multiple-choice answers are compared case-insensitively with
+  runs of whitespace collapsed;
+* diagrams are compared as stored.
+
+An optional second pass merges text clusters whose answers are near
+duplicates. Each cluster gets a MinHash signature of its word 3-shingles;
+signatures are split into bands and only clusters sharing a band are
+compared, so the pass stays close to linear in the number of answers.
+Clusters whose estimated Jaccard similarity reaches the threshold merge.
+"""
+
+import hashlib
+import io
+import random
+import re
+import tokenize
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional
+from server.database import db_session
+from server.models import Answer, Submission
+from server.services.grading_cache import normalize_code
+from shared.constants import SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+
+NEAR_DUPLICATE_THRESHOLD = 0.8  # estimated Jaccard similarity of word 3-shingles
+SAMPLE_LENGTH = 500  # characters of a cluster's answer returned as its sample
+
+SHINGLE_SIZE = 3
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4  # signature values per band
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0)  # fixed seed: signatures must not change between runs
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+
+def normalize_text(text: str) -> str:
+    """Text with case, Unicode forms and runs of whitespace made uniform."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def normalize_source(code: str) -> str:
+    """
+    Code with insignificant whitespace removed.
+    
+    Tokens are joined by single spaces and indentation is kept as tokens, so
+    only whitespace that cannot change what the code does is ignored. Code
+    that does not tokenize falls back to stripping blank lines and trailing
+    whitespace.
+    """
+    code = normalize_code(code)
+    try:
+        tokens = []
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.INDENT:
+                tokens.append("<INDENT>")
+            elif token.type == tokenize.DEDENT:
+                tokens.append("<DEDENT>")
+            elif token.type in (tokenize.NEWLINE, tokenize.NL):
+                if tokens and tokens[-1] != "\n":
+                    tokens.append("\n")
+            elif token.type != tokenize.ENDMARKER:
+                tokens.append(token.string)
+        return " ".join(tokens).strip()
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return "\n".join(line.rstrip() for line in code.split("\n") if line.strip())
+
+
+def answer_content(answer) -> Optional[str]:
+    """The part of an answer that is graded: its code, text or diagram."""
+    if answer.code:
+        return answer.code
+    if answer.answer_text:
+        return answer.answer_text
+    return answer.diagram_data
+
+
+def cluster_key(answer) -> str:
+    """Hash of an answer's normalized content."""
+    if answer.code:
+        kind, content = "code", normalize_source(answer.code)
+    elif answer.answer_text:
+        kind, content = "text", normalize_text(answer.answer_text)
+    elif answer.diagram_data:
+        kind, content = "diagram", answer.diagram_data
+    else:
+        kind, content = "empty", ""
+    material = f"{kind}\0{content}".encode("utf-8", errors="surrogatepass")
+    return hashlib.sha256(material).hexdigest()
+
+
+def shingles(text: str) -> set:
+    """Word shingles of normalized text; short texts are one shingle, texts without words none."""
+    words = re.findall(r"\w+", normalize_text(text))
+    if not words:
+        return set()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(features: set) -> List[int]:
+    """MinHash signature of a set of strings."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(feature.encode("utf-8", errors="surrogatepass"), digest_size=8).digest(), "big")
+        for feature in features
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature: List[int], other: List[int]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(x == y for x, y in zip(signature, other)) / len(signature)
+
+
+def merge_near_duplicates(texts: Dict[str, str], threshold: float) -> Dict[str, str]:
+    """
+    Group near-duplicate texts.
+    
+    Args:
+        texts: Text of each exact cluster, by cluster key
+        threshold: Minimum estimated similarity to merge two clusters
+    
+    Returns:
+        Key of the merged cluster each key belongs to; texts without words
+        (e.g. only punctuation) stay in their exact cluster
+    """
+    features = {key: shingles(text) for key, text in texts.items()}
+    signatures = {key: minhash(shingle_set) for key, shingle_set in features.items() if shingle_set}
+    parent = {key: key for key in texts}
+    
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+    
+    # Only clusters that share every value of at least one band are compared
+    buckets = defaultdict(list)
+    for key, signature in signatures.items():
+        for band in range(MINHASH_BANDS):
+            rows = tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])
+            buckets[(band, rows)].append(key)
+    
+    compared = set()
+    for keys in buckets.values():
+        for i, key in enumerate(keys):
+            for other in keys[i + 1:]:
+                pair = (key, other) if key < other else (other, key)
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                if similarity(signatures[key], signatures[other]) >= threshold:
+                    root, other_root = find(key), find(other)
+                    if root != other_root:
+                        parent[max(root, other_root)] = min(root, other_root)
+    
+    return {key: find(key) for key in texts}
+
+
+def question_clusters(test_id: int, question_id: int, near: bool = False,
+                      threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Dict]:
+    """
+    Cluster the submitted answers to one question of a test.
+    
+    Args:
+        test_id: Test ID
+        question_id: Question ID
+        near: Also merge near-duplicate text answers
+        threshold: Minimum estimated similarity for near duplicates
+    
+    Returns:
+        Clusters, largest first, each with its key, answer ids, a sample answer
+        and the distinct scores its answers have so far
+    """
+    answers = db_session.query(
+        Answer.id, Answer.answer_text, Answer.code, Answer.diagram_data, Answer.score
+    ).join(
+        Submission, Submission.id == Answer.submission_id
+    ).filter(
+        Answer.question_id == question_id,
+        Submission.test_id == test_id,
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED])
+    ).order_by(Answer.id.asc()).all()
+    
+    groups = defaultdict(list)
+    for answer in answers:
+        groups[cluster_key(answer)].append(answer)
+    
+    if near:
+        texts = {
+            key: members[0].answer_text for key, members in groups.items()
+            if not members[0].code and members[0].answer_text
+        }
+        merged = defaultdict(list)
+        roots = merge_near_duplicates(texts, threshold)
+        for key, members in groups.items():
+            merged[roots.get(key, key)].extend(members)
+        groups = merged
+    
+    clusters = []
+    for key, members in groups.items():
+        members.sort(key=lambda answer: answer.id)
+        scores = sorted({answer.score for answer in members if answer.score is not None})
+        clusters.append({
+            "key": key,
+            "size": len(members),
+            "answer_ids": [answer.id for answer in members],
+            "sample": (answer_content(members[0]) or "")[:SAMPLE_LENGTH],
+            "graded": sum(answer.score is not None for answer in members),
+            "scores": scores
+        })
+    clusters.sort(key=lambda cluster: (-cluster["size"], cluster["answer_ids"][0]))
+    return clusters
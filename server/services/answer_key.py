@@ -0,0 +1,134 @@
+"""Multiple-choice answer keys and instant scoring.
+
+A multiple-choice question stores its options in ``choices`` and the correct
+option in ``correct_answer``. Older questions keep both as JSON in
+``correct_answer`` (``{"choices": [...], "correct": "..."}``); they are read
+the same way and converted when next saved.
+
+Submitting a test scores its multiple-choice answers on the spot against the
+test's answer key: the correct option and points of every multiple-choice
+question, built with one query the first time the test is submitted and kept
+in memory until the test or one of its questions changes.
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+from server.database import db_session
+from server.models import Question, Submission, TestQuestion
+from server.services.submission_totals import set_score
+from shared.constants import QUESTION_TYPE_MULTIPLE_CHOICE
+
+_keys = {}  # test id -> {question id: (correct option, points)}
+_generation = 0  # bumped by every invalidation
+_lock = threading.Lock()
+
+
+def parse_choices(question: Question) -> Tuple[Optional[List[str]], Optional[str]]:
+    """
+    Options and correct option of a multiple-choice question.
+    
+    Returns:
+        Tuple of (choices, correct): choices is None if the question has none
+    """
+    if question.choices:
+        return question.choices, question.correct_answer
+    return split_legacy_answer(question.correct_answer)
+
+
+def split_legacy_answer(correct_answer: Optional[str]) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Options and correct option stored the old way, as JSON in ``correct_answer``."""
+    try:
+        data = json.loads(correct_answer or "")
+    except (ValueError, TypeError):
+        return None, correct_answer
+    if isinstance(data, dict):
+        choices = data.get('choices')
+        return (choices if isinstance(choices, list) else None), data.get('correct')
+    return None, correct_answer
+
+
+def validate_choices(choices, correct_answer) -> str:
+    """Return an error message for invalid multiple-choice options, or an empty string."""
+    if choices is None:
+        return ""
+    if not isinstance(choices, list) or not choices or \
+            not all(isinstance(choice, str) and choice.strip() for choice in choices):
+        return "choices must be a non-empty list of non-empty strings"
+    if len({choice.strip() for choice in choices}) != len(choices):
+        return "choices must be distinct"
+    if not isinstance(correct_answer, str) or correct_answer.strip() not in {choice.strip() for choice in choices}:
+        return "correct_answer must be one of the choices"
+    return ""
+
+
+def answer_key(test_id: int) -> Dict[int, Tuple[str, float]]:
+    """
+    Correct option and points of every multiple-choice question of a test, by question id.
+    
+    A key is only kept if nothing was invalidated while it was built, since it
+    may have been read from the questions before they changed.
+    """
+    with _lock:
+        key = _keys.get(test_id)
+        generation = _generation
+    if key is not None:
+        return key
+    
+    rows = db_session.query(Question, TestQuestion.points).join(
+        TestQuestion, TestQuestion.question_id == Question.id
+    ).filter(
+        TestQuestion.test_id == test_id,
+        Question.type == QUESTION_TYPE_MULTIPLE_CHOICE
+    ).all()
+    
+    key = {}
+    for question, test_points in rows:
+        _, correct = parse_choices(question)
+        if correct:
+            key[question.id] = (correct.strip(), test_points if test_points is not None else question.points)
+    
+    with _lock:
+        if _generation == generation:
+            _keys[test_id] = key
+    return key
+
+
+def invalidate(test_id: Optional[int] = None):
+    """Forget the answer key of a test, or of every test."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if test_id is None:
+            _keys.clear()
+        else:
+            _keys.pop(test_id, None)
+
+
+def score_submission(submission: Submission) -> int:
+    """
+    Score the multiple-choice answers of a submission against its test's answer key.
+    
+    The caller commits.
+    
+    Returns:
+        Number of answers scored
+    """
+    key = answer_key(submission.test_id)
+    if not key:
+        return 0
+    
+    scored = 0
+    for answer in submission.answers:
+        entry = key.get(answer.question_id)
+        if entry is None:
+            continue
+        correct, points = entry
+        if (answer.answer_text or "").strip() == correct:
+            set_score(answer, points)
+            answer.feedback = "Correct."
+        else:
+            set_score(answer, 0.0)
+            answer.feedback = "Incorrect."
+        scored += 1
+    return scored
@@ -0,0 +1,103 @@
+"""Per-test-case results of graded code answers.
+
+Every graded code answer keeps one compact row per test case, keyed by a hash
+of the test case (including its expected output and timeout) and stamped
+with a hash of the code that ran. After a question's test cases are edited,
+only the cases without a row for the answer's current code have to run
+again; the score is recomputed from the stored rows.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+from server.database import db_session
+from server.models import TestCaseResult
+from server.services.code_executor import (
+    CODE_MEMORY_LIMIT, CODE_OUTPUT_LIMIT, CODE_EXECUTION_MODE, CODE_TIMEOUT, describe_test_case
+)
+from server.services.grading_cache import normalize_code
+
+# Stored text is truncated; it is only used for feedback
+MAX_STORED_TEXT = 1000
+
+
+def code_hash(code: str) -> str:
+    """Hash of an answer's code."""
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+
+def case_hashes(test_cases: List[Dict], case_timeouts: Optional[List[float]] = None,
+                expected_outputs: Optional[List[Optional[Dict]]] = None,
+                policy: Optional[Dict] = None) -> List[str]:
+    """Hash of every test case together with everything its outcome depends on."""
+    hashes = []
+    for idx, test_case in enumerate(test_cases):
+        material = json.dumps({
+            "test_case": test_case,
+            "timeout": case_timeouts[idx] if case_timeouts else CODE_TIMEOUT,
+            "expected": expected_outputs[idx] if expected_outputs else None,
+            "policy": policy,
+            "memory_limit": CODE_MEMORY_LIMIT,
+            "output_limit": CODE_OUTPUT_LIMIT,
+            "mode": CODE_EXECUTION_MODE,
+        }, sort_keys=True, default=str)
+        hashes.append(hashlib.sha256(material.encode('utf-8')).hexdigest())
+    return hashes
+
+
+def load(answer_id: int, code: str) -> Dict[str, TestCaseResult]:
+    """Stored results of an answer's current code, by case hash."""
+    rows = db_session.query(TestCaseResult).filter_by(answer_id=answer_id, code_hash=code_hash(code)).all()
+    return {row.case_hash: row for row in rows}
+
+
+def record(answer_id: int, code: str, hashes: List[str], test_results: List[Dict]):
+    """
+    Replace an answer's stored results with fresh ones.
+    
+    Args:
+        answer_id: Graded answer
+        code: Code the results were produced by
+        hashes: Case hash per test case (see case_hashes)
+        test_results: Test results per test case, as produced by execute_code;
+            empty (e.g. for a syntax error) just clears the stored results;
+            cases skipped by a grading policy are not stored, so they run again
+    """
+    current_code = code_hash(code)
+    existing = {row.case_hash: row for row in db_session.query(TestCaseResult).filter_by(answer_id=answer_id)}
+    keep = set()
+    
+    for case, test in zip(hashes, test_results):
+        if test.get('skipped'):
+            continue
+        keep.add(case)
+        row = existing.get(case)
+        if row is None:
+            row = TestCaseResult(answer_id=answer_id, case_hash=case)
+            db_session.add(row)
+            existing[case] = row
+        row.code_hash = current_code
+        row.passed = bool(test.get('passed'))
+        row.actual_output = str(test.get('actual_output', ''))[:MAX_STORED_TEXT]
+        row.error = str(test.get('error') or '')[:MAX_STORED_TEXT] or None
+        row.execution_time = test.get('execution_time')
+    
+    for case, row in existing.items():
+        if case not in keep:
+            db_session.delete(row)
+
+
+def to_test_result(row: TestCaseResult, index: int, test_case: Dict, precomputed: Optional[Dict] = None) -> Dict:
+    """Rebuild an execute_code test result from a stored row."""
+    test_input, expected_output = describe_test_case(test_case, precomputed)
+    return {
+        "test_case": index + 1,
+        "input": test_input,
+        "expected_output": expected_output,
+        "actual_output": row.actual_output or '',
+        "passed": row.passed,
+        "error": row.error or '',
+        "execution_time": row.execution_time,
+        "stored": True
+    }
+
@@ -3,70 +3,139 @@
 import subprocess
 import sys
 import os
-import psutil
+import hashlib
 import json
+import math
+import signal
+import statistics
 import tempfile
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from server.services import harness
+from server.services.zygote import ZygotePool, PROJECT_ROOT, apply_limits, case_result, communicate
+from server.services.scheduler import ExecutionScheduler
 
 load_dotenv()
 
 CODE_TIMEOUT = int(os.getenv("CODE_EXECUTION_TIMEOUT", 5))
 CODE_MEMORY_LIMIT = int(os.getenv("CODE_EXECUTION_MEMORY_LIMIT", 128))  # MB
+# Output kept per stream and run; a program printing more is killed
+CODE_OUTPUT_LIMIT = int(os.getenv("CODE_EXECUTION_OUTPUT_LIMIT", 1024))  # KB
+# "forkserver" forks each run from a warm zygote; "subprocess" starts a fresh interpreter;
+# "harness" runs all test cases of an answer in one forked child
+CODE_EXECUTION_MODE = os.getenv("CODE_EXECUTION_MODE", "forkserver" if hasattr(os, "fork") else "subprocess")
+# Maximum number of student programs running at the same time
+CODE_EXECUTION_WORKERS = int(os.getenv("CODE_EXECUTION_WORKERS", os.cpu_count() or 1))
+
+# Compiled programs kept in memory, most recently used first
+CODE_BYTECODE_CACHE_SIZE = int(os.getenv("CODE_BYTECODE_CACHE_SIZE", 256))
+
+# Source passed to a fresh interpreter with -c must fit in one command-line argument
+MAX_INLINE_CODE_BYTES = 100 * 1024
+
+_OUTPUT_LIMIT_BYTES = CODE_OUTPUT_LIMIT * 1024
+_READ_CHUNK = 65536
+
+_zygote = None
+_zygote_lock = threading.Lock()
+
+_bytecode_cache = OrderedDict()
+_bytecode_lock = threading.Lock()
+
+# Test cases and answers are fanned out on separate pools: answer tasks wait on
+# case tasks, so sharing one bounded pool could deadlock.
+_case_scheduler = ExecutionScheduler(CODE_EXECUTION_WORKERS, name="code-exec-case")
+_answer_scheduler = ExecutionScheduler(CODE_EXECUTION_WORKERS, name="code-exec-answer")
 
 
 class CodeExecutionResult:
     """Result of code execution."""
-    def __init__(self, success: bool, output: str = "", error: str = "", execution_time: float = 0.0):
+    def __init__(self, success: bool, output: str = "", error: str = "", execution_time: float = 0.0,
+                 cpu_time: Optional[float] = None, peak_memory_mb: Optional[float] = None):
         self.success = success
         self.output = output
         self.error = error
-        self.execution_time = execution_time
+        self.execution_time = execution_time  # Wall-clock seconds
+        self.cpu_time = cpu_time  # User + system CPU seconds, None if unavailable
+        self.peak_memory_mb = peak_memory_mb  # Peak resident memory, None if unavailable
     
     def to_dict(self) -> Dict:
         return {
             "success": self.success,
             "output": self.output,
             "error": self.error,
-            "execution_time": self.execution_time
+            "execution_time": self.execution_time,
+            "cpu_time": self.cpu_time,
+            "peak_memory_mb": self.peak_memory_mb
         }
 
 
-def execute_code(code: str, test_cases: Optional[List[Dict]] = None, timeout: int = CODE_TIMEOUT) -> Dict:
+def execute_code(code: str, test_cases: Optional[List[Dict]] = None, timeout: float = CODE_TIMEOUT,
+                 case_timeouts: Optional[List[float]] = None,
+                 expected_outputs: Optional[List[Optional[Dict]]] = None,
+                 policy: Optional[Dict] = None, benchmark: Optional[Dict] = None) -> Dict:
     """
     Execute Python code safely with test cases.
     
     Args:
         code: Python code to execute
-        test_cases: List of test cases with 'input' and 'output' keys
+        test_cases: List of test cases. Program test cases have 'input' and
+            'output' keys; the input is fed to the program on stdin and the
+            output compared with its stdout. Function test cases have
+            'function', 'args', 'kwargs' and 'expected' keys; the function is
+            called and its return value compared with 'expected'.
         timeout: Execution timeout in seconds
+        case_timeouts: Optional timeout per test case, e.g. calibrated from a
+            reference solution; overrides ``timeout``
+        expected_outputs: Optional precomputed ``{"output": ...}`` per test
+            case (None to use the test case's own value), already normalized
+        policy: Optional grading policy for stopping early (see
+            ``harness.EarlyExit``); test cases it skips fail with a "Not run"
+            error and have a "skipped" reason
+        benchmark: Optional ``{"test_cases", "repeats"}`` to measure as well
+            (see run_benchmarks); the measurements are returned as "benchmarks"
     
     Returns:
         Dictionary with execution results
     """
-    if not test_cases:
+    # Compiled once here; children load the bytecode instead of compiling again
+    bytecode, _ = compile_code(code)
+    
+    if not test_cases and not benchmark:
         # Just execute the code and return output
-        return _execute_single(code, timeout)
+        return _execute_single(code, timeout, bytecode=bytecode)
+    
+    if case_timeouts:
+        # The longest case timeout also bounds loading the module for function test cases
+        test_cases = [dict(test_case, timeout=case_timeout) for test_case, case_timeout in zip(test_cases, case_timeouts)]
+        timeout = max(case_timeouts)
     
     # Execute with test cases
+    if CODE_EXECUTION_MODE == "harness":
+        runs = _execute_harness(code, test_cases, timeout, policy, bytecode)
+    else:
+        runs = _execute_cases(code, test_cases, timeout, policy, bytecode)
+    
     results = []
     all_passed = True
     
-    for idx, test_case in enumerate(test_cases):
-        test_input = test_case.get('input', '')
-        expected_output = test_case.get('output', '')
-        
-        # Prepare code with test input
-        test_code = _prepare_test_code(code, test_input)
-        
-        # Execute
-        result = _execute_single(test_code, timeout)
-        
-        # Compare output
-        actual_output = result['output'].strip() if result['success'] else ''
-        expected_output_str = str(expected_output).strip()
-        
-        passed = actual_output == expected_output_str
+    for idx, (test_case, result) in enumerate(zip(test_cases, runs)):
+        precomputed = expected_outputs[idx] if expected_outputs else None
+        test_input, expected_output_str = describe_test_case(test_case, precomputed)
+        if harness.is_function_case(test_case):
+            expected_output = precomputed['output'] if precomputed else test_case.get('expected')
+            return_value = result.get('return_value')
+            
+            # Compare return value
+            passed = result['success'] and _values_equal(return_value, expected_output)
+            actual_output = json.dumps(return_value) if result['success'] else ''
+        else:
+            # Compare output
+            actual_output = result['output'].strip() if result['success'] else ''
+            passed = actual_output == expected_output_str
         all_passed = all_passed and passed
         
         results.append({
@@ -75,135 +144,500 @@ def execute_code(code: str, test_cases: Optional[List[Dict]] = None, timeout: in
             "expected_output": expected_output_str,
             "actual_output": actual_output,
             "passed": passed,
-            "error": result.get('error', '')
+            "error": result.get('error', ''),
+            "timeout": harness.case_timeout(test_case, timeout),
+            "skipped": result.get('skipped'),
+            "execution_time": result.get('execution_time', 0.0),
+            "cpu_time": result.get('cpu_time'),
+            "peak_memory_mb": result.get('peak_memory_mb')
         })
     
-    return {
+    execution = {
         "success": all_passed,
         "all_passed": all_passed,
         "passed_count": sum(1 for r in results if r['passed']),
         "total_count": len(results),
         "test_results": results
     }
+    if benchmark:
+        execution["benchmarks"] = run_benchmarks(code, benchmark, bytecode)
+    return execution
 
 
-def _prepare_test_code(code: str, test_input: str) -> str:
-    """Prepare code with test input."""
-    # If test_input is provided, try to inject it
-    # This is a simple approach - for more complex cases, we might need to parse the code
-    if test_input:
-        # Try to handle input() calls
-        # Replace input() with the test input
-        lines = code.split('\n')
-        prepared_lines = []
-        input_used = False
-        
-        for line in lines:
-            if 'input()' in line and not input_used:
-                # Replace with test input
-                line = line.replace('input()', repr(test_input))
-                input_used = True
-            prepared_lines.append(line)
+def run_program(code: str, stdin: str = "", timeout: float = CODE_TIMEOUT,
+                zygote: Optional[ZygotePool] = None) -> Dict:
+    """
+    Run code once on the given input, without test cases.
+    
+    Args:
+        code: Python code to execute
+        stdin: Text fed to the program on standard input
+        timeout: Execution timeout in seconds
+        zygote: Fork-server pool to run on instead of the shared one, so
+            callers can keep their runs from competing with grading
+    
+    Returns:
+        Execution result (see CodeExecutionResult)
+    """
+    bytecode, syntax_error = compile_code(code)
+    if syntax_error:
+        return _error_result(syntax_error)
+    return _execute_single(code, timeout, stdin, bytecode, zygote)
+
+
+def run_benchmarks(code: str, benchmark: Dict, bytecode: Optional[str] = None) -> List[Dict]:
+    """
+    Run every benchmark test case several times and measure its cost.
+    
+    Args:
+        code: Python code to measure
+        benchmark: ``{"test_cases": [...], "repeats": n}``
+        bytecode: Optional precompiled ``code``
+    
+    Returns:
+        Per benchmark case: whether every run succeeded ("passed", else the
+        first "error") and the median "cpu_time" (seconds) and
+        "peak_memory_mb" over the runs (None where the platform does not
+        report them)
+    """
+    if bytecode is None:
+        bytecode, _ = compile_code(code)
+    
+    test_cases = benchmark['test_cases']
+    repeats = max(1, int(benchmark.get('repeats', 1)))
+    timeout = max([harness.case_timeout(test_case, CODE_TIMEOUT) for test_case in test_cases] or [CODE_TIMEOUT])
+    
+    # Function cases share a harness process per repeat, program cases get one process per run
+    runs = []
+    for _ in range(repeats):
+        runs.append(_execute_cases(code, test_cases, timeout, bytecode=bytecode))
+    
+    measurements = []
+    for idx in range(len(test_cases)):
+        samples = [repeat[idx] for repeat in runs]
+        cpu_times = [run['cpu_time'] for run in samples if run.get('cpu_time') is not None]
+        memory = [run['peak_memory_mb'] for run in samples if run.get('peak_memory_mb') is not None]
+        errors = [run.get('error') or "Failed" for run in samples if not run['success']]
+        measurements.append({
+            "passed": not errors,
+            "error": errors[0].strip().splitlines()[-1][:200] if errors else None,
+            "cpu_time": round(statistics.median(cpu_times), 6) if len(cpu_times) == repeats else None,
+            "peak_memory_mb": round(statistics.median(memory), 2) if len(memory) == repeats else None
+        })
+    return measurements
+
+
+def _execute_cases(code: str, test_cases: List[Dict], timeout: float, policy: Optional[Dict] = None,
+                   bytecode: Optional[str] = None) -> List[Dict]:
+    """
+    Run program test cases one process each and all function test cases in one harness process.
+    
+    Without a policy every group runs at once. With one, groups run in waves
+    of at most ``CODE_EXECUTION_WORKERS`` so the policy can stop before the
+    next wave; cases after the stop are marked as skipped.
+    
+    Returns:
+        One execution result per test case, in order
+    """
+    function_indexes = [idx for idx, test_case in enumerate(test_cases) if harness.is_function_case(test_case)]
+    groups = [[idx] for idx, test_case in enumerate(test_cases) if not harness.is_function_case(test_case)]
+    if function_indexes:
+        groups.insert(0, function_indexes)
+    
+    def run_group(indexes):
+        if harness.is_function_case(test_cases[indexes[0]]):
+            return _execute_harness(code, [test_cases[idx] for idx in indexes], timeout, policy, bytecode)
+        test_case = test_cases[indexes[0]]
+        return [_execute_single(code, harness.case_timeout(test_case, timeout),
+                                stdin=str(test_case.get('input', '')), bytecode=bytecode)]
+    
+    early_exit = harness.EarlyExit(policy)
+    wave_size = _case_scheduler.max_workers if early_exit else max(1, len(groups))
+    runs = [None] * len(test_cases)
+    for start in range(0, len(groups), wave_size):
+        wave = groups[start:start + wave_size]
+        if early_exit.reason:
+            for indexes in wave:
+                for idx in indexes:
+                    runs[idx] = _run_result(harness.skipped_result(early_exit.reason), timeout)
+            continue
         
-        code = '\n'.join(prepared_lines)
+        for indexes, group_runs in zip(wave, _case_scheduler.map(run_group, wave)):
+            for idx, run in zip(indexes, group_runs):
+                runs[idx] = run
+                if run.get('skipped'):
+                    # The harness already applied the policy to the function test cases
+                    early_exit.reason = early_exit.reason or run['skipped']
+                elif not early_exit.reason:
+                    early_exit.observe(is_timeout(run), run.get('error', ''))
+    return runs
+
+
+def is_timeout(result: Dict) -> bool:
+    """Whether an execution result failed by running out of wall-clock or CPU time."""
+    return result.get('error', '').startswith(("Execution timeout", "CPU time limit exceeded"))
+
+
+def describe_test_case(test_case: Dict, precomputed: Optional[Dict] = None) -> Tuple[str, str]:
+    """
+    Input and expected output of a test case as shown in test results.
+    
+    Args:
+        test_case: Program or function test case
+        precomputed: Optional precomputed ``{"output": ...}`` overriding the test case's own
+    
+    Returns:
+        Tuple of (input, expected output)
+    """
+    if harness.is_function_case(test_case):
+        expected = precomputed['output'] if precomputed else test_case.get('expected')
+        return _describe_call(test_case), json.dumps(expected)
+    if precomputed:
+        return test_case.get('input', ''), precomputed['output']
+    return test_case.get('input', ''), str(test_case.get('output', '')).strip()
+
+
+def _describe_call(test_case: Dict) -> str:
+    """Render a function test case as a call expression, e.g. ``add(1, 2)``."""
+    arguments = [json.dumps(arg) for arg in test_case.get('args') or []]
+    arguments += [f"{name}={json.dumps(value)}" for name, value in (test_case.get('kwargs') or {}).items()]
+    return f"{test_case['function']}({', '.join(arguments)})"
+
+
+def _values_equal(actual, expected) -> bool:
+    """
+    Compare a return value with the expected value structurally.
     
-    return code
+    Both sides are plain JSON data. Floats compare with a small tolerance and
+    booleans never equal numbers.
+    """
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return type(actual) is type(expected) and actual == expected
+    if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+        if isinstance(actual, float) or isinstance(expected, float):
+            return math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-9)
+        return actual == expected
+    if isinstance(actual, list) and isinstance(expected, list):
+        return len(actual) == len(expected) and all(map(_values_equal, actual, expected))
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        return actual.keys() == expected.keys() and all(_values_equal(actual[key], expected[key]) for key in expected)
+    return actual == expected
+
+
+def _get_zygote() -> ZygotePool:
+    """Return the shared fork-server pool, creating it on first use."""
+    global _zygote
+    with _zygote_lock:
+        if _zygote is None:
+            _zygote = ZygotePool(CODE_EXECUTION_WORKERS)
+        return _zygote
+
+
+def _execute_single(code: str, timeout: float, stdin: str = "", bytecode: Optional[str] = None,
+                    zygote: Optional[ZygotePool] = None) -> Dict:
+    """Execute code once, feeding ``stdin`` to the program, and return result."""
+    if CODE_EXECUTION_MODE != "subprocess" and hasattr(os, "fork"):
+        return _execute_forked(code, timeout, stdin, bytecode, zygote)
+    # A fresh interpreter gets the source; it compiles no slower than it would unmarshal
+    return _execute_subprocess(code, timeout, stdin)
 
 
-def _execute_single(code: str, timeout: int) -> Dict:
-    """Execute code once and return result."""
+def _error_result(error: str, execution_time: float = 0.0) -> Dict:
+    """Execution result for a run that produced no usable output."""
+    return {
+        "success": False,
+        "output": "",
+        "error": error,
+        "execution_time": execution_time,
+        "cpu_time": None,
+        "peak_memory_mb": None
+    }
+
+
+def _execute_forked(code: str, timeout: float, stdin: str = "", bytecode: Optional[str] = None,
+                    zygote: Optional[ZygotePool] = None) -> Dict:
+    """Execute code in a child forked from the zygote (the shared pool unless ``zygote`` is given)."""
     try:
-        # Create temporary file for code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
-        
-        try:
-            # Execute with timeout and resource limits
-            process = subprocess.Popen(
-                [sys.executable, temp_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=tempfile.gettempdir()
+        run = (zygote or _get_zygote()).run(
+            code, stdin=stdin, timeout=timeout,
+            memory_limit=CODE_MEMORY_LIMIT, output_limit=_OUTPUT_LIMIT_BYTES, bytecode=bytecode
+        )
+    except Exception as e:
+        return _error_result(f"Execution error: {str(e)}")
+    return _run_result(run, timeout)
+
+
+def _execute_harness(code: str, test_cases: List[Dict], timeout: float, policy: Optional[Dict] = None,
+                     bytecode: Optional[str] = None) -> List[Dict]:
+    """Execute code against all test cases in a single harness request."""
+    test_cases = [harness.runnable_case(test_case) for test_case in test_cases]
+    try:
+        if hasattr(os, "fork"):
+            batch = _get_zygote().run_batch(
+                code, test_cases, timeout=timeout, memory_limit=CODE_MEMORY_LIMIT,
+                output_limit=_OUTPUT_LIMIT_BYTES, policy=policy, bytecode=bytecode
             )
-            
-            # Monitor memory usage
-            try:
-                p = psutil.Process(process.pid)
-                memory_mb = p.memory_info().rss / 1024 / 1024
-                
-                if memory_mb > CODE_MEMORY_LIMIT:
-                    process.terminate()
-                    return {
-                        "success": False,
-                        "output": "",
-                        "error": f"Memory limit exceeded ({memory_mb:.1f}MB > {CODE_MEMORY_LIMIT}MB)",
-                        "execution_time": 0.0
-                    }
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass  # Process might have finished already
-            
-            # Wait for completion with timeout
-            try:
-                stdout, stderr = process.communicate(timeout=timeout)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                process.communicate()
-                return {
-                    "success": False,
-                    "output": "",
-                    "error": f"Execution timeout ({timeout}s)",
-                    "execution_time": timeout
-                }
-            
-            # Check return code
-            if process.returncode != 0:
-                return {
-                    "success": False,
-                    "output": stdout,
-                    "error": stderr,
-                    "execution_time": 0.0
-                }
-            
-            return {
-                "success": True,
-                "output": stdout,
-                "error": "",
-                "execution_time": 0.0
-            }
-            
+        else:
+            batch = {"results": harness.run_cases(
+                code, test_cases, timeout, _OUTPUT_LIMIT_BYTES, policy, bytecode, runner=_run_case_subprocess
+            )}
+    except Exception as e:
+        batch = {"results": None, "stderr": f"Execution error: {str(e)}", "timed_out": False}
+    
+    runs = batch.get('results')
+    if runs is None:
+        # The harness itself died (e.g. killed by the backstop timeout or a resource limit)
+        error = _limit_error(batch, timeout) or batch.get('stderr', '')
+        return [_error_result(error) for _ in test_cases]
+    return [_run_result(run, harness.case_timeout(test_case, timeout)) for test_case, run in zip(test_cases, runs)]
+
+
+def _run_case_subprocess(code_obj, test_case: Dict, timeout: float, output_limit: int) -> Dict:
+    """
+    Run one test case of a harness request in a fresh interpreter, where fork is unavailable.
+    
+    The harness reports on the stdout of the process running the student
+    code, which can write a report of its own instead. Every case therefore
+    gets its own interpreter, so a fake report can only describe that case,
+    and only what the code could have produced by itself is taken from it;
+    time, CPU and memory are measured from outside (see ``case_result``).
+    """
+    request = json.dumps({
+        "bytecode": harness.dump_code(code_obj), "test_case": test_case,
+        "timeout": timeout, "output_limit": output_limit
+    })
+    # Function cases load the module first, which has the default timeout
+    budget = harness.case_timeout(test_case, timeout) + (timeout if harness.is_function_case(test_case) else 0) + 1
+    # Output and return value are capped by the harness; this bounds the report as a whole
+    report_limit = 4 * output_limit + 65536 if output_limit else 0
+    args = [sys.executable, "-m", "server.services.harness"]
+    env = {**os.environ, "PYTHONPATH": PROJECT_ROOT}
+    if hasattr(os, "wait4"):
+        run = _run_limited_subprocess(args, budget, request, report_limit, env)
+    else:
+        run = _run_plain_subprocess(args, budget, request, report_limit, env)
+    try:
+        reported = json.loads(run.pop("stdout")) if run["returncode"] == 0 else None
+    except ValueError:
+        reported = None
+    return case_result(reported, run)
+
+
+def _limit_error(run: Dict, timeout: float) -> Optional[str]:
+    """Describe the limit a run was stopped by, if any."""
+    if run.get('timed_out'):
+        return f"Execution timeout ({timeout:g}s)"
+    if run.get('output_limit_exceeded'):
+        return f"Output limit exceeded ({CODE_OUTPUT_LIMIT}KB)"
+    if hasattr(signal, "SIGXCPU") and run.get('returncode') == -signal.SIGXCPU:
+        return f"CPU time limit exceeded ({timeout:g}s)"
+    if run.get('returncode') and run.get('stderr', '').rstrip().endswith("MemoryError"):
+        return f"Memory limit exceeded ({CODE_MEMORY_LIMIT}MB)"
+    return None
+
+
+def _run_result(run: Dict, timeout: float) -> Dict:
+    """Convert a raw zygote/harness/subprocess run into an execution result."""
+    usage = {
+        "execution_time": run.get('wall_time', 0.0),
+        "cpu_time": run.get('cpu_time'),
+        "peak_memory_mb": run.get('peak_memory_mb')
+    }
+    
+    if 'return_value' in run:
+        # Function test case
+        usage['return_value'] = run['return_value']
+    
+    if run.get('skipped'):
+        # Not run because a grading policy stopped early
+        return {"success": False, "output": "", "error": f"Not run: {run['skipped']}", "skipped": run['skipped'], **usage}
+    
+    limit_error = _limit_error(run, timeout)
+    if limit_error:
+        return {"success": False, "output": "", "error": limit_error, **usage}
+    
+    if run['returncode'] != 0:
+        error = run['stderr']
+        if run['returncode'] < 0 and not error:
+            error = f"Process terminated by signal {-run['returncode']}"
+        return {"success": False, "output": run['stdout'], "error": error, **usage}
+    
+    return {"success": True, "output": run['stdout'], "error": "", **usage}
+
+
+def _execute_subprocess(code: str, timeout: float, stdin: str = "") -> Dict:
+    """Execute code in a fresh interpreter process."""
+    if len(code.encode('utf-8')) > MAX_INLINE_CODE_BYTES:
+        return _error_result(f"Execution error: code is larger than {MAX_INLINE_CODE_BYTES // 1024}KB")
+    
+    # The source goes on the command line and the test input on stdin, so nothing touches the disk
+    args = [sys.executable, "-c", code]
+    try:
+        if hasattr(os, "wait4"):
+            run = _run_limited_subprocess(args, timeout, stdin)
+        else:
+            run = _run_plain_subprocess(args, timeout, stdin)
+        return _run_result(run, timeout)
+    except Exception as e:
+        return _error_result(f"Execution error: {str(e)}")
+
+
+def _run_limited_subprocess(args: List[str], timeout: float, stdin: str = "",
+                            output_limit: int = _OUTPUT_LIMIT_BYTES, env: Optional[Dict] = None) -> Dict:
+    """Run a command under kernel resource limits and collect its resource usage (POSIX)."""
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    try:
+        process = subprocess.Popen(
+            args,
+            stdin=stdin_r,
+            stdout=stdout_w,
+            stderr=stderr_w,
+            cwd=tempfile.gettempdir(),
+            env=env,
+            start_new_session=True,
+            # Only calls setrlimit, which is safe between fork and exec
+            preexec_fn=lambda: apply_limits(timeout, CODE_MEMORY_LIMIT)
+        )
+    except Exception:
+        for fd in (stdin_w, stdout_r, stderr_r):
+            os.close(fd)
+        raise
+    finally:
+        for fd in (stdin_r, stdout_w, stderr_w):
+            os.close(fd)
+    
+    run = communicate(
+        process.pid, stdin_w, {"stdout": stdout_r, "stderr": stderr_r}, stdin.encode('utf-8'), timeout,
+        output_limits={"stdout": output_limit, "stderr": _OUTPUT_LIMIT_BYTES}
+    )
+    # communicate() reaped the child with wait4 to get its rusage
+    process.returncode = run['returncode']
+    return run
+
+
+def _run_plain_subprocess(args: List[str], timeout: float, stdin: str = "",
+                          output_limit: int = _OUTPUT_LIMIT_BYTES, env: Optional[Dict] = None) -> Dict:
+    """Run a command with only a wall-clock timeout (platforms without wait4)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=tempfile.gettempdir(),
+        env=env
+    )
+    captured = {}
+    exceeded = threading.Event()
+    
+    def feed():
+        try:
+            process.stdin.write(stdin.encode('utf-8'))
+        except OSError:
+            pass  # The program exited without reading all of its input
         finally:
-            # Clean up temp file
             try:
-                os.unlink(temp_file)
-            except:
+                process.stdin.close()
+            except OSError:
                 pass
-                
-    except Exception as e:
-        return {
-            "success": False,
-            "output": "",
-            "error": f"Execution error: {str(e)}",
-            "execution_time": 0.0
-        }
+    
+    def drain(name, stream):
+        # Read as the program writes, keeping at most the output limit
+        limit = output_limit if name == "stdout" else _OUTPUT_LIMIT_BYTES
+        chunks, size = [], 0
+        while True:
+            chunk = stream.read1(_READ_CHUNK)
+            if not chunk:
+                break
+            if limit and size + len(chunk) > limit:
+                chunks.append(chunk[:limit - size])
+                exceeded.set()
+                process.kill()
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        stream.close()
+        text = b"".join(chunks).decode('utf-8', errors='replace')
+        captured[name] = text.replace('\r\n', '\n')
+    
+    threads = [
+        threading.Thread(target=feed, daemon=True),
+        threading.Thread(target=drain, args=("stdout", process.stdout), daemon=True),
+        threading.Thread(target=drain, args=("stderr", process.stderr), daemon=True)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        process.wait(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        timed_out = True
+    for thread in threads:
+        thread.join()
+    return {
+        "returncode": process.returncode,
+        "stdout": captured.get("stdout", ""),
+        "stderr": captured.get("stderr", ""),
+        "timed_out": timed_out,
+        "output_limit_exceeded": exceeded.is_set(),
+        "wall_time": round(time.perf_counter() - started, 6),
+        "cpu_time": None,
+        "peak_memory_mb": None
+    }
+
+
+def compile_code(code: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Compile code, reusing the result for code compiled before.
+    
+    Returns:
+        Tuple of (bytecode, error_message): the marshalled code object (see
+        ``harness.dump_code``) or None if the code does not compile, and the
+        syntax error message if it has one
+    """
+    key = hashlib.sha256(code.encode('utf-8', errors='surrogatepass')).hexdigest()
+    with _bytecode_lock:
+        entry = _bytecode_cache.get(key)
+        if entry is not None:
+            _bytecode_cache.move_to_end(key)
+            return entry
+    
+    try:
+        entry = (harness.dump_code(compile(code, '<string>', 'exec')), None)
+    except SyntaxError as e:
+        entry = (None, f"Syntax error: {e.msg} at line {e.lineno}")
+    except ValueError:
+        # E.g. null bytes; left to the child, which reports it like the interpreter
+        return None, None
+    
+    with _bytecode_lock:
+        _bytecode_cache[key] = entry
+        while len(_bytecode_cache) > CODE_BYTECODE_CACHE_SIZE:
+            _bytecode_cache.popitem(last=False)
+    return entry
 
 
 def validate_code_syntax(code: str) -> Tuple[bool, Optional[str]]:
     """
     Validate Python code syntax.
     
+    The compiled code is kept, so executing the same code does not compile it again.
+    
     Returns:
         Tuple of (is_valid, error_message)
     """
-    try:
-        compile(code, '<string>', 'exec')
-        return True, None
-    except SyntaxError as e:
-        return False, f"Syntax error: {e.msg} at line {e.lineno}"
+    _, syntax_error = compile_code(code)
+    return syntax_error is None, syntax_error
 
 
-def grade_code_submission(code: str, test_cases: List[Dict], points: float) -> Dict:
+def grade_code_submission(code: str, test_cases: List[Dict], points: float,
+                          case_timeouts: Optional[List[float]] = None,
+                          expected_outputs: Optional[List[Optional[Dict]]] = None,
+                          policy: Optional[Dict] = None, efficiency: Optional[Dict] = None) -> Dict:
     """
     Grade a code submission based on test cases.
     
@@ -211,6 +645,10 @@ def grade_code_submission(code: str, test_cases: List[Dict], points: float) -> D
         code: Student's code
         test_cases: List of test cases
         points: Maximum points for this question
+        case_timeouts: Optional timeout per test case (see execute_code)
+        expected_outputs: Optional precomputed expected outputs (see execute_code)
+        policy: Optional grading policy for stopping early (see execute_code)
+        efficiency: Optional efficiency scoring (see efficiency.question_efficiency)
     
     Returns:
         Dictionary with grade information
@@ -225,31 +663,103 @@ def grade_code_submission(code: str, test_cases: List[Dict], points: float) -> D
             "test_results": []
         }
     
-    # Execute with test cases
-    result = execute_code(code, test_cases)
+    # Execute with test cases, reusing the result of identical earlier runs
+    from server.services import grading_cache
+    benchmark = efficiency['benchmark'] if efficiency else None
+    key = execution_cache_key(code, test_cases, case_timeouts, expected_outputs, policy, benchmark)
+    result = grading_cache.lookup(key)
+    if result is None:
+        result = execute_code(code, test_cases, case_timeouts=case_timeouts,
+                              expected_outputs=expected_outputs, policy=policy, benchmark=benchmark)
+        grading_cache.store(key, result)
+    
+    return score_test_results(result.get('test_results', []), points, efficiency, result.get('benchmarks'))
+
+
+def execution_cache_key(code: str, test_cases: List[Dict], case_timeouts: Optional[List[float]] = None,
+                        expected_outputs: Optional[List[Optional[Dict]]] = None,
+                        policy: Optional[Dict] = None, benchmark: Optional[Dict] = None) -> str:
+    """Grading cache key of executing code with these arguments under the current limits."""
+    from server.services import grading_cache
+    return grading_cache.cache_key(
+        code, test_cases,
+        timeout=CODE_TIMEOUT, memory_limit=CODE_MEMORY_LIMIT,
+        output_limit=CODE_OUTPUT_LIMIT, mode=CODE_EXECUTION_MODE,
+        case_timeouts=case_timeouts, expected_outputs=expected_outputs, policy=policy, benchmark=benchmark
+    )
+
+
+def score_test_results(test_results: List[Dict], points: float, efficiency: Optional[Dict] = None,
+                       benchmarks: Optional[List[Dict]] = None) -> Dict:
+    """
+    Turn per-test-case results into a score and feedback.
+    
+    Args:
+        test_results: Test results as produced by execute_code
+        points: Maximum points for this question
+        efficiency: Optional efficiency scoring (see efficiency.question_efficiency);
+            its weight of the points is then awarded for efficiency
+        benchmarks: The answer's benchmark measurements (see run_benchmarks)
+    
+    Returns:
+        Dictionary with grade information
+    """
+    passed = sum(1 for r in test_results if r.get('passed'))
+    total = len(test_results)
+    correctness_points = points * (1 - efficiency['weight']) if efficiency else points
     
-    if result.get('success', False) and result.get('all_passed', False):
+    if total and passed == total:
         # All tests passed
-        score = points
-        feedback = f"All {result['passed_count']} test cases passed!"
+        score = correctness_points
+        feedback = f"All {passed} test cases passed!"
     else:
         # Calculate partial credit
-        passed = result.get('passed_count', 0)
-        total = result.get('total_count', 1)
-        score = (passed / total) * points if total > 0 else 0.0
+        score = (passed / total) * correctness_points if total > 0 else 0.0
         feedback = f"Passed {passed} out of {total} test cases."
         
         # Add details about failed tests
-        failed_tests = [r for r in result.get('test_results', []) if not r.get('passed', False)]
+        failed_tests = [r for r in test_results if not r.get('passed', False) and not r.get('skipped')]
         if failed_tests:
             feedback += "\n\nFailed test cases:"
             for test in failed_tests[:3]:  # Show first 3 failures
                 feedback += f"\n- Test {test['test_case']}: Expected '{test['expected_output']}', got '{test['actual_output']}'"
+        
+        # Record the grading policy that stopped the run early
+        skipped_tests = [r for r in test_results if r.get('skipped')]
+        if skipped_tests:
+            feedback += (f"\n\nGrading {skipped_tests[0]['skipped']}; "
+                         f"{len(skipped_tests)} remaining test case(s) marked as failed.")
     
-    return {
+    efficiency_summary = None
+    if efficiency:
+        from server.services import efficiency as efficiency_scoring
+        efficiency_points, efficiency_summary, efficiency_feedback = efficiency_scoring.score(
+            efficiency, benchmarks, points - correctness_points, test_results
+        )
+        score += efficiency_points
+        feedback += "\n\n" + efficiency_feedback
+    
+    grade = {
         "score": round(score, 2),
         "max_score": points,
         "feedback": feedback,
-        "test_results": result.get('test_results', [])
+        "test_results": test_results
     }
+    if efficiency_summary is not None:
+        grade["efficiency"] = efficiency_summary
+        grade["benchmarks"] = benchmarks
+    return grade
 
+
+def grade_code_submissions(submissions: List[Tuple]) -> List[Dict]:
+    """
+    Grade several code submissions in parallel.
+    
+    Args:
+        submissions: List of grade_code_submission argument tuples,
+            starting with (code, test_cases, points)
+    
+    Returns:
+        List of grade dictionaries (see grade_code_submission), in input order
+    """
+    return _answer_scheduler.map(lambda args: grade_code_submission(*args), submissions)
@@ -0,0 +1,226 @@
+"""Efficiency scoring of code answers against a reference solution.
+
+A code question with a reference solution may reserve part of its points for
+efficiency. Its ``efficiency`` settings name benchmark test cases; each one is
+run several times, for the reference when the question is saved and for
+every answer when it is graded. The median CPU time and peak memory of the
+answer, less the cost of an empty program, are compared with the reference's:
+
+    {"weight": 0.25, "benchmark_cases": [3], "repeats": 5,
+     "max_cpu_ratio": 2.0, "max_memory_ratio": 3.0}
+
+awards 25% of the question's points for efficiency, in full when the answer
+needs at most twice the reference's CPU time and three times its memory, and
+in proportion to how far it is over otherwise. The other 75% are awarded for
+passing test cases. Only benchmark cases whose test case the answer passes
+are measured: a wrong answer is not efficient however fast it is, so the
+efficiency points shrink with the share of benchmark cases answered wrongly.
+"""
+
+import hashlib
+import json
+import statistics
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from server.models import Question
+from server.services.code_executor import CODE_EXECUTION_MODE, CODE_MEMORY_LIMIT, CODE_TIMEOUT, run_benchmarks
+from server.services.grading_cache import normalize_code
+
+DEFAULT_REPEATS = 5
+MAX_REPEATS = 25
+
+# Differences below these are measurement noise
+MIN_CPU_TIME = 0.001  # seconds
+MIN_MEMORY = 0.5  # MB
+
+# Program whose cost is subtracted from every measurement
+EMPTY_PROGRAM = "pass"
+
+
+def validate_settings(settings, test_cases: Optional[List]) -> str:
+    """Return an error message for invalid efficiency settings, or an empty string."""
+    if settings is None:
+        return ""
+    if not isinstance(settings, dict):
+        return "efficiency must be an object"
+    unknown = set(settings) - {"weight", "benchmark_cases", "repeats", "max_cpu_ratio", "max_memory_ratio"}
+    if unknown:
+        return f"Unknown efficiency keys: {sorted(unknown)}"
+    
+    weight = settings.get("weight")
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0 < weight <= 1:
+        return "efficiency weight must be a number between 0 and 1"
+    
+    cases = settings.get("benchmark_cases")
+    count = len(test_cases or [])
+    if not isinstance(cases, list) or not cases or \
+            not all(isinstance(case, int) and not isinstance(case, bool) and 1 <= case <= count for case in cases):
+        return f"benchmark_cases must list test case numbers between 1 and {count}"
+    
+    repeats = settings.get("repeats", DEFAULT_REPEATS)
+    if isinstance(repeats, bool) or not isinstance(repeats, int) or not 1 <= repeats <= MAX_REPEATS:
+        return f"efficiency repeats must be between 1 and {MAX_REPEATS}"
+    
+    limits = [settings.get(key) for key in ("max_cpu_ratio", "max_memory_ratio")]
+    if all(limit is None for limit in limits):
+        return "efficiency needs max_cpu_ratio, max_memory_ratio or both"
+    for limit in limits:
+        if limit is not None and (isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit <= 0):
+            return "efficiency ratios must be positive numbers"
+    return ""
+
+
+def benchmark_spec(question: Question, case_timeouts: Optional[List[float]] = None) -> Optional[Dict]:
+    """
+    What to run for a question's benchmarks, as passed to run_benchmarks.
+    
+    Returns:
+        ``{"test_cases", "repeats"}``, or None if the question is not efficiency-scored
+    """
+    settings = question.efficiency
+    if not settings or not question.reference_solution or not question.test_cases:
+        return None
+    if max(settings["benchmark_cases"]) > len(question.test_cases):
+        # Test cases were removed since the settings were saved
+        return None
+    
+    test_cases = []
+    for number in settings["benchmark_cases"]:
+        test_case = question.test_cases[number - 1]
+        if case_timeouts:
+            test_case = dict(test_case, timeout=case_timeouts[number - 1])
+        test_cases.append(test_case)
+    return {"test_cases": test_cases, "repeats": settings.get("repeats", DEFAULT_REPEATS)}
+
+
+def _baseline_key(question: Question, spec: Dict) -> str:
+    material = json.dumps({
+        "reference": normalize_code(question.reference_solution),
+        "benchmark": spec,
+        "mode": CODE_EXECUTION_MODE,
+        "memory_limit": CODE_MEMORY_LIMIT,
+        "timeout": CODE_TIMEOUT,
+        "python": sys.version,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def refresh_baseline(question: Question, case_timeouts: Optional[List[float]] = None) -> Optional[Dict]:
+    """
+    Measure the reference solution on the benchmark cases unless already measured.
+    
+    The caller commits.
+    
+    Returns:
+        The question's efficiency_baseline, or None if it is not efficiency-scored
+    """
+    spec = benchmark_spec(question, case_timeouts)
+    if spec is None:
+        question.efficiency_baseline = None
+        return None
+    
+    key = _baseline_key(question, spec)
+    if (question.efficiency_baseline or {}).get('key') == key:
+        return question.efficiency_baseline
+    
+    cases = run_benchmarks(question.reference_solution, spec)
+    floor = run_benchmarks(EMPTY_PROGRAM, {"test_cases": [{"input": ""}], "repeats": spec["repeats"]})[0]
+    question.efficiency_baseline = {
+        "key": key,
+        "cases": cases,
+        "floor": floor,
+        "measured_at": datetime.utcnow().isoformat()
+    }
+    return question.efficiency_baseline
+
+
+def question_efficiency(question: Question, case_timeouts: Optional[List[float]] = None) -> Optional[Dict]:
+    """
+    Everything needed to measure and score an answer's efficiency.
+    
+    Returns:
+        The question's settings plus ``benchmark`` (see benchmark_spec) and
+        ``baseline``, or None if the question is not efficiency-scored or
+        the reference could not be measured
+    """
+    baseline = refresh_baseline(question, case_timeouts)
+    if baseline is None or not all(case['passed'] for case in baseline['cases']):
+        return None
+    return {
+        **question.efficiency,
+        "benchmark": benchmark_spec(question, case_timeouts),
+        "baseline": {"cases": baseline['cases'], "floor": baseline['floor']}
+    }
+
+
+def _ratio(measured: Optional[float], reference: Optional[float], floor: Optional[float], minimum: float) -> Optional[float]:
+    """Cost of an answer relative to the reference, both less the empty program's cost."""
+    if measured is None or reference is None:
+        return None
+    floor = floor or 0.0
+    return max(measured - floor, minimum) / max(reference - floor, minimum)
+
+
+def score(efficiency: Dict, benchmarks: Optional[List[Dict]], points: float,
+          test_results: Optional[List[Dict]] = None) -> Tuple[float, Dict, str]:
+    """
+    Efficiency points of an answer.
+    
+    Args:
+        efficiency: Result of question_efficiency
+        benchmarks: run_benchmarks result of the answer
+        points: Points reserved for efficiency
+        test_results: The answer's test results; benchmark cases whose test
+            case failed count as unmeasured
+    
+    Returns:
+        Tuple of (points awarded, summary stored with the answer, feedback line)
+    """
+    summary = {"max_points": round(points, 2), "points": 0.0, "cpu_ratio": None, "memory_ratio": None}
+    failed = [case for case in benchmarks or [] if not case['passed']]
+    if not benchmarks or failed:
+        summary["measured"] = False
+        reason = f": {failed[0]['error']}" if failed and failed[0].get('error') else ""
+        return 0.0, summary, f"Efficiency: 0/{points:g} points (a benchmark case did not run successfully{reason})."
+    
+    test_results = test_results or []
+    correct = [
+        number <= len(test_results) and bool(test_results[number - 1].get('passed'))
+        for number in efficiency['benchmark_cases']
+    ]
+    if not any(correct):
+        summary["measured"] = False
+        return 0.0, summary, f"Efficiency: 0/{points:g} points (no benchmark case produced the expected output)."
+    
+    floor = efficiency['baseline']['floor']
+    cpu_ratios, memory_ratios = [], []
+    for measured, reference, is_correct in zip(benchmarks, efficiency['baseline']['cases'], correct):
+        if not is_correct:
+            continue
+        cpu_ratios.append(_ratio(measured['cpu_time'], reference['cpu_time'], floor['cpu_time'], MIN_CPU_TIME))
+        memory_ratios.append(_ratio(measured['peak_memory_mb'], reference['peak_memory_mb'],
+                                    floor['peak_memory_mb'], MIN_MEMORY))
+    
+    fractions, details = [], []
+    for name, ratios, limit_key in (("CPU time", cpu_ratios, "max_cpu_ratio"),
+                                    ("peak memory", memory_ratios, "max_memory_ratio")):
+        limit = efficiency.get(limit_key)
+        if limit is None:
+            continue
+        if any(ratio is None for ratio in ratios):
+            # Not measurable on this platform
+            summary["measured"] = False
+            return 0.0, summary, f"Efficiency: 0/{points:g} points ({name} could not be measured)."
+        ratio = max(ratios)
+        summary["cpu_ratio" if limit_key == "max_cpu_ratio" else "memory_ratio"] = round(ratio, 2)
+        fractions.append(min(1.0, limit / ratio))
+        details.append(f"{name} {ratio:.1f}x the reference, limit {limit:g}x")
+    
+    share = sum(correct) / len(correct)
+    if share < 1:
+        details.append(f"{sum(correct)} of {len(correct)} benchmark cases correct")
+    awarded = round(points * statistics.mean(fractions) * share, 2)
+    summary.update(measured=True, points=awarded)
+    return awarded, summary, f"Efficiency: {awarded:g}/{points:g} points ({'; '.join(details)})."
+
@@ -1,20 +1,27 @@
 """Auto-grading service for code questions."""
 
-from server.services.code_executor import grade_code_submission
-from server.models import Answer, Question, TestQuestion, Submission
-from typing import Optional
+from server.database import db_session
+from server.services import case_results
+from server.services.code_executor import (
+    describe_test_case, grade_code_submission, grade_code_submissions, is_timeout, score_test_results
+)
+from server.services.efficiency import question_efficiency
+from server.services.reference import question_expected_outputs, question_timeouts
+from server.services.submission_totals import set_score
+from server.services.harness import EarlyExit
+from server.models import Answer, TestQuestion, Submission
+from typing import Dict, List, Optional, Tuple
 
 
-def auto_grade_code_answer(answer: Answer, submission: Submission) -> Optional[float]:
+def grading_job(answer: Answer, submission: Submission) -> Optional[Tuple]:
     """
-    Auto-grade a code answer.
+    Build the (code, test_cases, points, case_timeouts, expected_outputs, policy,
+    efficiency) arguments for grading an answer.
     
-    Args:
-        answer: Answer object to grade
-        submission: Submission object
+    Runs the question's reference solution first if its results are stale.
     
     Returns:
-        Score if auto-graded, None if manual grading required
+        Arguments for grade_code_submission, None if manual grading required
     """
     if not answer.code or not answer.question:
         return None
@@ -31,7 +38,6 @@ def auto_grade_code_answer(answer: Answer, submission: Submission) -> Optional[f
         return None  # No test cases, requires manual grading
     
     # Get points
-    from server.database import db_session
     test_question = db_session.query(TestQuestion).filter_by(
         test_id=submission.test_id,
         question_id=question.id
@@ -39,12 +45,159 @@ def auto_grade_code_answer(answer: Answer, submission: Submission) -> Optional[f
     
     points = test_question.points if test_question and test_question.points is not None else question.points
     
+    case_timeouts = question_timeouts(question)
+    return (answer.code, test_cases, points, case_timeouts, question_expected_outputs(question),
+            question.grading_policy, question_efficiency(question, case_timeouts))
+
+
+def auto_grade_code_answer(answer: Answer, submission: Submission) -> Optional[float]:
+    """
+    Auto-grade a code answer.
+    
+    Args:
+        answer: Answer object to grade
+        submission: Submission object
+    
+    Returns:
+        Score if auto-graded, None if manual grading required
+    """
+    job = grading_job(answer, submission)
+    if job is None:
+        return None
+    
     # Grade the submission
-    grade_result = grade_code_submission(answer.code, test_cases, points)
+    grade_result = grade_code_submission(*job)
     
     # Update answer
-    answer.score = grade_result['score']
-    answer.feedback = grade_result['feedback']
+    apply_grade_result(answer, job, grade_result)
     
     return grade_result['score']
 
+
+def apply_grade_result(answer: Answer, job: Tuple, grade_result: Dict):
+    """Store a grade result on an answer, keeping its per-test-case results."""
+    code, test_cases, _, case_timeouts, expected_outputs, policy, _ = job
+    set_score(answer, grade_result['score'])
+    answer.feedback = grade_result['feedback']
+    answer.efficiency = grade_result.get('efficiency')
+    case_results.record(
+        answer.id, code, case_results.case_hashes(test_cases, case_timeouts, expected_outputs, policy),
+        grade_result['test_results']
+    )
+
+
+def auto_grade_code_answers(answers: List[Answer]) -> List[Optional[float]]:
+    """
+    Auto-grade several code answers in parallel.
+    
+    Args:
+        answers: Answer objects to grade, possibly from different submissions
+    
+    Returns:
+        Score per answer in input order, None where manual grading is required
+    """
+    jobs = [grading_job(answer, answer.submission) for answer in answers]
+    gradable = [idx for idx, job in enumerate(jobs) if job is not None]
+    
+    grade_results = grade_code_submissions([jobs[idx] for idx in gradable])
+    
+    scores = [None] * len(answers)
+    for idx, grade_result in zip(gradable, grade_results):
+        apply_grade_result(answers[idx], jobs[idx], grade_result)
+        scores[idx] = grade_result['score']
+    
+    return scores
+
+
+def _skipped_result(index: int, test_case: Dict, reason: str, precomputed: Optional[Dict] = None) -> Dict:
+    """Test result of a case the grading policy stopped before."""
+    test_input, expected_output = describe_test_case(test_case, precomputed)
+    return {
+        "test_case": index + 1,
+        "input": test_input,
+        "expected_output": expected_output,
+        "actual_output": "",
+        "passed": False,
+        "error": f"Not run: {reason}",
+        "skipped": reason
+    }
+
+
+def grade_answers(answers: List[Answer], jobs: List[Tuple]) -> List[Dict]:
+    """
+    Grade code answers in parallel, reusing the stored per-test-case results of their current code.
+    
+    Only test cases without a stored result for an answer's code are
+    executed, and the grading policy is applied over the question's full case
+    order, stored and fresh results together. An answer without stored
+    results is graded with one regular run, which the policy can stop early.
+    Efficiency-scored answers are benchmarked every time.
+    
+    Args:
+        answers: Answers to grade
+        jobs: grading_job arguments of every answer
+    
+    Returns:
+        Grade result per answer, in input order
+    """
+    plans = []
+    for answer, job in zip(answers, jobs):
+        code, test_cases, points, case_timeouts, expected_outputs, policy, efficiency = job
+        hashes = case_results.case_hashes(test_cases, case_timeouts, expected_outputs, policy)
+        stored = case_results.load(answer.id, code)
+        missing = [idx for idx, case in enumerate(hashes) if case not in stored]
+        if len(missing) == len(test_cases):
+            plans.append((job, hashes, stored, missing, job))
+            continue
+        
+        # The stored results before the first missing case may already stop grading
+        early_exit = EarlyExit(policy)
+        for idx in range(missing[0] if missing else len(test_cases)):
+            error = stored[hashes[idx]].error or ''
+            if early_exit.observe(is_timeout({"error": error}), error):
+                missing = []
+                break
+        
+        # Fresh cases run without the policy; it is applied below over every case
+        plans.append((job, hashes, stored, missing, (
+            code,
+            [test_cases[idx] for idx in missing],
+            points,
+            [case_timeouts[idx] for idx in missing] if case_timeouts else None,
+            [expected_outputs[idx] for idx in missing] if expected_outputs else None,
+            None,
+            efficiency
+        )))
+    
+    fresh_results = iter(grade_code_submissions([run for *_, missing, run in plans if missing or run[6]]))
+    
+    grade_results = []
+    for job, hashes, stored, missing, run in plans:
+        code, test_cases, points, case_timeouts, expected_outputs, policy, efficiency = job
+        fresh = next(fresh_results) if missing or efficiency else None
+        if run is job:
+            grade_results.append(fresh)
+            continue
+        if missing and not fresh['test_results']:
+            # Did not compile; the partial result already says why
+            grade_results.append(dict(fresh, score=0.0, max_score=points))
+            continue
+        
+        fresh_by_case = dict(zip(missing, fresh['test_results'])) if fresh else {}
+        early_exit = EarlyExit(policy)
+        test_results = []
+        for idx, test_case in enumerate(test_cases):
+            precomputed = expected_outputs[idx] if expected_outputs else None
+            if early_exit.reason:
+                test_results.append(_skipped_result(idx, test_case, early_exit.reason, precomputed))
+                continue
+            if idx in fresh_by_case:
+                result = dict(fresh_by_case[idx], test_case=idx + 1)
+            else:
+                result = case_results.to_test_result(stored[hashes[idx]], idx, test_case, precomputed)
+            test_results.append(result)
+            early_exit.observe(is_timeout(result), result.get('error') or '')
+        grade_results.append(score_test_results(
+            test_results, points, efficiency, fresh.get('benchmarks') if fresh else None
+        ))
+    return grade_results
@@ -0,0 +1,67 @@
+"""Final grades of whole tests.
+
+Finalizing a test turns the running totals of its submitted submissions (see
+``submission_totals``) into grades: one INSERT ... SELECT upserts a row per
+submission into ``grades`` and one UPDATE marks them graded, so closing out
+an exam costs the same two statements however many students took it.
+"""
+
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+from server.database import db_session
+from server.models import Grade, Submission
+from server.services.submission_totals import test_max_score
+from shared.constants import SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+
+
+def finalize_test(test_id: int, graded_by: int) -> Dict:
+    """
+    Store the grade of every submitted or graded submission of a test.
+    
+    Unscored answers count as zero. The caller commits.
+    
+    Returns:
+        The test's maximum score and the number of submissions finalized
+    """
+    finalizable = (
+        Submission.test_id == test_id,
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED])
+    )
+    total_score = func.coalesce(Submission.total_score, 0.0)
+    max_score = func.coalesce(Submission.max_score, 0.0)
+    
+    rows = select(
+        Submission.id,
+        total_score,
+        max_score,
+        case((max_score > 0, total_score * 100.0 / max_score), else_=0.0),
+        literal(graded_by, Grade.graded_by.type),
+        literal(datetime.utcnow(), Grade.graded_at.type)
+    ).where(*finalizable)
+    
+    upsert = insert(Grade).from_select(
+        ["submission_id", "total_score", "max_score", "percentage", "graded_by", "graded_at"], rows
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[Grade.submission_id],
+        set_={
+            "total_score": upsert.excluded.total_score,
+            "max_score": upsert.excluded.max_score,
+            "percentage": upsert.excluded.percentage,
+            "graded_by": upsert.excluded.graded_by,
+            "graded_at": upsert.excluded.graded_at
+        }
+    )
+    db_session.execute(upsert)
+    
+    finalized = db_session.query(Submission).filter(*finalizable).update(
+        {Submission.status: SUBMISSION_STATUS_GRADED}, synchronize_session=False
+    )
+    
+    return {
+        "test_id": test_id,
+        "max_score": db_session.execute(select(test_max_score(test_id))).scalar(),
+        "finalized": finalized
+    }
@@ -0,0 +1,169 @@
+"""Content-addressed cache of code grading results.
+
+Identical code run against identical test cases under identical limits
+always produces the same result, so execution results are stored in the
+database keyed by a hash of all of those inputs. The least recently used
+entries are evicted once the cache grows past ``GRADING_CACHE_SIZE``.
+
+Lookups happen in whichever process grades (the server or grading
+workers), so hits and misses are counted in the database, not in memory.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+from server.database import engine
+from server.models import GradingCacheCounter, GradingCacheEntry
+
+load_dotenv()
+
+GRADING_CACHE_SIZE = int(os.getenv("GRADING_CACHE_SIZE", 10000))  # entries, 0 disables the cache
+
+# Own sessions: lookups run on executor threads and must not touch the request's transaction
+Session = sessionmaker(bind=engine)
+
+# Bump when an executor change can alter results, so older entries stop matching
+CACHE_VERSION = 2
+
+# Errors that depend on server load rather than on the code itself
+_TRANSIENT_ERRORS = ("Execution timeout", "Execution error")
+
+
+def normalize_code(code: str) -> str:
+    """
+    Normalize source code without changing its meaning.
+    
+    Line endings are unified (the compiler does this too, even inside string
+    literals) and trailing whitespace at the end of the file is dropped.
+    """
+    return code.lstrip('\ufeff').replace('\r\n', '\n').replace('\r', '\n').rstrip()
+
+
+def cache_key(code: str, test_cases: List[Dict], **limits) -> str:
+    """
+    Hash everything that can influence an execution result.
+    
+    Args:
+        code: Student's code
+        test_cases: List of test cases
+        **limits: Execution settings such as timeout, memory limit and mode
+    
+    Returns:
+        Hex SHA-256 digest
+    """
+    material = json.dumps({
+        "code": normalize_code(code),
+        "test_cases": test_cases,
+        "limits": limits,
+        "python": sys.version,
+        "version": CACHE_VERSION,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _count(session, outcome: str):
+    """Add one lookup to an outcome's counter; the caller commits."""
+    increment = insert(GradingCacheCounter).values(name=outcome, count=1)
+    session.execute(increment.on_conflict_do_update(
+        index_elements=[GradingCacheCounter.name],
+        set_={"count": GradingCacheCounter.count + 1}
+    ))
+
+
+def lookup(key: str) -> Optional[Dict]:
+    """Return the cached result for ``key`` and mark it as recently used."""
+    if GRADING_CACHE_SIZE <= 0:
+        return None
+    
+    session = Session()
+    try:
+        entry = session.query(GradingCacheEntry).filter_by(key=key).first()
+        if entry is None:
+            _count(session, "misses")
+            session.commit()
+            return None
+        
+        entry.hits += 1
+        entry.last_used_at = datetime.utcnow()
+        result = entry.result
+        _count(session, "hits")
+        session.commit()
+        return result
+    except SQLAlchemyError:
+        # The cache is an optimization; never let it fail grading
+        session.rollback()
+        return None
+    finally:
+        session.close()
+
+
+def is_cacheable(result: Dict) -> bool:
+    """Whether a result is deterministic enough to reuse."""
+    for test in result.get('test_results', []) + result.get('benchmarks', []):
+        if str(test.get('error') or '').startswith(_TRANSIENT_ERRORS):
+            return False
+    return True
+
+
+def store(key: str, result: Dict):
+    """Store a result and evict least recently used entries over the size limit."""
+    if GRADING_CACHE_SIZE <= 0 or not is_cacheable(result):
+        return
+    
+    session = Session()
+    try:
+        entry = session.query(GradingCacheEntry).filter_by(key=key).first()
+        if entry:
+            entry.result = result
+            entry.last_used_at = datetime.utcnow()
+        else:
+            session.add(GradingCacheEntry(key=key, result=result))
+        session.flush()
+        
+        excess = session.query(func.count(GradingCacheEntry.id)).scalar() - GRADING_CACHE_SIZE
+        if excess > 0:
+            oldest = session.query(GradingCacheEntry.id).order_by(
+                GradingCacheEntry.last_used_at.asc()
+            ).limit(excess).subquery()
+            session.query(GradingCacheEntry).filter(
+                GradingCacheEntry.id.in_(oldest.select())
+            ).delete(synchronize_session=False)
+        
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+    finally:
+        session.close()
+
+
+def get_stats() -> Dict:
+    """Hit/miss counters of every grading process plus persisted cache totals."""
+    session = Session()
+    try:
+        counters = dict(session.query(GradingCacheCounter.name, GradingCacheCounter.count).all())
+        entries, stored_hits = session.query(
+            func.count(GradingCacheEntry.id), func.coalesce(func.sum(GradingCacheEntry.hits), 0)
+        ).one()
+    except SQLAlchemyError:
+        counters, entries, stored_hits = {}, 0, 0
+    finally:
+        session.close()
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "entries": entries,
+        "total_hits": stored_hits,
+        "max_entries": GRADING_CACHE_SIZE
+    }
@@ -0,0 +1,557 @@
+"""Persistent queue for background auto-grading of code answers.
+
+Submitting a test only records a grading job per code answer; worker
+processes claim queued jobs from the database, grade them and write the
+scores back, so the submit request never waits for code execution. The
+queue lives in the ``grading_jobs`` table, so pending work survives a
+server restart.
+
+Every claim is a lease: a job whose worker does not report back before the
+lease runs out (e.g. because the worker crashed) is queued again, up to
+``GRADING_MAX_ATTEMPTS`` attempts. Besides the server's own worker
+processes, standalone workers on other machines lease jobs over HTTP (see
+``lease_jobs`` and ``complete_job``), so grading throughput grows with the
+number of workers. Between jobs, the server's workers also index submitted
+code answers for similarity checks (see ``plagiarism.index_pending``).
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import func, or_
+from sqlalchemy.exc import SQLAlchemyError
+from server.database import db_session
+from server.models import Answer, GradingJob, Question, Submission
+from server.services import grading_cache, plagiarism
+from server.services.code_executor import (
+    CODE_EXECUTION_WORKERS, execution_cache_key, grade_code_submission, score_test_results,
+    validate_code_syntax
+)
+from server.services.grader import apply_grade_result, grade_answers, grading_job
+from server.services.grading_worker import default_worker_id
+from shared.constants import (
+    QUESTION_TYPE_CODE, GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING,
+    GRADING_JOB_STATUS_DONE, GRADING_JOB_STATUS_FAILED, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+)
+
+load_dotenv()
+
+GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", 1))  # 0 disables background grading
+GRADING_MAX_ATTEMPTS = int(os.getenv("GRADING_MAX_ATTEMPTS", 3))
+# How long a worker may hold a job before it is handed to another worker
+GRADING_LEASE_SECONDS = int(os.getenv("GRADING_LEASE_SECONDS", 300))
+# Shared secret of standalone grading workers; empty disables them
+GRADING_WORKER_TOKEN = os.getenv("GRADING_WORKER_TOKEN", "")
+POLL_INTERVAL = 1.0  # seconds between polls of an empty queue
+
+_PENDING = (GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING)
+
+
+def enqueue_submission(submission: Submission) -> int:
+    """
+    Queue a grading job for every auto-gradable code answer of a submission.
+    
+    The jobs are added to the current session; the caller commits them
+    together with the submission itself.
+    
+    Returns:
+        Number of jobs queued
+    """
+    queued = 0
+    for answer in submission.answers:
+        question = answer.question
+        if not answer.code or not question or question.type != QUESTION_TYPE_CODE or not question.test_cases:
+            continue
+        
+        pending = db_session.query(GradingJob.id).filter(
+            GradingJob.answer_id == answer.id,
+            GradingJob.status.in_(_PENDING)
+        ).first()
+        if pending:
+            continue
+        
+        db_session.add(GradingJob(answer_id=answer.id, submission_id=submission.id))
+        queued += 1
+    
+    return queued
+
+
+def enqueue_test(test_id: int, submission_ids: Optional[List[int]] = None) -> Dict:
+    """
+    Queue a grading job for every auto-gradable code answer submitted for a test.
+    
+    Answers are graded again even if they already have a score; answers with
+    a job still pending are left alone. The caller commits.
+    
+    Args:
+        test_id: Test whose submitted (or already graded) submissions to grade
+        submission_ids: Only grade these submissions of the test
+    
+    Returns:
+        Number of jobs queued and of answers that already had one pending
+    """
+    query = db_session.query(Answer.id, Answer.submission_id, Question.test_cases).join(
+        Submission, Submission.id == Answer.submission_id
+    ).join(
+        Question, Question.id == Answer.question_id
+    ).filter(
+        Submission.test_id == test_id,
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED]),
+        Question.type == QUESTION_TYPE_CODE,
+        Answer.code.isnot(None),
+        Answer.code != ''
+    )
+    if submission_ids is not None:
+        query = query.filter(Answer.submission_id.in_(submission_ids))
+    answers = [(answer_id, submission_id) for answer_id, submission_id, test_cases in query.all() if test_cases]
+    
+    pending = {answer_id for (answer_id,) in db_session.query(GradingJob.answer_id).join(
+        Submission, Submission.id == GradingJob.submission_id
+    ).filter(
+        Submission.test_id == test_id,
+        GradingJob.status.in_(_PENDING)
+    )}
+    
+    db_session.add_all([
+        GradingJob(answer_id=answer_id, submission_id=submission_id)
+        for answer_id, submission_id in answers if answer_id not in pending
+    ])
+    already_pending = sum(1 for answer_id, _ in answers if answer_id in pending)
+    return {"queued": len(answers) - already_pending, "already_pending": already_pending}
+
+
+def enqueue_question(question_id: int) -> Dict:
+    """
+    Queue a grading job for every submitted answer to a code question, e.g. after its test cases changed.
+    
+    Answers with a job still pending are left alone. The caller commits.
+    
+    Returns:
+        Number of jobs queued and of answers that already had one pending,
+        and the already finalized submissions whose grade needs finalizing again
+    """
+    query = db_session.query(Answer.id, Answer.submission_id, Submission.status, Question.test_cases).join(
+        Submission, Submission.id == Answer.submission_id
+    ).join(
+        Question, Question.id == Answer.question_id
+    ).filter(
+        Answer.question_id == question_id,
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED]),
+        Question.type == QUESTION_TYPE_CODE,
+        Answer.code.isnot(None),
+        Answer.code != ''
+    )
+    answers = [(answer_id, submission_id, status) for answer_id, submission_id, status, test_cases in query if test_cases]
+    
+    pending = {answer_id for (answer_id,) in db_session.query(GradingJob.answer_id).join(
+        Answer, Answer.id == GradingJob.answer_id
+    ).filter(
+        Answer.question_id == question_id,
+        GradingJob.status.in_(_PENDING)
+    )}
+    
+    db_session.add_all([
+        GradingJob(answer_id=answer_id, submission_id=submission_id)
+        for answer_id, submission_id, _ in answers if answer_id not in pending
+    ])
+    already_pending = sum(1 for answer_id, _, _ in answers if answer_id in pending)
+    return {
+        "queued": len(answers) - already_pending,
+        "already_pending": already_pending,
+        "finalized_submissions": sorted({
+            submission_id for _, submission_id, status in answers if status == SUBMISSION_STATUS_GRADED
+        })
+    }
+
+
+def test_progress(test_id: int) -> Dict:
+    """
+    Grading progress of a test: the latest job of every answer, counted by status.
+    
+    Returns:
+        Counts per job status plus the total, the finished percentage and
+        whether nothing is pending
+    """
+    latest = db_session.query(func.max(GradingJob.id).label("id")).join(
+        Submission, Submission.id == GradingJob.submission_id
+    ).filter(
+        Submission.test_id == test_id
+    ).group_by(GradingJob.answer_id).subquery()
+    counts = dict(
+        db_session.query(GradingJob.status, func.count(GradingJob.id)).join(
+            latest, GradingJob.id == latest.c.id
+        ).group_by(GradingJob.status).all()
+    )
+    
+    progress = {
+        status: counts.get(status, 0)
+        for status in (GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING,
+                       GRADING_JOB_STATUS_DONE, GRADING_JOB_STATUS_FAILED)
+    }
+    total = sum(progress.values())
+    finished = progress[GRADING_JOB_STATUS_DONE] + progress[GRADING_JOB_STATUS_FAILED]
+    return {
+        "test_id": test_id,
+        **progress,
+        "total": total,
+        "percent": round(finished / total * 100, 1) if total else 100.0,
+        "complete": finished == total
+    }
+
+
+# Worker ids of the server's own worker processes start with this
+LOCAL_WORKER_PREFIX = "server-"
+
+
+def requeue_expired() -> int:
+    """
+    Requeue running jobs whose lease ran out, or fail them after too many attempts.
+    
+    Each job is released with a conditional UPDATE on its lease token, so a
+    worker that reports back at the same moment is not overwritten.
+    
+    Returns:
+        Number of jobs released
+    """
+    now = datetime.utcnow()
+    expired = db_session.query(GradingJob.id, GradingJob.lease_token, GradingJob.attempts, GradingJob.worker_id).filter(
+        GradingJob.status == GRADING_JOB_STATUS_RUNNING,
+        GradingJob.lease_expires_at < now
+    ).all()
+    
+    released = 0
+    for job_id, lease_token, attempts, worker_id in expired:
+        gave_up = attempts >= GRADING_MAX_ATTEMPTS
+        released += db_session.query(GradingJob).filter_by(
+            id=job_id, status=GRADING_JOB_STATUS_RUNNING, lease_token=lease_token
+        ).update({
+            GradingJob.status: GRADING_JOB_STATUS_FAILED if gave_up else GRADING_JOB_STATUS_QUEUED,
+            GradingJob.error: f"Lease expired on worker {worker_id}",
+            GradingJob.lease_token: None,
+            GradingJob.finished_at: now if gave_up else None
+        }, synchronize_session=False)
+    db_session.commit()
+    return released
+
+
+def claim_jobs(limit: int, worker_id: Optional[str] = None,
+               lease_seconds: int = GRADING_LEASE_SECONDS) -> List[GradingJob]:
+    """
+    Atomically lease up to ``limit`` queued jobs, moving them to running.
+    
+    Each job is claimed with a conditional UPDATE, so concurrent workers never
+    grade the same job twice. Expired leases are released first.
+    
+    Args:
+        limit: Maximum number of jobs to claim
+        worker_id: Worker the jobs are leased to, this process by default
+        lease_seconds: Time the worker has to report back
+    """
+    requeue_expired()
+    
+    candidates = db_session.query(GradingJob.id).filter_by(
+        status=GRADING_JOB_STATUS_QUEUED
+    ).order_by(GradingJob.id.asc()).limit(limit).all()
+    
+    claimed = []
+    now = datetime.utcnow()
+    for (job_id,) in candidates:
+        updated = db_session.query(GradingJob).filter_by(
+            id=job_id, status=GRADING_JOB_STATUS_QUEUED
+        ).update({
+            GradingJob.status: GRADING_JOB_STATUS_RUNNING,
+            GradingJob.started_at: now,
+            GradingJob.attempts: GradingJob.attempts + 1,
+            GradingJob.worker_id: worker_id or default_worker_id(),
+            GradingJob.lease_token: uuid.uuid4().hex,
+            GradingJob.lease_expires_at: now + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(job_id)
+    db_session.commit()
+    
+    if not claimed:
+        return []
+    return db_session.query(GradingJob).filter(GradingJob.id.in_(claimed)).order_by(GradingJob.id.asc()).all()
+
+
+def _fail(job: GradingJob, error: str):
+    """Requeue a failed job, or give up on it after too many attempts."""
+    job.error = error
+    job.lease_token = None
+    if job.attempts < GRADING_MAX_ATTEMPTS:
+        job.status = GRADING_JOB_STATUS_QUEUED
+    else:
+        job.status = GRADING_JOB_STATUS_FAILED
+        job.finished_at = datetime.utcnow()
+
+
+def _update_leased(job_id: int, lease_token: str, values: Dict) -> bool:
+    """Update a running job only if the lease it was claimed with is still held."""
+    return bool(db_session.query(GradingJob).filter_by(
+        id=job_id, status=GRADING_JOB_STATUS_RUNNING, lease_token=lease_token
+    ).update(values, synchronize_session=False))
+
+
+def process_jobs(jobs: List[GradingJob]):
+    """
+    Grade the answers of claimed jobs in parallel and record the outcome.
+    
+    Test cases with a stored result for an answer's current code are not run
+    again (see ``grader.grade_answers``), so regrading after a question's
+    test cases changed only runs the new or changed ones.
+    
+    Grading can outlast a lease, after which the job may be requeued and
+    claimed by another worker. Each job is therefore finished with a
+    conditional UPDATE on its lease token before its answer is scored, and
+    the result of a job whose lease is gone is discarded.
+    """
+    # Read before grading: a rollback would reload a newer worker's lease
+    leases = [(job.id, job.lease_token, job.attempts) for job in jobs]
+    answers = [job.answer for job in jobs]
+    args = [grading_job(answer, answer.submission) if answer is not None else None for answer in answers]
+    gradable = [idx for idx, job_args in enumerate(args) if job_args is not None]
+    try:
+        grade_results = dict(zip(gradable, grade_answers([answers[idx] for idx in gradable],
+                                                         [args[idx] for idx in gradable])))
+    except Exception as e:
+        db_session.rollback()
+        now = datetime.utcnow()
+        for job_id, lease_token, attempts in leases:
+            gave_up = attempts >= GRADING_MAX_ATTEMPTS
+            _update_leased(job_id, lease_token, {
+                GradingJob.status: GRADING_JOB_STATUS_FAILED if gave_up else GRADING_JOB_STATUS_QUEUED,
+                GradingJob.error: f"Grading error: {str(e)}",
+                GradingJob.lease_token: None,
+                GradingJob.finished_at: now if gave_up else None
+            })
+        db_session.commit()
+        return
+    
+    now = datetime.utcnow()
+    for idx, ((job_id, lease_token, _), answer) in enumerate(zip(leases, answers)):
+        finished = _update_leased(job_id, lease_token, {
+            GradingJob.status: GRADING_JOB_STATUS_DONE if answer is not None else GRADING_JOB_STATUS_FAILED,
+            GradingJob.error: None if answer is not None else "Answer no longer exists",
+            GradingJob.lease_token: None,
+            GradingJob.finished_at: now
+        })
+        if not finished or answer is None:
+            continue
+        if idx in grade_results:
+            apply_grade_result(answer, args[idx], grade_results[idx])
+        answer.updated_at = now
+    db_session.commit()
+
+
+def _finish(job: GradingJob, answer=None):
+    """Mark a job as done, or as failed if its answer is gone."""
+    now = datetime.utcnow()
+    if answer is None:
+        job.status = GRADING_JOB_STATUS_FAILED
+        job.error = "Answer no longer exists"
+    else:
+        job.status = GRADING_JOB_STATUS_DONE
+        job.error = None
+        answer.updated_at = now
+    job.lease_token = None
+    job.finished_at = now
+
+
+def _args_hash(args: Tuple) -> str:
+    """Fingerprint of grading arguments, to detect answers or questions edited during a lease."""
+    return hashlib.sha256(json.dumps(list(args), sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def lease_jobs(worker_id: str, limit: int, lease_seconds: int = GRADING_LEASE_SECONDS) -> List[Dict]:
+    """
+    Lease queued jobs to a remote worker.
+    
+    Jobs that need no execution (answers that do not compile, results
+    already in the grading cache, answers that are gone) are finished here
+    and not handed out.
+    
+    Returns:
+        One dictionary per leased job with job_id, lease_token,
+        lease_expires_at, args_hash and args, the grading arguments (code,
+        test_cases, points, case_timeouts, expected_outputs, policy, efficiency)
+    """
+    leased = []
+    for job in claim_jobs(limit, worker_id, lease_seconds):
+        answer = job.answer
+        args = grading_job(answer, answer.submission) if answer is not None else None
+        if args is None:
+            _finish(job, answer)
+            continue
+        
+        code, test_cases, points, case_timeouts, expected_outputs, policy, efficiency = args
+        is_valid, _ = validate_code_syntax(code)
+        if not is_valid:
+            # Scored as a syntax error without running anything
+            apply_grade_result(answer, args, grade_code_submission(*args))
+            _finish(job, answer)
+            continue
+        
+        benchmark = efficiency['benchmark'] if efficiency else None
+        cached = grading_cache.lookup(execution_cache_key(
+            code, test_cases, case_timeouts, expected_outputs, policy, benchmark
+        ))
+        if cached is not None:
+            apply_grade_result(answer, args, score_test_results(
+                cached.get('test_results', []), points, efficiency, cached.get('benchmarks')
+            ))
+            _finish(job, answer)
+            continue
+        
+        leased.append({
+            "job_id": job.id,
+            "lease_token": job.lease_token,
+            "lease_expires_at": job.lease_expires_at.isoformat(),
+            "args_hash": _args_hash(args),
+            "args": list(args)
+        })
+    
+    # Also keeps reference results computed while building the arguments
+    db_session.commit()
+    return leased
+
+
+def complete_job(job_id: int, lease_token: str, args_hash: Optional[str] = None,
+                 result: Optional[Dict] = None, error: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Record what a remote worker reports for a leased job.
+    
+    Args:
+        job_id: Leased job
+        lease_token: Token handed out with the lease
+        args_hash: args_hash handed out with the lease
+        result: execute_code result for the leased arguments
+        error: Why the worker could not run the job, instead of a result
+    
+    Returns:
+        Tuple of (accepted, outcome): outcome is "done", "requeued" or
+        "failed"; a result for a lease that expired is not accepted
+    """
+    job = db_session.query(GradingJob).filter_by(id=job_id).first()
+    if job is None or job.status != GRADING_JOB_STATUS_RUNNING or job.lease_token != lease_token:
+        return False, "Lease is no longer held"
+    
+    if error is not None:
+        _fail(job, f"Worker error: {error}")
+        db_session.commit()
+        return True, "requeued" if job.status == GRADING_JOB_STATUS_QUEUED else job.status
+    
+    answer = job.answer
+    args = grading_job(answer, answer.submission) if answer is not None else None
+    if args is not None and _args_hash(args) != args_hash:
+        # The answer or its question changed while the job was out; grade it again
+        job.status = GRADING_JOB_STATUS_QUEUED
+        job.lease_token = None
+        db_session.commit()
+        return True, "requeued"
+    
+    if args is not None:
+        code, test_cases, points, case_timeouts, expected_outputs, policy, efficiency = args
+        benchmark = efficiency['benchmark'] if efficiency else None
+        grading_cache.store(execution_cache_key(code, test_cases, case_timeouts, expected_outputs, policy, benchmark), result)
+        apply_grade_result(answer, args, score_test_results(
+            result.get('test_results', []), points, efficiency, result.get('benchmarks')
+        ))
+    _finish(job, answer)
+    db_session.commit()
+    return True, job.status
+
+
+def requeue_running() -> int:
+    """
+    Return jobs left running by this host's previous server workers to the queue.
+    
+    Jobs leased to standalone workers keep their lease; they are requeued
+    only if it expires.
+    """
+    try:
+        requeued = db_session.query(GradingJob).filter(
+            GradingJob.status == GRADING_JOB_STATUS_RUNNING,
+            or_(GradingJob.worker_id.is_(None),
+                GradingJob.worker_id.like(f"{LOCAL_WORKER_PREFIX}{socket.gethostname()}-%"))
+        ).update({
+            GradingJob.status: GRADING_JOB_STATUS_QUEUED,
+            GradingJob.lease_token: None
+        }, synchronize_session=False)
+        db_session.commit()
+        return requeued
+    except SQLAlchemyError:
+        db_session.rollback()
+        return 0
+    finally:
+        db_session.remove()
+
+
+def run_worker(batch_size: int = CODE_EXECUTION_WORKERS, poll_interval: float = POLL_INTERVAL):
+    """Claim and grade jobs, and index answers for similarity checks, until the process is stopped."""
+    worker_id = LOCAL_WORKER_PREFIX + default_worker_id()
+    unindexable = set()  # answers this worker failed to index, left to index_test
+    while True:
+        jobs = []
+        indexed = 0
+        try:
+            jobs = claim_jobs(max(1, batch_size), worker_id)
+            if jobs:
+                process_jobs(jobs)
+            similarity = plagiarism.index_pending(skip=unindexable)
+            indexed = similarity['indexed']
+            unindexable.update(similarity['failed'])
+        except SQLAlchemyError:
+            # Most likely a locked database; the claimed jobs stay running until requeued
+            db_session.rollback()
+        finally:
+            db_session.remove()
+        
+        if not jobs and not indexed:
+            time.sleep(poll_interval)
+
+
+def start_workers(count: int = GRADING_WORKERS) -> List[multiprocessing.Process]:
+    """
+    Start background grading worker processes.
+    
+    Workers are spawned rather than forked so they do not inherit the
+    server's database connections.
+    """
+    if count <= 0:
+        return []
+    
+    requeue_running()
+    
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for i in range(count):
+        process = context.Process(target=run_worker, name=f"grading-worker-{i + 1}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def get_queue_stats() -> Dict:
+    """Number of grading jobs per status."""
+    counts = dict(
+        db_session.query(GradingJob.status, func.count(GradingJob.id)).group_by(GradingJob.status).all()
+    )
+    return {
+        status: counts.get(status, 0)
+        for status in (GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING,
+                       GRADING_JOB_STATUS_DONE, GRADING_JOB_STATUS_FAILED)
+    }
+
+
+if __name__ == "__main__":
+    # Standalone worker, e.g. when the server runs with GRADING_WORKERS=0
+    run_worker()
+
@@ -0,0 +1,153 @@
+"""Standalone grading worker.
+
+A worker leases code-grading jobs from a server over HTTP, runs them in its
+own sandbox (with the same ``CODE_EXECUTION_*`` settings as the server) and
+posts the execution results back; the server scores them and stores the
+grades. Workers hold no database connection, so any machine that can reach
+the server can run them, and throughput grows with the number of worker
+processes. A worker that crashes simply lets its leases expire, after which
+the server hands the jobs to another worker.
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from server.services.code_executor import CODE_EXECUTION_WORKERS, execute_code
+from server.services.scheduler import ExecutionScheduler
+from shared.constants import API_WORKERS
+
+load_dotenv()
+
+GRADING_SERVER_URL = os.getenv("GRADING_SERVER_URL", "http://localhost:5000")
+GRADING_WORKER_TOKEN = os.getenv("GRADING_WORKER_TOKEN", "")
+POLL_INTERVAL = 1.0  # seconds between polls of an empty queue
+REQUEST_TIMEOUT = 30  # seconds per HTTP request
+
+
+def default_worker_id() -> str:
+    """Identify this worker process across machines."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkerClient:
+    """HTTP client for the server's worker endpoints."""
+    
+    def __init__(self, server_url: str = GRADING_SERVER_URL, token: str = GRADING_WORKER_TOKEN,
+                 worker_id: Optional[str] = None):
+        self.base_url = server_url.rstrip('/') + API_WORKERS
+        self.token = token
+        self.worker_id = worker_id or default_worker_id()
+    
+    def _post(self, path: str, payload: Dict) -> Dict:
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.token}"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read().decode('utf-8'))
+    
+    def lease(self, limit: int) -> List[Dict]:
+        """Lease up to ``limit`` jobs."""
+        return self._post("/lease", {"worker_id": self.worker_id, "limit": limit})["jobs"]
+    
+    def report(self, job: Dict, result: Optional[Dict] = None, error: Optional[str] = None) -> Optional[Dict]:
+        """
+        Post the result of a leased job, or why it could not be run.
+        
+        Returns:
+            The server's response, None if it rejected the result because the
+            lease had expired
+        """
+        payload = {"lease_token": job["lease_token"], "args_hash": job["args_hash"]}
+        if error is not None:
+            payload["error"] = error
+        else:
+            payload["result"] = result
+        try:
+            return self._post(f"/jobs/{job['job_id']}/result", payload)
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                return None
+            raise
+
+
+def run_job(job: Dict) -> Dict:
+    """Execute one leased job and return the execution result."""
+    code, test_cases, points, case_timeouts, expected_outputs, policy, efficiency = job["args"]
+    return execute_code(code, test_cases, case_timeouts=case_timeouts, expected_outputs=expected_outputs,
+                        policy=policy, benchmark=efficiency['benchmark'] if efficiency else None)
+
+
+def work(client: WorkerClient, batch_size: int = CODE_EXECUTION_WORKERS,
+         poll_interval: float = POLL_INTERVAL, max_idle_polls: Optional[int] = None) -> int:
+    """
+    Lease, run and report jobs until stopped.
+    
+    Args:
+        client: Client of the server to work for
+        batch_size: Jobs leased and run in parallel at a time
+        poll_interval: Seconds to wait when the queue is empty or the server unreachable
+        max_idle_polls: Stop after this many polls in a row found no work, None to run forever
+    
+    Returns:
+        Number of jobs reported
+    """
+    scheduler = ExecutionScheduler(batch_size, name="grading-worker")
+    reported = idle_polls = 0
+    while max_idle_polls is None or idle_polls < max_idle_polls:
+        try:
+            jobs = client.lease(max(1, batch_size))
+        except (urllib.error.URLError, OSError, ValueError, KeyError):
+            # Server restarting or unreachable; try again later
+            jobs = []
+        
+        if not jobs:
+            idle_polls += 1
+            time.sleep(poll_interval)
+            continue
+        idle_polls = 0
+        
+        def run(job):
+            try:
+                return run_job(job), None
+            except Exception as e:
+                return None, f"{type(e).__name__}: {e}"
+        
+        for job, (result, error) in zip(jobs, scheduler.map(run, jobs)):
+            try:
+                client.report(job, result, error)
+                reported += 1
+            except (urllib.error.URLError, OSError, ValueError):
+                # The lease expires and the job is handed out again
+                pass
+    return reported
+
+
+def run_worker(server_url: str = GRADING_SERVER_URL, token: str = GRADING_WORKER_TOKEN,
+               batch_size: int = CODE_EXECUTION_WORKERS):
+    """Entry point of one worker process."""
+    work(WorkerClient(server_url, token), batch_size)
+
+
+def start_workers(count: int, server_url: str = GRADING_SERVER_URL, token: str = GRADING_WORKER_TOKEN,
+                  batch_size: int = CODE_EXECUTION_WORKERS) -> List[multiprocessing.Process]:
+    """Start ``count`` standalone worker processes on this machine."""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for i in range(count):
+        process = context.Process(
+            target=run_worker, args=(server_url, token, batch_size),
+            name=f"standalone-grading-worker-{i + 1}"
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
@@ -0,0 +1,460 @@
+"""Single-process test harness for student code.
+
+The harness compiles a program once and runs it for every test case in the
+same interpreter, each time with fresh globals and with stdin/stdout/stderr
+redirected to in-memory buffers. This turns N process launches per answer
+into one.
+
+Function test cases (``{"function", "args", "kwargs", "expected"}``) instead
+load the program once as a module and call the named function per case, so
+no program output has to be parsed.
+
+Run in one process, the harness only isolates test cases from each other
+at the level of module globals. Like the zygote, it must only depend on the
+standard library. Run as ``python -m server.services.harness`` (``main``,
+used where fork is unavailable) it reads one JSON request ``{"code",
+"bytecode", "test_case", "timeout", "output_limit"}`` on stdin, runs that
+single test case and writes its JSON result on stdout.
+
+``bytecode`` is the program compiled by the server (see ``dump_code``); when
+it is given the source is not compiled again.
+
+Whatever runs in the same process as student code can be read or faked by
+it, so test cases reach the harness without their expected results (see
+``runnable_case``) and the zygote runs every case of a batch in its own
+process, measured from outside (see ``run_cases``' ``runner``).
+"""
+
+import base64
+import builtins
+import io
+import json
+import marshal
+import signal
+import sys
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# __name__ of student code loaded for function test cases
+MODULE_NAME = "solution"
+
+# Test case keys the harness needs; everything else (the expected result) stays with the server
+RUNNABLE_KEYS = ("input", "function", "args", "kwargs", "timeout")
+
+
+class CaseTimeout(BaseException):
+    """Raised inside student code when a test case runs out of time.
+    
+    Derives from BaseException so a bare ``except Exception`` in student
+    code does not swallow it.
+    """
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised inside student code when it writes more than the output limit."""
+
+
+class CappedStringIO(io.StringIO):
+    """In-memory text stream that refuses to grow past ``limit`` UTF-8 bytes.
+    
+    The write that crosses the limit stores what still fits and raises
+    OutputLimitExceeded, as does every later write.
+    """
+    
+    def __init__(self, limit: int = 0):
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+        self.exceeded = False
+    
+    def write(self, s):
+        if not self.limit:
+            return super().write(s)
+        if self.exceeded:
+            raise OutputLimitExceeded()
+        size = len(s) if s.isascii() else len(s.encode("utf-8", errors="replace"))
+        if self.size + size > self.limit:
+            self.exceeded = True
+            # Character slice, so a multi-byte tail may keep the stream slightly under the limit
+            super().write(s[:self.limit - self.size])
+            self.size = self.limit
+            raise OutputLimitExceeded()
+        self.size += size
+        return super().write(s)
+
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def exit_status(code) -> int:
+    """Map a SystemExit code to a process exit status like the interpreter does."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xFF
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _peak_memory_mb():
+    """High-water mark of this process's resident memory, None if unknown."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def _report(report, *args):
+    """Write an exit message or traceback to the (possibly full) captured stderr."""
+    try:
+        return report(*args)
+    except OutputLimitExceeded:
+        return 1
+
+
+def _call(target, args: tuple, kwargs: Dict, test_input: str, timeout: float, output_limit: int) -> Dict:
+    """
+    Call ``target(*args, **kwargs)`` with redirected stdio and a timeout.
+    
+    Returns:
+        Dictionary with returncode, stdout, stderr, timed_out,
+        output_limit_exceeded, wall_time, cpu_time, peak_memory_mb and the
+        raw return value under "value"
+    """
+    stdout = CappedStringIO(output_limit)
+    stderr = CappedStringIO(output_limit)
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(str(test_input)), stdout, stderr
+    
+    use_alarm = hasattr(signal, "setitimer")
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    
+    returncode = 0
+    timed_out = False
+    value = None
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        value = target(*args, **kwargs)
+    except CaseTimeout:
+        timed_out = True
+        returncode = None
+    except SystemExit as e:
+        returncode = _report(exit_status, e.code)
+    except BaseException:
+        etype, exc, tb = sys.exc_info()
+        # Drop this frame so the traceback matches a plain interpreter run
+        _report(traceback.print_exception, etype, exc, tb.tb_next)
+        returncode = 1
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        sys.stdin, sys.stdout, sys.stderr = saved
+    wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    
+    return {
+        "returncode": returncode,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "timed_out": timed_out,
+        "output_limit_exceeded": stdout.exceeded or stderr.exceeded,
+        "wall_time": round(wall_time, 6),
+        "cpu_time": round(cpu_time, 6),
+        "peak_memory_mb": _peak_memory_mb(),
+        "value": value,
+    }
+
+
+def dump_code(code_obj) -> str:
+    """Serialize a compiled program for another interpreter of the same Python version."""
+    return base64.b64encode(marshal.dumps(code_obj)).decode("ascii")
+
+
+def load_code(code: str, bytecode: Optional[str] = None):
+    """
+    Return the code object of a program.
+    
+    Uses the precompiled ``bytecode`` if given and compiles ``code`` otherwise,
+    raising SyntaxError like the interpreter would.
+    """
+    if bytecode:
+        return marshal.loads(base64.b64decode(bytecode))
+    return compile(code, "<string>", "exec")
+
+
+def run_case(code_obj, test_input: str, timeout: float, output_limit: int = 0) -> Dict:
+    """
+    Run a compiled program once against a single input.
+    
+    Args:
+        code_obj: Compiled program
+        test_input: Text fed to the program's stdin
+        timeout: Wall-clock limit in seconds
+        output_limit: Maximum bytes per output stream, 0 for none
+    
+    Returns:
+        Dictionary with returncode, stdout, stderr, timed_out,
+        output_limit_exceeded, wall_time, cpu_time and peak_memory_mb. Peak
+        memory is the high-water mark of the whole harness process so far, not
+        of this case alone.
+    """
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    result = _call(exec, (code_obj, namespace), {}, test_input, timeout, output_limit)
+    del result["value"]
+    return result
+
+
+def case_timeout(test_case: Dict, default: float) -> float:
+    """Timeout of a test case: its own 'timeout' if set, else ``default``."""
+    return float(test_case.get("timeout", default))
+
+
+def batch_budget(test_cases: List[Dict], default: float) -> float:
+    """Wall-clock budget for running all ``test_cases`` in one harness request.
+    
+    Each function test case may also take one ``default`` period to load the
+    module, and each case a second to start.
+    """
+    return sum(
+        case_timeout(test_case, default) + (default if is_function_case(test_case) else 0) + 1
+        for test_case in test_cases
+    ) + default + 1
+
+
+def is_function_case(test_case: Dict) -> bool:
+    """Whether a test case calls a function instead of running the program."""
+    return "function" in test_case
+
+
+def runnable_case(test_case: Dict) -> Dict:
+    """A test case without its expected result, safe to hand to the process running student code."""
+    return {key: test_case[key] for key in RUNNABLE_KEYS if key in test_case}
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        try:
+            return sorted(value)
+        except TypeError:
+            return list(value)
+    return repr(value)
+
+
+def to_json(value):
+    """
+    Convert a return value to plain JSON data for structural comparison.
+    
+    Tuples become lists and sets become sorted lists; anything JSON cannot
+    represent is replaced by its repr().
+    """
+    try:
+        return json.loads(json.dumps(value, default=_json_default))
+    except (TypeError, ValueError, RecursionError):
+        return repr(value)
+
+
+def load_module(code_obj, timeout: float, output_limit: int = 0):
+    """
+    Run a program's top-level code once as an importable module.
+    
+    ``__name__`` is not ``"__main__"``, so code under an
+    ``if __name__ == "__main__":`` guard does not run.
+    
+    Returns:
+        Tuple of (module namespace, None) on success, or (None, failed run result)
+    """
+    namespace = {"__name__": MODULE_NAME, "__builtins__": builtins}
+    result = _call(exec, (code_obj, namespace), {}, "", timeout, output_limit)
+    del result["value"]
+    if result["returncode"] != 0:
+        return None, result
+    return namespace, None
+
+
+def run_function_case(namespace: Dict, test_case: Dict, timeout: float, output_limit: int = 0) -> Dict:
+    """
+    Call a function of a loaded module with the arguments of a test case.
+    
+    Args:
+        namespace: Module namespace from load_module
+        test_case: Test case with 'function' and optional 'args' and 'kwargs' keys
+        timeout: Wall-clock limit in seconds
+        output_limit: Maximum bytes per output stream and of the return value, 0 for none
+    
+    Returns:
+        Same as run_case plus "return_value", the JSON form of the return value
+    """
+    name = test_case["function"]
+    function = namespace.get(name)
+    if not callable(function):
+        return {
+            "returncode": 1, "stdout": "", "stderr": f"NameError: function '{name}' is not defined",
+            "timed_out": False, "output_limit_exceeded": False, "wall_time": 0.0, "cpu_time": 0.0,
+            "peak_memory_mb": None, "return_value": None
+        }
+    
+    args = test_case.get("args") or []
+    kwargs = test_case.get("kwargs") or {}
+    result = _call(function, tuple(args), kwargs, "", timeout, output_limit)
+    value = to_json(result.pop("value"))
+    if output_limit and len(json.dumps(value)) > output_limit:
+        result["output_limit_exceeded"] = True
+        value = None
+    result["return_value"] = value
+    return result
+
+
+_IMPORT_ERRORS = ("ModuleNotFoundError", "ImportError")
+
+
+class EarlyExit:
+    """
+    Grading policy deciding when to stop running an answer's test cases.
+    
+    Policy keys (all optional):
+        max_consecutive_timeouts: Stop after this many test cases in a row ran
+            out of time (or CPU time)
+        stop_on_import_error: Stop when the program cannot import a module, or
+            when its module fails to load for function test cases
+    
+    Feed outcomes in test-case order to ``observe``; once it returns a reason,
+    the remaining test cases are not run.
+    """
+    
+    def __init__(self, policy: Optional[Dict] = None):
+        policy = policy or {}
+        self.max_consecutive_timeouts = int(policy.get("max_consecutive_timeouts") or 0)
+        self.stop_on_import_error = bool(policy.get("stop_on_import_error"))
+        self.consecutive_timeouts = 0
+        self.reason = None
+    
+    def __bool__(self):
+        return bool(self.max_consecutive_timeouts or self.stop_on_import_error)
+    
+    def observe(self, timed_out: bool, error: str = "", load_failed: bool = False) -> Optional[str]:
+        """Record one test case outcome and return the reason to stop, if any."""
+        self.consecutive_timeouts = self.consecutive_timeouts + 1 if timed_out else 0
+        if self.max_consecutive_timeouts and self.consecutive_timeouts >= self.max_consecutive_timeouts:
+            self.reason = f"stopped after {self.consecutive_timeouts} consecutive timeout(s)"
+        elif self.stop_on_import_error and load_failed:
+            self.reason = "stopped because the program failed to load"
+        elif self.stop_on_import_error and error.strip().splitlines()[-1:] and \
+                error.strip().splitlines()[-1].startswith(_IMPORT_ERRORS):
+            self.reason = "stopped because the program failed to import a module"
+        return self.reason
+
+
+def run_single_case(code_obj, test_case: Dict, timeout: float, output_limit: int = 0) -> Dict:
+    """
+    Run one test case on its own, loading the module first for a function test case.
+    
+    Returns:
+        Same as run_case or run_function_case; "load_failed" is set when the
+        module of a function test case did not load
+    """
+    if not is_function_case(test_case):
+        return run_case(code_obj, test_case.get("input", ""), case_timeout(test_case, timeout), output_limit)
+    namespace, load_failure = load_module(code_obj, timeout, output_limit)
+    if load_failure is not None:
+        return dict(load_failure, return_value=None, load_failed=True)
+    return run_function_case(namespace, test_case, case_timeout(test_case, timeout), output_limit)
+
+
+def skipped_result(reason: str) -> Dict:
+    """Result of a test case that was not run because of a grading policy."""
+    return {
+        "returncode": None, "stdout": "", "stderr": "", "timed_out": False,
+        "output_limit_exceeded": False, "wall_time": 0.0, "cpu_time": 0.0,
+        "peak_memory_mb": None, "skipped": reason
+    }
+
+
+def run_cases(code: str, test_cases: List[Dict], timeout: float, output_limit: int = 0,
+              policy: Optional[Dict] = None, bytecode: Optional[str] = None,
+              runner: Optional[Callable] = None) -> List[Dict]:
+    """
+    Compile ``code`` once (unless precompiled) and run it for every test case.
+    
+    Program test cases run the whole program with the case's input on stdin.
+    Function test cases share one module load and only call the named function.
+    With a ``runner``, every case is instead passed to
+    ``runner(code_obj, test_case, timeout, output_limit)``, which returns its
+    result like run_single_case; the zygote uses this to run each case in a
+    separate process.
+    
+    Args:
+        code: Python source of the student's program
+        test_cases: List of program test cases (with an 'input' key) and
+            function test cases (with a 'function' key)
+        timeout: Timeout in seconds of test cases without their own 'timeout'
+            and of loading the module
+        output_limit: Maximum bytes per output stream and case, 0 for none
+        policy: Optional grading policy for stopping early (see EarlyExit)
+        bytecode: Optional precompiled ``code`` (see dump_code)
+    
+    Returns:
+        One result dictionary per test case, in order; cases skipped by the
+        policy have a "skipped" reason
+    """
+    try:
+        code_obj = load_code(code, bytecode)
+    except SyntaxError:
+        error = traceback.format_exc(limit=0)
+        return [
+            {"returncode": 1, "stdout": "", "stderr": error, "timed_out": False,
+             "output_limit_exceeded": False, "wall_time": 0.0, "cpu_time": 0.0, "peak_memory_mb": None}
+            for _ in test_cases
+        ]
+    
+    early_exit = EarlyExit(policy)
+    namespace, load_failure = None, None
+    results = []
+    for test_case in test_cases:
+        if early_exit.reason:
+            results.append(skipped_result(early_exit.reason))
+            continue
+        
+        load_failed = False
+        if runner is not None:
+            result = runner(code_obj, test_case, timeout, output_limit)
+            load_failed = bool(result.pop("load_failed", False))
+        elif not is_function_case(test_case):
+            result = run_case(code_obj, test_case.get("input", ""), case_timeout(test_case, timeout), output_limit)
+        else:
+            if namespace is None and load_failure is None:
+                namespace, load_failure = load_module(code_obj, timeout, output_limit)
+            if load_failure is not None:
+                result = dict(load_failure, return_value=None)
+            else:
+                result = run_function_case(namespace, test_case, case_timeout(test_case, timeout), output_limit)
+        
+        results.append(result)
+        early_exit.observe(result["timed_out"], result["stderr"], load_failed=load_failed or load_failure is not None)
+    return results
+
+
+def main():
+    """Run the test case of one harness request read from stdin."""
+    request = json.load(sys.stdin)
+    out = sys.stdout
+    result = run_single_case(
+        load_code(request.get("code", ""), request.get("bytecode")),
+        request["test_case"],
+        float(request.get("timeout", 5)),
+        int(request.get("output_limit", 0))
+    )
+    json.dump(result, out)
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
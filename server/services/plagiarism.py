@@ -0,0 +1,321 @@
+"""Index of similar code answers.
+
+Every submitted code answer is fingerprinted the way MOSS does it:
+
+1. The code is parsed and printed back from its AST, which drops comments,
+   docstrings and formatting, then tokenized with every name that is not a
+   keyword, builtin or attribute replaced by ``V``, numbers by ``N`` and
+   strings by ``S``, so renaming variables or reformatting changes nothing.
+2. Each run of ``SIMILARITY_KGRAM`` tokens is hashed and winnowing keeps the
+   smallest hash of every ``SIMILARITY_WINDOW`` consecutive ones, which
+   guarantees that any copied run of ``SIMILARITY_KGRAM + SIMILARITY_WINDOW
+   - 1`` tokens shares a fingerprint.
+
+The fingerprints are stored per question as an inverted index (hash ->
+answers). A new answer is compared only with the answers it shares a
+fingerprint with, found with one indexed lookup, instead of with every
+answer to the question; fingerprints shared by more than
+``SIMILARITY_MAX_POSTINGS`` answers (starter code, common idioms) do not
+make answers candidates. Pairs whose Jaccard similarity of fingerprints
+reaches ``SIMILARITY_THRESHOLD`` are stored as they are found. Answers of
+the same student (other attempts) are never matched.
+
+Submitting a test does not wait for indexing: the grading workers index
+submitted answers in the background (``index_pending``), so the matches of
+a test catch up shortly after submissions arrive. Only the first
+``SIMILARITY_MAX_CODE_BYTES`` of an answer are fingerprinted.
+"""
+
+import ast
+import builtins
+import hashlib
+import io
+import keyword
+import os
+import tokenize
+from typing import Dict, Iterable, List, Optional, Set
+from dotenv import load_dotenv
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased
+from server.database import db_session
+from server.models import Answer, CodeFingerprint, Question, SimilarityMatch, Submission, User
+from server.services.grading_cache import normalize_code
+from shared.constants import QUESTION_TYPE_CODE, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+
+load_dotenv()
+
+SIMILARITY_KGRAM = int(os.getenv("SIMILARITY_KGRAM", 10))  # tokens per hashed run
+SIMILARITY_WINDOW = int(os.getenv("SIMILARITY_WINDOW", 5))  # hashes per winnowing window
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.5))  # minimum stored similarity
+SIMILARITY_MAX_POSTINGS = int(os.getenv("SIMILARITY_MAX_POSTINGS", 50))
+# Longer code is fingerprinted up to the last line that fits
+SIMILARITY_MAX_CODE_BYTES = int(os.getenv("SIMILARITY_MAX_CODE_BYTES", 64 * 1024))
+SIMILARITY_INDEX_BATCH = int(os.getenv("SIMILARITY_INDEX_BATCH", 20))  # answers indexed per worker poll
+
+_BUILTINS = set(dir(builtins))
+_HASH_MASK = (1 << 63) - 1  # fits a signed 64-bit SQLite integer
+
+
+def _strip_docstrings(tree: ast.AST):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            first = node.body[0]
+            if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) \
+                    and isinstance(first.value.value, str):
+                node.body = node.body[1:] or [ast.Pass()]
+
+
+def normalize_tokens(code: str) -> List[str]:
+    """Tokens of code with comments, formatting and identifier names abstracted away."""
+    code = normalize_code(code)
+    try:
+        tree = ast.parse(code)
+        _strip_docstrings(tree)
+        code = ast.unparse(tree)
+    except (SyntaxError, ValueError, RecursionError):
+        pass  # Code that does not parse is tokenized as written
+    
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.NAME:
+                keep = keyword.iskeyword(token.string) or token.string in _BUILTINS or (tokens and tokens[-1] == ".")
+                tokens.append(token.string if keep else "V")
+            elif token.type == tokenize.NUMBER:
+                tokens.append("N")
+            elif token.type == tokenize.STRING or token.type == getattr(tokenize, "FSTRING_MIDDLE", None):
+                tokens.append("S")
+            elif token.type == tokenize.INDENT:
+                tokens.append("{")
+            elif token.type == tokenize.DEDENT:
+                tokens.append("}")
+            elif token.type == tokenize.NEWLINE:
+                tokens.append(";")
+            elif token.type not in (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER):
+                tokens.append(token.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass  # Keep the tokens read so far
+    return tokens
+
+
+def _truncate(code: str) -> str:
+    """Code cut to whole lines within SIMILARITY_MAX_CODE_BYTES."""
+    encoded = code.encode("utf-8", errors="surrogatepass")
+    if len(encoded) <= SIMILARITY_MAX_CODE_BYTES:
+        return code
+    head = encoded[:SIMILARITY_MAX_CODE_BYTES].decode("utf-8", errors="ignore")
+    return head.rpartition("\n")[0] or head
+
+
+def fingerprints(code: str) -> Set[int]:
+    """Winnowed hashes of the token k-grams of code; empty for code too short to compare."""
+    tokens = normalize_tokens(_truncate(code))
+    if len(tokens) < SIMILARITY_KGRAM:
+        return set()
+    
+    hashes = [
+        int.from_bytes(hashlib.blake2b(
+            " ".join(tokens[i:i + SIMILARITY_KGRAM]).encode("utf-8", errors="surrogatepass"), digest_size=8
+        ).digest(), "big") & _HASH_MASK
+        for i in range(len(tokens) - SIMILARITY_KGRAM + 1)
+    ]
+    window = min(SIMILARITY_WINDOW, len(hashes))
+    selected = set()
+    for start in range(len(hashes) - window + 1):
+        selected.add(min(hashes[start:start + window]))
+    return selected
+
+
+def index_answer(answer: Answer, user_id: int) -> int:
+    """
+    Add a code answer to the index and store its matches with earlier answers.
+    
+    The answer is marked as indexed even if it is too short to fingerprint.
+    The caller commits.
+    
+    Args:
+        answer: Code answer
+        user_id: Student who wrote it; their other answers are not matched
+    
+    Returns:
+        Number of matches stored
+    """
+    db_session.query(CodeFingerprint).filter_by(answer_id=answer.id).delete(synchronize_session=False)
+    db_session.query(SimilarityMatch).filter(
+        or_(SimilarityMatch.answer_id == answer.id, SimilarityMatch.other_answer_id == answer.id)
+    ).delete(synchronize_session=False)
+    answer.similarity_indexed = True
+    
+    hashes = fingerprints(answer.code or "")
+    if not hashes:
+        return 0
+    
+    in_question = (CodeFingerprint.question_id == answer.question_id, CodeFingerprint.hash.in_(list(hashes)))
+    rare = [
+        fingerprint for fingerprint, postings in db_session.query(
+            CodeFingerprint.hash, func.count(CodeFingerprint.answer_id)
+        ).filter(*in_question).group_by(CodeFingerprint.hash).all()
+        if postings <= SIMILARITY_MAX_POSTINGS
+    ]
+    
+    matches = []
+    if rare:
+        candidates = select(CodeFingerprint.answer_id).where(
+            CodeFingerprint.question_id == answer.question_id, CodeFingerprint.hash.in_(rare)
+        ).distinct()
+        shared = dict(db_session.query(
+            CodeFingerprint.answer_id, func.count(CodeFingerprint.hash)
+        ).join(
+            Answer, Answer.id == CodeFingerprint.answer_id
+        ).join(
+            Submission, Submission.id == Answer.submission_id
+        ).filter(
+            *in_question,
+            CodeFingerprint.answer_id.in_(candidates),
+            Submission.user_id != user_id
+        ).group_by(CodeFingerprint.answer_id).all())
+        # Fingerprints of every candidate, for the size of the union
+        sizes = dict(db_session.query(
+            CodeFingerprint.answer_id, func.count(CodeFingerprint.hash)
+        ).filter(CodeFingerprint.answer_id.in_(list(shared))).group_by(CodeFingerprint.answer_id).all())
+        
+        for other_id, common in shared.items():
+            similarity = common / (len(hashes) + sizes[other_id] - common)
+            if similarity >= SIMILARITY_THRESHOLD:
+                matches.append({
+                    "question_id": answer.question_id,
+                    "answer_id": min(answer.id, other_id),
+                    "other_answer_id": max(answer.id, other_id),
+                    "shared": common,
+                    "similarity": round(similarity, 4)
+                })
+    
+    db_session.execute(insert(CodeFingerprint), [
+        {"answer_id": answer.id, "question_id": answer.question_id, "hash": fingerprint} for fingerprint in hashes
+    ])
+    if matches:
+        upsert = insert(SimilarityMatch)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[SimilarityMatch.answer_id, SimilarityMatch.other_answer_id],
+            set_={"shared": upsert.excluded.shared, "similarity": upsert.excluded.similarity}
+        )
+        db_session.execute(upsert, matches)
+    return len(matches)
+
+
+def _unindexed(*filters):
+    """Query of submitted code answers not indexed yet, with the user id of their student."""
+    return db_session.query(Answer, Submission.user_id).join(
+        Submission, Submission.id == Answer.submission_id
+    ).join(
+        Question, Question.id == Answer.question_id
+    ).filter(
+        Submission.status.in_([SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED]),
+        Question.type == QUESTION_TYPE_CODE,
+        Answer.code.isnot(None),
+        Answer.similarity_indexed.isnot(True),
+        *filters
+    ).order_by(Answer.id.asc())
+
+
+def index_pending(limit: int = SIMILARITY_INDEX_BATCH, skip: Iterable[int] = ()) -> Dict:
+    """
+    Index up to ``limit`` submitted code answers of any test, one transaction each.
+    
+    Each answer is claimed with a conditional UPDATE of its
+    ``similarity_indexed`` flag, so concurrent workers never index the same
+    answer twice. An answer that fails to index is rolled back and stays
+    unindexed, for a later call or ``index_test`` to pick up.
+    
+    Args:
+        limit: Maximum number of answers to index
+        skip: Ids of answers not to try, such as ones that failed before
+    
+    Returns:
+        Number of answers indexed and matches stored, and the ids of the
+        answers that failed
+    """
+    filters = [Answer.id.notin_(list(skip))] if skip else []
+    rows = [(answer.id, user_id) for answer, user_id in _unindexed(*filters).limit(limit).all()]
+    
+    indexed = matches = 0
+    failed = []
+    for answer_id, user_id in rows:
+        try:
+            claimed = db_session.query(Answer).filter(
+                Answer.id == answer_id, Answer.similarity_indexed.isnot(True)
+            ).update({Answer.similarity_indexed: True}, synchronize_session=False)
+            stored = index_answer(db_session.get(Answer, answer_id), user_id) if claimed else 0
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            failed.append(answer_id)
+            continue
+        if claimed:
+            indexed += 1
+            matches += stored
+    return {"indexed": indexed, "matches": matches, "failed": failed}
+
+
+def index_test(test_id: int) -> Dict:
+    """
+    Index the submitted code answers of a test that are not indexed yet,
+    such as answers submitted before the index existed or while no grading
+    worker was running. The caller commits.
+    """
+    rows = _unindexed(Submission.test_id == test_id).all()
+    
+    matches = 0
+    for answer, user_id in rows:
+        matches += index_answer(answer, user_id)
+    return {"test_id": test_id, "indexed": len(rows), "matches": matches}
+
+
+def test_matches(test_id: int, threshold: float = SIMILARITY_THRESHOLD,
+                 question_id: Optional[int] = None) -> List[Dict]:
+    """Stored matches involving answers to a test, most similar first."""
+    answer, submission, user = aliased(Answer), aliased(Submission), aliased(User)
+    other, other_submission, other_user = aliased(Answer), aliased(Submission), aliased(User)
+    
+    query = db_session.query(
+        SimilarityMatch, submission, user.username, other_submission, other_user.username
+    ).join(
+        answer, answer.id == SimilarityMatch.answer_id
+    ).join(
+        submission, submission.id == answer.submission_id
+    ).join(
+        user, user.id == submission.user_id
+    ).join(
+        other, other.id == SimilarityMatch.other_answer_id
+    ).join(
+        other_submission, other_submission.id == other.submission_id
+    ).join(
+        other_user, other_user.id == other_submission.user_id
+    ).filter(
+        or_(submission.test_id == test_id, other_submission.test_id == test_id),
+        SimilarityMatch.similarity >= threshold
+    )
+    if question_id is not None:
+        query = query.filter(SimilarityMatch.question_id == question_id)
+    
+    def side(answer_id, submission, username):
+        return {
+            "answer_id": answer_id,
+            "submission_id": submission.id,
+            "test_id": submission.test_id,
+            "user_id": submission.user_id,
+            "username": username
+        }
+    
+    return [{
+        "question_id": match.question_id,
+        "similarity": match.similarity,
+        "shared": match.shared,
+        "answers": [
+            side(match.answer_id, first, first_username),
+            side(match.other_answer_id, second, second_username)
+        ]
+    } for match, first, first_username, second, second_username in query.order_by(
+        SimilarityMatch.similarity.desc(), SimilarityMatch.id.asc()
+    ).all()]
@@ -0,0 +1,177 @@
+"""Reference solutions for code questions.
+
+A question may store a model answer. The reference is run on each test case
+when the question is saved and the results are cached on the question:
+
+* ``expected_outputs`` holds the normalized expected output of every case
+  (stripped stdout, or the JSON return value for function test cases) plus a
+  checksum over all of them. Grading compares answers against these instead
+  of the hand-typed ``output``/``expected`` values.
+* ``reference_timings`` holds the reference's run time per case. Answers are
+  given a per-case timeout of a multiple of that time (never below a floor
+  and never above ``CODE_EXECUTION_TIMEOUT``) instead of the flat limit. An
+  answer's total budget is the sum of its case timeouts.
+
+Every case is keyed by a hash of the reference and that case's inputs, so
+when test cases are edited only new or changed cases are run again.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from server.models import Question
+from server.services import harness
+from server.services.code_executor import CODE_TIMEOUT, CODE_EXECUTION_MODE, execute_code
+from server.services.grading_cache import normalize_code
+
+load_dotenv()
+
+# Case timeout = reference time x multiplier, clamped to [floor, CODE_EXECUTION_TIMEOUT]
+CODE_TIMEOUT_MULTIPLIER = float(os.getenv("CODE_TIMEOUT_MULTIPLIER", 10))
+CODE_TIMEOUT_FLOOR = float(os.getenv("CODE_TIMEOUT_FLOOR", 0.5))  # seconds
+
+
+def _hash(material) -> str:
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def timings_key(reference_solution: str, test_cases: List) -> str:
+    """Hash everything the reference results of a whole test-case set depend on."""
+    return _hash({
+        "reference": normalize_code(reference_solution),
+        "test_cases": test_cases,
+        "mode": CODE_EXECUTION_MODE,
+        "timeout": CODE_TIMEOUT,
+        "python": sys.version,
+    })
+
+
+def case_key(reference_solution: str, test_case: Dict) -> str:
+    """Hash everything the reference result of one test case depends on."""
+    if harness.is_function_case(test_case):
+        inputs = {key: test_case.get(key) for key in ("function", "args", "kwargs")}
+    else:
+        inputs = {"input": str(test_case.get('input', ''))}
+    return _hash({
+        "reference": normalize_code(reference_solution),
+        "case": inputs,
+        "mode": CODE_EXECUTION_MODE,
+        "timeout": CODE_TIMEOUT,
+        "python": sys.version,
+    })
+
+
+def _reference_entry(key: str, test_case: Dict, test: Dict) -> Dict:
+    """Cached reference result of one test case."""
+    function_case = harness.is_function_case(test_case)
+    if test.get('error') or (function_case and not test['actual_output']):
+        return {"key": key, "output": None, "seconds": None, "error": test.get('error', '')[-500:] or "Reference failed"}
+    
+    if function_case:
+        output = json.loads(test['actual_output'])
+        typed = 'expected' in test_case
+    else:
+        output = test['actual_output']
+        typed = 'output' in test_case
+    return {
+        "key": key,
+        "output": output,
+        "seconds": max(test.get('execution_time') or 0.0, test.get('cpu_time') or 0.0),
+        # Whether the hand-typed expected value disagrees with the reference
+        "mismatch": typed and not test['passed']
+    }
+
+
+def refresh(question: Question) -> Optional[Dict]:
+    """
+    Bring a question's expected outputs and reference timings up to date.
+    
+    The reference solution only runs on test cases without a cached result.
+    The caller commits.
+    
+    Returns:
+        The question's expected_outputs, or None if it has no reference
+        solution or test cases
+    """
+    if not question.reference_solution or not question.test_cases:
+        question.expected_outputs = None
+        question.reference_timings = None
+        return None
+    
+    test_cases = question.test_cases
+    key = timings_key(question.reference_solution, test_cases)
+    if question.expected_outputs and (question.reference_timings or {}).get('key') == key:
+        return question.expected_outputs
+    
+    keys = [case_key(question.reference_solution, test_case) for test_case in test_cases]
+    known = {entry['key']: entry for entry in (question.expected_outputs or {}).get('cases', [])}
+    missing = [idx for idx, case in enumerate(keys) if case not in known]
+    if missing:
+        result = execute_code(question.reference_solution, [test_cases[idx] for idx in missing])
+        for idx, test in zip(missing, result['test_results']):
+            known[keys[idx]] = _reference_entry(keys[idx], test_cases[idx], test)
+    
+    cases = [known[case] for case in keys]
+    now = datetime.utcnow().isoformat()
+    question.expected_outputs = {
+        "checksum": _hash([[entry['key'], entry['output']] for entry in cases]),
+        "cases": cases,
+        "mismatches": [idx + 1 for idx, entry in enumerate(cases) if entry.get('mismatch')],
+        "recomputed": len(missing),
+        "updated_at": now
+    }
+    question.reference_timings = {
+        "key": key,
+        "cases": [entry['seconds'] for entry in cases],
+        "measured_at": now
+    }
+    return question.expected_outputs
+
+
+def calibrate(question: Question) -> Optional[List[Optional[float]]]:
+    """
+    Return the reference solution's run time per test case, running it if needed.
+    
+    Returns:
+        Seconds per test case (None where the reference failed), or None if the
+        question has no reference solution or test cases
+    """
+    if refresh(question) is None:
+        return None
+    return question.reference_timings['cases']
+
+
+def case_timeouts(timings: List[Optional[float]]) -> List[float]:
+    """Per-case timeouts derived from reference run times."""
+    timeouts = []
+    for seconds in timings:
+        if seconds is None:
+            timeouts.append(float(CODE_TIMEOUT))
+        else:
+            timeouts.append(round(min(CODE_TIMEOUT, max(CODE_TIMEOUT_FLOOR, seconds * CODE_TIMEOUT_MULTIPLIER)), 3))
+    return timeouts
+
+
+def question_timeouts(question: Question) -> Optional[List[float]]:
+    """Per-case timeouts for a question, None to use the flat CODE_EXECUTION_TIMEOUT."""
+    timings = calibrate(question)
+    if not timings:
+        return None
+    return case_timeouts(timings)
+
+
+def question_expected_outputs(question: Question) -> Optional[List[Optional[Dict]]]:
+    """
+    Precomputed expected output per test case, None to compare with the test cases themselves.
+    
+    Entries are ``{"output": ...}``, or None for cases the reference failed on.
+    """
+    expected_outputs = refresh(question)
+    if expected_outputs is None:
+        return None
+    return [None if entry.get('error') else {"output": entry['output']} for entry in expected_outputs['cases']]
+
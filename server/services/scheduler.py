@@ -0,0 +1,32 @@
+"""Bounded parallel scheduler for code execution."""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class ExecutionScheduler:
+    """
+    Runs execution tasks on a bounded pool of threads.
+    
+    Each task blocks on a child process (a forked run, a harness batch or a
+    subprocess), so threads are enough to keep every core busy; the actual
+    process concurrency is bounded by ``max_workers``.
+    """
+    
+    def __init__(self, max_workers: int, name: str = "code-exec"):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+    
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """Apply ``fn`` to every item in parallel and return results in input order."""
+        items = list(items)
+        if self.max_workers == 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
+    
+    def shutdown(self):
+        """Stop the worker threads once queued tasks finish."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,164 @@
+"""Runs of student code requested while taking a test.
+
+Students can run their code on their own input before submitting. These runs
+never share executors with grading: they go through a separate, smaller pool
+of zygotes (started at a lower CPU priority) and a bounded queue, so a class
+pressing Run at the same time waits for its own slots instead of delaying
+grading jobs. On top of that:
+
+* every student may start ``STUDENT_RUN_RATE`` runs per minute;
+* identical code and input run once: a request for a run already in
+  progress waits for that run, and finished results are kept in memory for
+  ``STUDENT_RUN_CACHE_SIZE`` runs;
+* when ``STUDENT_RUN_QUEUE`` runs are already waiting for a slot, new runs
+  are refused until the queue drains.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from server.services.code_executor import (
+    CODE_EXECUTION_MODE, CODE_EXECUTION_WORKERS, CODE_MEMORY_LIMIT, CODE_OUTPUT_LIMIT, CODE_TIMEOUT, run_program
+)
+from server.services.zygote import ZygotePool
+
+load_dotenv()
+
+# Student programs running at the same time, on top of CODE_EXECUTION_WORKERS
+STUDENT_RUN_WORKERS = int(os.getenv("STUDENT_RUN_WORKERS", max(1, CODE_EXECUTION_WORKERS // 2)))
+# Runs waiting for a slot before new ones are refused
+STUDENT_RUN_QUEUE = int(os.getenv("STUDENT_RUN_QUEUE", 200))
+# Runs each student may start per minute
+STUDENT_RUN_RATE = int(os.getenv("STUDENT_RUN_RATE", 10))
+STUDENT_RUN_TIMEOUT = float(os.getenv("STUDENT_RUN_TIMEOUT", CODE_TIMEOUT))  # seconds
+STUDENT_RUN_CACHE_SIZE = int(os.getenv("STUDENT_RUN_CACHE_SIZE", 1024))
+# Added to the scheduling priority of student runs (POSIX only)
+STUDENT_RUN_NICENESS = int(os.getenv("STUDENT_RUN_NICENESS", 10))
+
+MAX_RUN_CODE_BYTES = 64 * 1024
+MAX_RUN_INPUT_BYTES = 64 * 1024
+
+RATE_WINDOW = 60.0  # seconds
+
+_lock = threading.Lock()
+_history = {}  # user id -> deque of run start times within the rate window
+_results = OrderedDict()  # run key -> result, most recently used last
+_inflight = {}  # run key -> Future of the run in progress
+_pending = 0  # runs started or waiting for a slot
+
+_executor = ThreadPoolExecutor(max_workers=max(1, STUDENT_RUN_WORKERS), thread_name_prefix="student-run")
+_zygote = None
+
+
+def _get_zygote() -> ZygotePool:
+    """Return the student runs' fork-server pool, creating it on first use."""
+    global _zygote
+    with _lock:
+        if _zygote is None:
+            _zygote = ZygotePool(STUDENT_RUN_WORKERS, niceness=STUDENT_RUN_NICENESS)
+        return _zygote
+
+
+def run_key(code: str, stdin: str) -> str:
+    """Hash of everything the outcome of a run depends on."""
+    material = json.dumps({
+        "code": code,
+        "stdin": stdin,
+        "timeout": STUDENT_RUN_TIMEOUT,
+        "memory_limit": CODE_MEMORY_LIMIT,
+        "output_limit": CODE_OUTPUT_LIMIT,
+        "mode": CODE_EXECUTION_MODE,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def check_rate(user_id: int) -> float:
+    """
+    Count a run request against a student's rate limit.
+    
+    Returns:
+        0 if the run may go ahead, else seconds until the student may run again
+    """
+    now = time.monotonic()
+    with _lock:
+        history = _history.setdefault(user_id, deque())
+        while history and history[0] <= now - RATE_WINDOW:
+            history.popleft()
+        if len(history) >= STUDENT_RUN_RATE:
+            return round(history[0] + RATE_WINDOW - now, 1) or 0.1
+        history.append(now)
+        if len(_history) > 10000:
+            # Forget students who have not run anything within the window
+            for key in [key for key, times in _history.items() if not times]:
+                del _history[key]
+        return 0.0
+
+
+def _execute(code: str, stdin: str) -> Dict:
+    result = run_program(code, stdin, STUDENT_RUN_TIMEOUT, zygote=_get_zygote())
+    return {field: result[field] for field in ("success", "output", "error", "execution_time")}
+
+
+def _finish(key: str, result: Optional[Dict]):
+    """Release a run's queue slot, keeping its result if it produced one."""
+    global _pending
+    with _lock:
+        if result is not None:
+            _results[key] = result
+            while len(_results) > STUDENT_RUN_CACHE_SIZE:
+                _results.popitem(last=False)
+        _inflight.pop(key, None)
+        _pending -= 1
+
+
+def run(code: str, stdin: str = "") -> Tuple[Optional[Dict], bool]:
+    """
+    Run a student's code on their input, reusing identical runs.
+    
+    Blocks until the run finishes. A run that fails to execute (e.g. no
+    executor could be started) gives every request sharing it an error
+    result, which is not cached.
+    
+    Returns:
+        Tuple of (result, cached): the execution result with success, output,
+        error and execution_time, or None if too many runs are queued; and
+        whether it was shared with an identical earlier or concurrent run
+    """
+    global _pending
+    key = run_key(code, stdin)
+    with _lock:
+        result = _results.get(key)
+        if result is not None:
+            _results.move_to_end(key)
+            return result, True
+        future = _inflight.get(key)
+        if future is None:
+            if _pending >= STUDENT_RUN_WORKERS + STUDENT_RUN_QUEUE:
+                return None, False
+            _pending += 1
+            future = Future()
+            _inflight[key] = future
+            owner = True
+        else:
+            owner = False
+    
+    if not owner:
+        # The same code and input are already running for someone
+        return future.result(), True
+    
+    try:
+        result = _executor.submit(_execute, code, stdin).result()
+    except Exception as e:
+        result = {"success": False, "output": "", "error": f"Run failed: {str(e)}", "execution_time": 0.0}
+        _finish(key, None)
+        future.set_result(result)
+        return result, False
+    _finish(key, result)
+    future.set_result(result)
+    return result, False
@@ -0,0 +1,79 @@
+"""Running score totals of submissions.
+
+Every submission keeps the sum of its answers' scores (``total_score``), the
+number of scored answers (``graded_count``) and the points its test is worth
+(``max_score``). Whatever scores an answer goes through ``set_score``, which
+adjusts the totals with a single relative UPDATE, so concurrent graders never
+overwrite each other's changes and provisional scores, grading progress and
+finalizing need no pass over the answers. ``recompute`` rebuilds the totals
+from scratch after a test's questions or points change, or after many
+answers are scored in one statement.
+"""
+
+from typing import Iterable, Optional
+from sqlalchemy import and_, func, select, update
+from server.database import db_session
+from server.models import Answer, Question, Submission, TestQuestion
+
+
+def set_score(answer: Answer, score: Optional[float]):
+    """
+    Change an answer's score and its submission's totals. The caller commits.
+    
+    Like ``recompute``, the totals only count answers to questions that are
+    part of the submission's test.
+    """
+    old = answer.score
+    answer.score = score
+    
+    delta_score = (score or 0.0) - (old or 0.0)
+    delta_count = (score is not None) - (old is not None)
+    if not delta_score and not delta_count:
+        return
+    in_test = select(TestQuestion.id).where(
+        TestQuestion.test_id == Submission.test_id,
+        TestQuestion.question_id == answer.question_id
+    ).exists()
+    db_session.query(Submission).filter(Submission.id == answer.submission_id, in_test).update({
+        Submission.total_score: func.coalesce(Submission.total_score, 0.0) + delta_score,
+        Submission.graded_count: func.coalesce(Submission.graded_count, 0) + delta_count
+    }, synchronize_session=False)
+    
+    submission = db_session.identity_map.get(db_session.identity_key(Submission, answer.submission_id))
+    if submission is not None:
+        # Read the new totals back on next access
+        db_session.expire(submission, ["total_score", "graded_count"])
+
+
+def test_max_score(test_id):
+    """Points a test is worth, as a scalar SQL expression."""
+    return select(
+        func.coalesce(func.sum(func.coalesce(TestQuestion.points, Question.points)), 0.0)
+    ).join(
+        Question, Question.id == TestQuestion.question_id
+    ).where(TestQuestion.test_id == test_id).scalar_subquery()
+
+
+def recompute_statement(test_id: Optional[int] = None, submission_ids: Optional[Iterable[int]] = None):
+    """UPDATE statement rebuilding the totals of a test's submissions, of the given ones, or of all."""
+    scored = and_(
+        Answer.submission_id == Submission.id,
+        TestQuestion.test_id == Submission.test_id,
+        TestQuestion.question_id == Answer.question_id
+    )
+    statement = update(Submission).values(
+        total_score=select(func.coalesce(func.sum(Answer.score), 0.0)).where(scored).scalar_subquery(),
+        graded_count=select(func.count(Answer.score)).where(scored).scalar_subquery(),
+        max_score=test_max_score(Submission.test_id)
+    )
+    if test_id is not None:
+        statement = statement.where(Submission.test_id == test_id)
+    if submission_ids is not None:
+        statement = statement.where(Submission.id.in_(list(submission_ids)))
+    return statement
+
+
+def recompute(test_id: Optional[int] = None, submission_ids: Optional[Iterable[int]] = None):
+    """Rebuild the totals of a test's submissions, of the given ones, or of all. The caller commits."""
+    db_session.execute(recompute_statement(test_id, submission_ids).execution_options(synchronize_session=False))
+    db_session.expire_all()
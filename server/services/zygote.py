@@ -0,0 +1,590 @@
+"""Fork-server ("zygote") for running student code.
+
+The zygote is a long-lived interpreter that imports the standard library
+modules students commonly use once, then forks an isolated child for every
+run request. Forking a warm interpreter costs around a millisecond, compared
+with tens of milliseconds for starting a fresh ``sys.executable``.
+
+This module must only depend on the standard library and the harness: it is started as
+``python -m server.services.zygote`` and its memory image is inherited by
+every child that runs student code.
+"""
+
+import builtins
+import json
+import math
+import os
+import queue
+import select
+import selectors
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from server.services import harness
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Modules imported once in the zygote so forked children get them for free
+PRELOAD_MODULES = (
+    "math", "random", "string", "re", "json", "collections", "itertools",
+    "functools", "operator", "heapq", "bisect", "statistics", "decimal",
+    "fractions", "datetime", "copy", "typing", "dataclasses", "io",
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_HEADER = struct.Struct(">I")
+_READ_CHUNK = 65536
+
+
+# Framing helpers
+
+def _read_exact(fd: int, size: int) -> Optional[bytes]:
+    """Read exactly ``size`` bytes from ``fd``, or None on EOF."""
+    chunks = []
+    while size:
+        chunk = os.read(fd, size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(fd: int) -> Optional[Dict]:
+    """Read one length-prefixed JSON message from ``fd``."""
+    header = _read_exact(fd, _HEADER.size)
+    if header is None:
+        return None
+    payload = _read_exact(fd, _HEADER.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+
+def write_message(fd: int, message: Dict):
+    """Write one length-prefixed JSON message to ``fd``."""
+    payload = json.dumps(message).encode("utf-8")
+    data = memoryview(_HEADER.pack(len(payload)) + payload)
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+# Zygote side
+
+def communicate(pid: int, stdin_fd: int, outputs: Dict[str, int], data: bytes,
+                timeout: float, output_limits: Optional[Dict[str, int]] = None) -> Dict:
+    """
+    Feed ``data`` to a child's stdin and collect its output pipes.
+    
+    The child (and its process group) is killed if it has not closed its
+    output pipes within ``timeout`` seconds, or as soon as an output grows past
+    its limit. Output is read as it is produced, so memory use is bounded by
+    the limits. All fds are closed.
+    
+    Args:
+        pid: Child process id
+        stdin_fd: Write end of the child's stdin pipe
+        outputs: Read ends of the child's output pipes, by name
+        data: Bytes to write to the child's stdin
+        timeout: Wall-clock limit in seconds
+        output_limits: Maximum bytes kept per output, by name; missing or 0 for none
+    
+    Returns:
+        Dictionary with returncode, timed_out, output_limit_exceeded,
+        wall_time, cpu_time, peak_memory_mb and the decoded text of each
+        output (truncated at its limit)
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    selector = selectors.DefaultSelector()
+    chunks = {fd: [] for fd in outputs.values()}
+    sizes = {fd: 0 for fd in outputs.values()}
+    limits = {fd: (output_limits or {}).get(name, 0) for name, fd in outputs.items()}
+    pending = memoryview(data)
+    
+    if pending:
+        os.set_blocking(stdin_fd, False)
+        selector.register(stdin_fd, selectors.EVENT_WRITE)
+    else:
+        os.close(stdin_fd)
+    for fd in outputs.values():
+        selector.register(fd, selectors.EVENT_READ)
+    
+    timed_out = False
+    output_limit_exceeded = False
+    while selector.get_map() and not output_limit_exceeded:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in selector.select(remaining):
+            fd = key.fd
+            if fd == stdin_fd:
+                try:
+                    written = os.write(fd, pending[:select.PIPE_BUF])
+                    pending = pending[written:]
+                except BlockingIOError:
+                    continue
+                except BrokenPipeError:
+                    # The child exited without reading all of its input
+                    pending = pending[:0]
+                if not pending:
+                    selector.unregister(fd)
+                    os.close(fd)
+                continue
+            chunk = os.read(fd, _READ_CHUNK)
+            if not chunk:
+                selector.unregister(fd)
+                os.close(fd)
+                continue
+            limit = limits[fd]
+            if limit and sizes[fd] + len(chunk) > limit:
+                chunk = chunk[:limit - sizes[fd]]
+                output_limit_exceeded = True
+            chunks[fd].append(chunk)
+            sizes[fd] += len(chunk)
+            if output_limit_exceeded:
+                break
+    
+    if timed_out or output_limit_exceeded:
+        _kill_group(pid)
+        for key in list(selector.get_map().values()):
+            os.close(key.fd)
+    selector.close()
+    
+    _, status, usage = os.wait4(pid, 0)
+    result = {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "output_limit_exceeded": output_limit_exceeded,
+        "wall_time": round(time.monotonic() - started, 6),
+        "cpu_time": round(usage.ru_utime + usage.ru_stime, 6),
+        "peak_memory_mb": maxrss_mb(usage.ru_maxrss),
+    }
+    for name, fd in outputs.items():
+        result[name] = b"".join(chunks[fd]).decode("utf-8", errors="replace")
+    return result
+
+
+def maxrss_mb(maxrss: int) -> float:
+    """Convert ``ru_maxrss`` to megabytes (it is KB on Linux, bytes on macOS)."""
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(maxrss / divisor, 2)
+
+
+def _set_limit(limit: int, soft: int, hard: int):
+    """Lower a resource limit, never above the existing hard limit."""
+    _, current_hard = resource.getrlimit(limit)
+    if current_hard != resource.RLIM_INFINITY:
+        soft = min(soft, current_hard)
+        hard = min(hard, current_hard)
+    resource.setrlimit(limit, (soft, hard))
+
+
+def apply_limits(cpu_seconds: float, memory_mb: int):
+    """
+    Set kernel-enforced limits on the current process before running student code.
+    
+    The CPU limit delivers SIGXCPU at ``cpu_seconds`` and SIGKILL a second
+    later; the address-space limit makes allocations beyond ``memory_mb``
+    raise MemoryError. Core dumps are disabled.
+    """
+    if resource is None:
+        return
+    
+    cpu = max(1, math.ceil(cpu_seconds))
+    _set_limit(resource.RLIMIT_CPU, cpu, cpu + 1)
+    if memory_mb:
+        memory_bytes = int(memory_mb) * 1024 * 1024
+        _set_limit(resource.RLIMIT_AS, memory_bytes, memory_bytes)
+    _set_limit(resource.RLIMIT_CORE, 0, 0)
+
+
+def _kill_group(pid: int):
+    """Kill a child and anything it spawned."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _exec_child(code: str, bytecode: Optional[str] = None):
+    """Run student code as ``__main__`` in a freshly forked child. Never returns."""
+    status = 0
+    try:
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+        sys.argv = ["<string>"]
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        if "random" in sys.modules:
+            # Children would otherwise share the zygote's PRNG state
+            sys.modules["random"].seed()
+        
+        try:
+            exec(harness.load_code(code, bytecode), {"__name__": "__main__", "__builtins__": builtins})
+        except SystemExit as e:
+            status = harness.exit_status(e.code)
+        except BaseException:
+            etype, value, tb = sys.exc_info()
+            # Drop this frame so the traceback matches a plain interpreter run
+            traceback.print_exception(etype, value, tb.tb_next)
+            status = 1
+        
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+    finally:
+        os._exit(status)
+
+
+def _report_case(code_obj, test_case: Dict, timeout: float, output_limit: int):
+    """Run one test case and write its result to fd 3, then exit. Never returns."""
+    status = 0
+    try:
+        result = harness.run_single_case(code_obj, test_case, timeout, output_limit)
+        with open(3, "w", closefd=False) as result_pipe:
+            json.dump(result, result_pipe)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def case_result(reported, run: Dict) -> Dict:
+    """
+    Combine what a test case's process reported with what was measured from outside.
+    
+    The report comes from the process that ran student code, so only what
+    the code could have produced by itself is taken from it (output, return
+    value, exit code). Time, CPU and memory are measured by the parent, and
+    a case killed by a limit counts as killed whatever it reported.
+    """
+    reported = reported if isinstance(reported, dict) else {}
+    returncode = reported.get("returncode", 1)
+    if run["timed_out"] or run["output_limit_exceeded"] or run["returncode"] != 0 or \
+            not reported or not isinstance(returncode, (int, type(None))) or isinstance(returncode, bool):
+        # Killed, crashed or exited before reporting: nothing it said can be used
+        return {
+            "returncode": None if run["timed_out"] else (run["returncode"] or 1),
+            "stdout": "", "stderr": run.get("stderr") or "Exited before finishing the test case",
+            "timed_out": run["timed_out"], "output_limit_exceeded": run["output_limit_exceeded"],
+            "wall_time": run["wall_time"], "cpu_time": run["cpu_time"], "peak_memory_mb": run["peak_memory_mb"],
+            "return_value": None, "load_failed": bool(reported.get("load_failed"))
+        }
+    result = {
+        "returncode": returncode,
+        "stdout": str(reported.get("stdout", "")),
+        "stderr": str(reported.get("stderr", "")),
+        "timed_out": bool(reported.get("timed_out")),
+        "output_limit_exceeded": bool(reported.get("output_limit_exceeded")),
+        "wall_time": run["wall_time"],
+        "cpu_time": run["cpu_time"],
+        "peak_memory_mb": run["peak_memory_mb"],
+        "load_failed": bool(reported.get("load_failed"))
+    }
+    if "return_value" in reported:
+        result["return_value"] = reported["return_value"]
+    return result
+
+
+def _run_isolated_case(code_obj, test_case: Dict, timeout: float, output_limit: int) -> Dict:
+    """
+    Run one test case of a batch in a child of the batch process.
+    
+    The child gets its own result pipe as fd 3, replacing the batch's, and
+    no other descriptors besides stdio, so the student code it runs cannot
+    reach the pipe the batch reports on.
+    """
+    stdin_r, stdin_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    result_r, result_w = os.pipe()
+    # Function cases load the module first, which has the default timeout
+    budget = harness.case_timeout(test_case, timeout) + (timeout if harness.is_function_case(test_case) else 0) + 1
+    
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # Stays in the batch's process group, so killing the batch kills it too
+            os.dup2(stdin_r, 0)
+            os.dup2(stderr_w, 2)
+            os.dup2(result_w, 3)
+            os.closerange(4, os.sysconf("SC_OPEN_MAX"))
+            _report_case(code_obj, test_case, timeout, output_limit)
+        finally:
+            os._exit(1)
+    
+    os.close(stdin_r)
+    os.close(stderr_w)
+    os.close(result_w)
+    # Output and return value are capped by the harness; this bounds the report as a whole
+    report_limit = 4 * output_limit + 65536 if output_limit else 0
+    run = communicate(pid, stdin_w, {"result": result_r, "stderr": stderr_r}, b"", budget,
+                      {"result": report_limit, "stderr": output_limit})
+    try:
+        reported = json.loads(run.pop("result")) if run["returncode"] == 0 else None
+    except ValueError:
+        reported = None
+    return case_result(reported, run)
+
+
+def _run_batch(request: Dict):
+    """Run the harness for every test case, each in its own child, and write the results to fd 3. Never returns."""
+    status = 0
+    try:
+        results = harness.run_cases(
+            request.get("code", ""),
+            request.get("test_cases", []),
+            float(request.get("timeout", 5)),
+            int(request.get("output_limit", 0)),
+            request.get("policy"),
+            request.get("bytecode"),
+            runner=_run_isolated_case
+        )
+        with open(3, "w", closefd=False) as result_pipe:
+            json.dump(results, result_pipe)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def _run(request: Dict) -> Dict:
+    """Fork a child for one request and wait for it."""
+    batch = request.get("op") == "batch"
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    result_r, result_w = os.pipe() if batch else (None, None)
+    timeout = float(request.get("timeout", 5))
+    if batch:
+        # Per-case timeouts are enforced inside the harness; this is the backstop
+        timeout = harness.batch_budget(request.get("test_cases", []), timeout)
+    
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setpgid(0, 0)
+            apply_limits(timeout, request.get("memory_limit", 0))
+            os.dup2(stdin_r, 0)
+            os.dup2(stdout_w, 1)
+            os.dup2(stderr_w, 2)
+            if batch:
+                os.dup2(result_w, 3)
+            # Drops the protocol pipes so student code cannot talk to the server
+            os.closerange(4 if batch else 3, os.sysconf("SC_OPEN_MAX"))
+            if batch:
+                _run_batch(request)
+            _exec_child(request.get("code", ""), request.get("bytecode"))
+        finally:
+            os._exit(1)
+    
+    os.close(stdin_r)
+    os.close(stdout_w)
+    os.close(stderr_w)
+    outputs = {"stdout": stdout_r, "stderr": stderr_r}
+    if batch:
+        os.close(result_w)
+        outputs["result"] = result_r
+    
+    # Only student output is capped; the harness caps each case's output itself
+    output_limit = int(request.get("output_limit", 0))
+    output_limits = {"stdout": output_limit, "stderr": output_limit}
+    run = communicate(pid, stdin_w, outputs, request.get("stdin", "").encode("utf-8"), timeout, output_limits)
+    if batch:
+        run["results"] = json.loads(run.pop("result")) if run["result"] else None
+    return run
+
+
+def serve(niceness: int = 0):
+    """Zygote main loop: answer run requests read from stdin on stdout."""
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    
+    if niceness and hasattr(os, "nice"):
+        # Inherited by every child, so their runs yield the CPU to other zygotes' children
+        os.nice(niceness)
+    
+    # Keep the protocol pipes away from fds 0/1 so stray output can't corrupt them
+    request_fd = os.dup(0)
+    response_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    os.chdir(tempfile.gettempdir())
+    # Ctrl+C on the server reaches the whole process group; the server closes us instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    while True:
+        request = read_message(request_fd)
+        if request is None:
+            break
+        try:
+            response = _run(request)
+        except Exception as e:
+            response = {"error": f"Zygote error: {str(e)}"}
+        write_message(response_fd, response)
+
+
+# Server side
+
+class Zygote:
+    """
+    Handle on a fork-server process. Safe to share between threads.
+    
+    ``niceness`` is added to the scheduling priority of the zygote and its
+    children (POSIX only).
+    """
+    
+    def __init__(self, niceness: int = 0):
+        self.niceness = niceness
+        self._process = None
+        self._lock = threading.Lock()
+    
+    def _start(self):
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "server.services.zygote"] + ([str(self.niceness)] if self.niceness else []),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=PROJECT_ROOT
+        )
+    
+    def _request(self, message: Dict) -> Optional[Dict]:
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+        try:
+            write_message(self._process.stdin.fileno(), message)
+            return read_message(self._process.stdout.fileno())
+        except (BrokenPipeError, OSError):
+            return None
+    
+    def run(self, code: str, stdin: str = "", timeout: float = 5, memory_limit: int = 0,
+            output_limit: int = 0, bytecode: Optional[str] = None) -> Dict:
+        """
+        Run code as ``__main__`` in a forked child.
+        
+        Args:
+            code: Python source to run
+            bytecode: Optional precompiled ``code`` (see ``harness.dump_code``);
+                the child then skips compiling
+            stdin: Text fed to the child's stdin
+            timeout: Wall-clock (and CPU-time) limit in seconds
+            memory_limit: Address-space limit in MB, 0 for none
+            output_limit: Maximum bytes of stdout and of stderr, 0 for none
+        
+        Returns:
+            Dictionary with returncode, stdout, stderr, timed_out,
+            output_limit_exceeded, wall_time, cpu_time and peak_memory_mb
+        """
+        return self._call({
+            "op": "run", "code": code, "bytecode": bytecode, "stdin": stdin, "timeout": timeout,
+            "memory_limit": memory_limit, "output_limit": output_limit
+        })
+    
+    def run_batch(self, code: str, test_cases: List[Dict], timeout: float = 5, memory_limit: int = 0,
+                  output_limit: int = 0, policy: Optional[Dict] = None, bytecode: Optional[str] = None) -> Dict:
+        """
+        Run code against every test case in one forked harness child.
+        
+        ``policy`` is an optional grading policy (see ``harness.EarlyExit``)
+        and ``bytecode`` the optionally precompiled code (see ``run``).
+        
+        Returns:
+            Same as ``run`` plus ``results``, the per-case harness results
+            (None if the harness did not finish)
+        """
+        return self._call({
+            "op": "batch", "code": code, "bytecode": bytecode, "test_cases": test_cases, "timeout": timeout,
+            "memory_limit": memory_limit, "output_limit": output_limit, "policy": policy
+        })
+    
+    def _call(self, message: Dict) -> Dict:
+        with self._lock:
+            response = self._request(message)
+            if response is None:
+                # The zygote died; start a new one and retry once
+                self.close()
+                response = self._request(message)
+        if response is None:
+            raise RuntimeError("Fork server is not responding")
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+    
+    def close(self):
+        """Stop the zygote process."""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=1)
+        except Exception:
+            process.kill()
+        process.stdout.close()
+
+
+class ZygotePool:
+    """
+    Fixed-size pool of zygotes so several children can run at once.
+    
+    Each zygote runs one child at a time, so ``size`` bounds the number of
+    concurrent runs. Zygotes are started lazily on first use.
+    """
+    
+    def __init__(self, size: int, niceness: int = 0):
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        for _ in range(self.size):
+            self._idle.put(Zygote(niceness))
+    
+    def _checkout(self, method: str, *args, **kwargs) -> Dict:
+        zygote = self._idle.get()
+        try:
+            return getattr(zygote, method)(*args, **kwargs)
+        finally:
+            self._idle.put(zygote)
+    
+    def run(self, code: str, stdin: str = "", timeout: float = 5, memory_limit: int = 0,
+            output_limit: int = 0, bytecode: Optional[str] = None) -> Dict:
+        """Run code in a child of the next idle zygote. See ``Zygote.run``."""
+        return self._checkout("run", code, stdin=stdin, timeout=timeout,
+                              memory_limit=memory_limit, output_limit=output_limit, bytecode=bytecode)
+    
+    def run_batch(self, code: str, test_cases: List[Dict], timeout: float = 5, memory_limit: int = 0,
+                  output_limit: int = 0, policy: Optional[Dict] = None, bytecode: Optional[str] = None) -> Dict:
+        """Run the harness in a child of the next idle zygote. See ``Zygote.run_batch``."""
+        return self._checkout("run_batch", code, test_cases, timeout=timeout, memory_limit=memory_limit,
+                              output_limit=output_limit, policy=policy, bytecode=bytecode)
+    
+    def close(self):
+        """Stop every zygote in the pool, waiting for runs in progress."""
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
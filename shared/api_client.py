@@ -5,6 +5,14 @@ from typing import Optional, Dict, Any
 from shared.constants import API_BASE
 
 
+class APIError(Exception):
+    """A failed API request; ``status_code`` is the HTTP status, None if no response arrived."""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 class APIClient:
     """Base API client for making HTTP requests to the server."""
     
@@ -39,7 +47,8 @@ class APIClient:
             return response.json() if response.content else {}
             
         except requests.exceptions.RequestException as e:
-            raise Exception(f"API request failed: {str(e)}")
+            status_code = e.response.status_code if e.response is not None else None
+            raise APIError(f"API request failed: {str(e)}", status_code)
     
     def login(self, username: str, password: str, student_id: Optional[str] = None) -> Dict:
         """Login to the system."""
@@ -23,6 +23,12 @@ SUBMISSION_STATUS_IN_PROGRESS = "in_progress"
 SUBMISSION_STATUS_SUBMITTED = "submitted"
 SUBMISSION_STATUS_GRADED = "graded"
 
+# Grading Job Status
+GRADING_JOB_STATUS_QUEUED = "queued"
+GRADING_JOB_STATUS_RUNNING = "running"
+GRADING_JOB_STATUS_DONE = "done"
+GRADING_JOB_STATUS_FAILED = "failed"
+
 # API Endpoints
 API_BASE = "/api/v1"
 API_AUTH = f"{API_BASE}/auth"
@@ -33,6 +39,7 @@ API_GRADING = f"{API_BASE}/grading"
 API_STATISTICS = f"{API_BASE}/statistics"
 API_STUDENTS = f"{API_BASE}/students"
 API_TOPICS = f"{API_BASE}/topics"
+API_WORKERS = f"{API_BASE}/workers"
 
 # Default Configuration
 DEFAULT_SERVER_HOST = "0.0.0.0"
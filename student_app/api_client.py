@@ -1,4 +1,13 @@
 """API client for student app."""
 
 from shared.api_client import APIClient
+from shared.constants import API_BASE
 
+
+class StudentAPIClient(APIClient):
+    """Extended API client for students with additional methods."""
+    
+    def run_code(self, submission_id, question_id, code, input_text=""):
+        """Run the code of an answer in progress on the given input."""
+        return self._make_request('POST', f"{API_BASE}/submissions/{submission_id}/answers/{question_id}/run",
+                                  {"code": code, "input": input_text})
@@ -2,7 +2,7 @@
 
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
 from PyQt5.QtCore import Qt
-from student_app.api_client import APIClient
+from student_app.api_client import StudentAPIClient
 from student_app.windows.dashboard import DashboardWindow
 
 
@@ -11,7 +11,7 @@ class LoginWindow(QWidget):
     
     def __init__(self):
         super().__init__()
-        self.api_client = APIClient()
+        self.api_client = StudentAPIClient()
         self.init_ui()
     
     def init_ui(self):
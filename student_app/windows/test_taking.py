@@ -3,9 +3,36 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
                              QScrollArea, QWidget, QFrame, QTextEdit, QRadioButton, 
                              QButtonGroup, QMessageBox, QGroupBox)
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QPainter, QPen, QColor
 import json
+from shared.api_client import APIError
+from student_app.api_client import StudentAPIClient
+
+
+class CodeRunner(QThread):
+    """Runs the code of a question on the server in the background."""
+    
+    ran = pyqtSignal(dict)
+    failed = pyqtSignal(str, int)  # Error and HTTP status, 0 if no response arrived
+    
+    def __init__(self, api_client, submission_id, question_id, code, input_text):
+        super().__init__()
+        # A separate HTTP session, so the window's own requests never share it with this thread
+        self.api_client = StudentAPIClient(api_client.base_url)
+        self.api_client.session.cookies.update(api_client.session.cookies)
+        self.submission_id = submission_id
+        self.question_id = question_id
+        self.code = code
+        self.input_text = input_text
+    
+    def run(self):
+        try:
+            self.ran.emit(self.api_client.run_code(self.submission_id, self.question_id, self.code, self.input_text))
+        except APIError as e:
+            self.failed.emit(str(e), e.status_code or 0)
+        except Exception as e:
+            self.failed.emit(str(e), 0)
 
 
 class TestTakingWindow(QDialog):
@@ -21,6 +48,7 @@ class TestTakingWindow(QDialog):
         self.answers = {}
         self.timer = None
         self.time_remaining = None
+        self.runners = {}  # Code runs in progress, by question id
         self.init_ui()
         self.load_test()
     
@@ -208,8 +236,7 @@ class TestTakingWindow(QDialog):
         saved_answer = self.answers.get(question_id, {})
         
         if question_type == 'multiple_choice':
-            # Parse choices from content (simplified - in real app, store choices separately)
-            choices = ['Option A', 'Option B', 'Option C', 'Option D']  # Placeholder
+            choices = question.get('choices') or []
             group = QButtonGroup()
             widget = QWidget()
             layout = QVBoxLayout()
@@ -225,12 +252,34 @@ class TestTakingWindow(QDialog):
             return widget
             
         elif question_type == 'code':
+            widget = QWidget()
+            layout = QVBoxLayout()
+            
             text_edit = QTextEdit()
             text_edit.setPlaceholderText("Write your code here...")
             if saved_answer.get('code'):
                 text_edit.setPlainText(saved_answer['code'])
             text_edit.setMinimumHeight(300)
-            return text_edit
+            layout.addWidget(text_edit)
+            
+            input_edit = QTextEdit()
+            input_edit.setPlaceholderText("Input for your program (standard input)...")
+            input_edit.setMaximumHeight(80)
+            layout.addWidget(input_edit)
+            
+            run_btn = QPushButton("Run")
+            output_view = QTextEdit()
+            output_view.setReadOnly(True)
+            output_view.setMaximumHeight(150)
+            output_view.setVisible(False)
+            run_btn.clicked.connect(
+                lambda: self.run_code(question_id, text_edit, input_edit, output_view, run_btn)
+            )
+            layout.addWidget(run_btn)
+            layout.addWidget(output_view)
+            
+            widget.setLayout(layout)
+            return widget
             
         elif question_type == 'text':
             text_edit = QTextEdit()
@@ -245,6 +294,46 @@ class TestTakingWindow(QDialog):
             label.setStyleSheet("color: #666; padding: 20px; border: 1px dashed #ddd;")
             return label
     
+    def run_code(self, question_id, code_edit, input_edit, output_view, run_btn):
+        """Run the code of a question on the entered input in the background and show its output."""
+        if not self.submission_id or question_id in self.runners:
+            return
+        
+        run_btn.setEnabled(False)
+        output_view.setVisible(True)
+        output_view.setPlainText("Running...")
+        
+        runner = CodeRunner(self.api_client, self.submission_id, question_id,
+                            code_edit.toPlainText(), input_edit.toPlainText())
+        runner.ran.connect(lambda result: self.on_code_ran(question_id, result, output_view, run_btn))
+        runner.failed.connect(
+            lambda error, status: self.on_code_failed(question_id, error, status, output_view, run_btn)
+        )
+        self.runners[question_id] = runner
+        runner.start()
+    
+    def on_code_ran(self, question_id, result, output_view, run_btn):
+        """Show the output of a finished run."""
+        self.runners.pop(question_id, None)
+        text = result.get('output', '')
+        if result.get('error'):
+            text += ("\n" if text else "") + result['error']
+        status = "Finished" if result.get('success') else "Failed"
+        text += f"\n[{status} in {result.get('execution_time', 0):.2f}s]"
+        output_view.setPlainText(text)
+        run_btn.setEnabled(True)
+    
+    def on_code_failed(self, question_id, error, status, output_view, run_btn):
+        """Explain why a run could not be made."""
+        self.runners.pop(question_id, None)
+        if status == 429:
+            output_view.setPlainText("Run limit reached. Please wait a moment before running again.")
+        elif status == 503:
+            output_view.setPlainText("The server is busy. Please try again shortly.")
+        else:
+            output_view.setPlainText(f"Could not run the code: {error}")
+        run_btn.setEnabled(True)
+    
     def show_question(self, index):
         """Show a specific question."""
         for i in range(self.questions_layout.count()):
@@ -342,4 +431,10 @@ class TestTakingWindow(QDialog):
                 self.accept()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to submit test: {str(e)}")
+    
+    def done(self, result):
+        """Wait for code runs in progress before closing."""
+        for runner in list(self.runners.values()):
+            runner.wait()
+        super().done(result)
 
@@ -0,0 +1,131 @@
+"""Shared fixtures: a throwaway database, factories for test data and cleanup of the code executors."""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Configure the server before anything imports it
+_db_dir = tempfile.mkdtemp(prefix="assessment-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_db_dir, "test.db")
+os.environ["CODE_EXECUTION_TIMEOUT"] = "2"  # keeps tests of looping answers short
+os.environ["GRADING_WORKERS"] = "0"
+os.environ.setdefault("CODE_EXECUTION_WORKERS", "2")
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import bcrypt
+import pytest
+from server.app import app
+from server.database import db_session, engine
+from server.models import Base, User, Topic, Question, Test, TestQuestion, Submission, Answer
+from shared.constants import ROLE_LECTURER, ROLE_STUDENT, QUESTION_TYPE_CODE, SUBMISSION_STATUS_SUBMITTED
+
+PASSWORD = "secret"
+_password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(4)).decode('utf-8')
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """Fresh tables for every test."""
+    from server.services import answer_key
+    answer_key.invalidate()  # keys are cached by test id, which the new tables reuse
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    db_session.remove()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def executors():
+    """Stop the zygotes started by the tests."""
+    yield
+    from server.services import code_executor, student_runs
+    for zygote in (code_executor._zygote, student_runs._zygote):
+        if zygote is not None:
+            zygote.close()
+
+
+@pytest.fixture
+def make_user():
+    """Create a user; usernames are numbered to stay unique."""
+    created = []
+    
+    def make(role=ROLE_STUDENT):
+        name = f"{role}{len(created) + 1}"
+        user = User(username=name, password_hash=_password_hash, role=role,
+                    student_id=name if role == ROLE_STUDENT else None)
+        db_session.add(user)
+        db_session.commit()
+        created.append(user)
+        return user
+    
+    return make
+
+
+@pytest.fixture
+def login():
+    """Return a test client logged in as the given user."""
+    def make(user):
+        client = app.test_client()
+        response = client.post('/api/v1/auth/login', json={"username": user.username, "password": PASSWORD})
+        assert response.status_code == 200, response.json
+        return client
+    
+    return make
+
+
+@pytest.fixture
+def lecturer(make_user, login):
+    """Lecturer user and a test client logged in as them."""
+    user = make_user(ROLE_LECTURER)
+    return user, login(user)
+
+
+@pytest.fixture
+def make_test():
+    """
+    Create a test from question specifications, returning the test and its questions.
+    
+    Each specification is a dict of Question columns (``type`` defaults to
+    code) plus an optional ``test_points`` overriding the points in the test.
+    """
+    def make(*questions):
+        topic = Topic(name=f"Topic {db_session.query(Topic).count() + 1}")
+        test = Test(name="Test")
+        db_session.add_all([topic, test])
+        db_session.flush()
+        created = []
+        for order, spec in enumerate(questions):
+            spec = dict(spec)
+            test_points = spec.pop('test_points', None)
+            spec.setdefault('type', QUESTION_TYPE_CODE)
+            spec.setdefault('content', f"Question {order + 1}")
+            question = Question(topic_id=topic.id, **spec)
+            db_session.add(question)
+            db_session.flush()
+            created.append(question)
+            db_session.add(TestQuestion(test_id=test.id, question_id=question.id, order=order, points=test_points))
+        db_session.commit()
+        return test, created
+    
+    return make
+
+
+@pytest.fixture
+def make_submission():
+    """Create a submission with answers, given as {question: answer columns}."""
+    def make(test, user, answers, status=SUBMISSION_STATUS_SUBMITTED):
+        from sqlalchemy import select
+        from server.services.submission_totals import test_max_score
+        submission = Submission(
+            test_id=test.id, user_id=user.id, status=status,
+            max_score=db_session.execute(select(test_max_score(test.id))).scalar()
+        )
+        db_session.add(submission)
+        db_session.flush()
+        for question, fields in answers.items():
+            db_session.add(Answer(submission_id=submission.id, question_id=question.id, **fields))
+        db_session.commit()
+        return submission
+    
+    return make
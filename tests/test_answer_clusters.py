@@ -0,0 +1,113 @@
+"""Clusters of equivalent answers and grading a cluster at once."""
+
+import pytest
+from server.database import db_session
+from server.models import Submission
+from server.services import answer_clusters
+from shared.constants import QUESTION_TYPE_TEXT
+
+ESSAY = "The mitochondria is the powerhouse of the cell and produces most of its energy"
+
+
+@pytest.fixture
+def answered(make_test, make_user, make_submission):
+    """Answers to a question worth 4 points; returns the clusters URL and the answer ids in order."""
+    def make(*answers, question_type=QUESTION_TYPE_TEXT):
+        test, (question,) = make_test({"type": question_type, "points": 4})
+        answer_ids = []
+        for fields in answers:
+            submission = make_submission(test, make_user(), {question: fields})
+            answer_ids.append(submission.answers[0].id)
+        return f"/api/v1/grading/tests/{test.id}/questions/{question.id}/clusters", answer_ids
+    
+    return make
+
+
+def test_code_differing_only_in_whitespace_clusters(lecturer, answered):
+    _, client = lecturer
+    url, (spaced, tight, different) = answered(
+        {"code": "x = int(input())\nprint(x*x)  \n\n"},
+        {"code": "x=int( input() )\r\nprint( x * x )"},
+        {"code": "x = int(input())\nprint(x+x)"}
+    )
+    
+    clusters = client.get(url).json['clusters']
+    
+    assert [cluster['answer_ids'] for cluster in clusters] == [[spaced, tight], [different]]
+
+
+def test_indentation_keeps_code_apart():
+    nested = answer_clusters.normalize_source("if x:\n    a()\n    b()\n")
+    flat = answer_clusters.normalize_source("if x:\n    a()\nb()\n")
+    
+    assert nested != flat
+
+
+def test_text_ignores_case_and_whitespace(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered({"answer_text": "Binary  Search"}, {"answer_text": "binary search\n"})
+    
+    (cluster,) = client.get(url).json['clusters']
+    
+    assert cluster['answer_ids'] == answer_ids
+
+
+def test_near_duplicates_merge_only_when_asked(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered(
+        {"answer_text": ESSAY},
+        {"answer_text": ESSAY + " today"},
+        {"answer_text": "Ribosomes build proteins from amino acids carried by transfer RNA molecules"}
+    )
+    
+    assert len(client.get(url).json['clusters']) == 3
+    clusters = client.get(url, query_string={"near": 1}).json['clusters']
+    
+    assert [cluster['answer_ids'] for cluster in clusters] == [answer_ids[:2], answer_ids[2:]]
+
+
+def test_answers_without_words_group_only_when_identical(lecturer, answered):
+    _, client = lecturer
+    url, (question_mark, other_question_mark, dash) = answered(
+        {"answer_text": "?"}, {"answer_text": " ? "}, {"answer_text": "-"}
+    )
+    
+    assert answer_clusters.shingles("?!") == set()
+    clusters = client.get(url, query_string={"near": 1}).json['clusters']
+    
+    assert [cluster['answer_ids'] for cluster in clusters] == [[question_mark, other_question_mark], [dash]]
+
+
+def test_grading_a_cluster_scores_every_answer(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered({"answer_text": "O(log n)"}, {"answer_text": "o(LOG n)"}, {"answer_text": "O(n)"})
+    (cluster, _) = client.get(url).json['clusters']
+    
+    response = client.put(url, json={"answer_ids": cluster['answer_ids'], "score": 4, "feedback": "Right"})
+    
+    assert response.status_code == 200, response.json
+    assert response.json['graded'] == 2
+    clusters = client.get(url).json['clusters']
+    assert [(cluster['graded'], cluster['scores']) for cluster in clusters] == [(2, [4.0]), (0, [])]
+    db_session.expire_all()
+    assert sorted(submission.total_score for submission in db_session.query(Submission)) == [0.0, 4.0, 4.0]
+
+
+def test_cluster_score_is_checked_against_the_points(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered({"answer_text": "O(log n)"})
+    
+    response = client.put(url, json={"answer_ids": answer_ids, "score": 5})
+    
+    assert response.status_code == 400
+
+
+def test_answers_of_other_questions_cannot_be_graded(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered({"answer_text": "O(log n)"})
+    _, other_ids = answered({"answer_text": "O(n)"})
+    
+    response = client.put(url, json={"answer_ids": answer_ids + other_ids, "score": 1})
+    
+    assert response.status_code == 404
+    assert response.json['answer_ids'] == other_ids
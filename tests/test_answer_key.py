@@ -0,0 +1,125 @@
+"""Scoring multiple-choice answers on submit against the test's answer key."""
+
+import json
+import pytest
+from server.database import db_session
+from server import models
+from server.services import answer_key
+from shared.constants import QUESTION_TYPE_MULTIPLE_CHOICE, SUBMISSION_STATUS_IN_PROGRESS
+
+COLOURS = ["red", "green", "blue"]
+
+
+@pytest.fixture
+def quiz(make_test, make_user, make_submission, login):
+    """
+    A test with a structured and a legacy multiple-choice question worth 2 and 3 points.
+    
+    Returns the question ids and a function starting a submission with the
+    given answers, which returns a client of its student and the submission id.
+    """
+    test, questions = make_test(
+        {"type": QUESTION_TYPE_MULTIPLE_CHOICE, "choices": COLOURS, "correct_answer": "green", "points": 2},
+        {"type": QUESTION_TYPE_MULTIPLE_CHOICE, "points": 1, "test_points": 3,
+         "correct_answer": json.dumps({"choices": ["yes", "no"], "correct": "no"})}
+    )
+    test_id, question_ids = test.id, [question.id for question in questions]
+    
+    def start(*answers):
+        # Requests end the session, so the test and questions are loaded again
+        user = make_user()
+        submission = make_submission(db_session.get(models.Test, test_id), user, {
+            db_session.get(models.Question, question_id): {"answer_text": text}
+            for question_id, text in zip(question_ids, answers)
+        }, status=SUBMISSION_STATUS_IN_PROGRESS)
+        submission_id = submission.id
+        return login(user), submission_id
+    
+    return question_ids, start
+
+
+def scores(submission_id):
+    db_session.expire_all()
+    answers = db_session.query(models.Answer).filter_by(submission_id=submission_id).order_by(models.Answer.question_id)
+    return [(answer.score, answer.feedback) for answer in answers]
+
+
+def test_submit_scores_multiple_choice_answers(quiz):
+    _, start = quiz
+    client, submission_id = start("green ", "yes")
+    
+    response = client.post(f'/api/v1/submissions/{submission_id}/submit')
+    
+    assert response.json['auto_scored'] == 2
+    assert scores(submission_id) == [(2.0, "Correct."), (0.0, "Incorrect.")]
+
+
+def test_legacy_answers_use_the_test_points(quiz):
+    _, start = quiz
+    client, submission_id = start("red", "no")
+    
+    client.post(f'/api/v1/submissions/{submission_id}/submit')
+    
+    assert scores(submission_id) == [(0.0, "Incorrect."), (3.0, "Correct.")]
+
+
+def test_students_do_not_see_the_correct_answer(quiz):
+    (question_id, _), start = quiz
+    client, _ = start("red", "no")
+    
+    question = client.get(f'/api/v1/questions/{question_id}').json
+    
+    assert question['choices'] == COLOURS
+    assert question['correct_answer'] is None
+
+
+def test_editing_a_question_updates_the_answer_key(lecturer, quiz):
+    _, lecturer_client = lecturer
+    (question_id, _), start = quiz
+    client, submission_id = start("blue", "no")
+    client.post(f'/api/v1/submissions/{submission_id}/submit')
+    assert scores(submission_id)[0] == (0.0, "Incorrect.")
+    
+    response = lecturer_client.put(f'/api/v1/questions/{question_id}', json={"correct_answer": "blue"})
+    assert response.status_code == 200, response.json
+    client, submission_id = start("blue", "no")
+    client.post(f'/api/v1/submissions/{submission_id}/submit')
+    
+    assert scores(submission_id)[0] == (2.0, "Correct.")
+
+
+@pytest.mark.parametrize("fields", [
+    {"choices": ["red", "red"], "correct_answer": "red"},
+    {"choices": ["red", "green"], "correct_answer": "blue"},
+    {"choices": ["red", ""], "correct_answer": "red"},
+    {"choices": "red, green", "correct_answer": "red"}
+])
+def test_invalid_choices_are_rejected(lecturer, fields):
+    _, client = lecturer
+    topic = client.post('/api/v1/topics', json={"name": "Colours"}).json
+    
+    response = client.post('/api/v1/questions', json={
+        "topic_id": topic['id'], "type": QUESTION_TYPE_MULTIPLE_CHOICE, "content": "Pick one", **fields
+    })
+    
+    assert response.status_code == 400
+
+
+def test_key_built_across_an_invalidation_is_not_kept(quiz, monkeypatch):
+    (question_id, _), start = quiz
+    _, submission_id = start("green", "no")
+    test_id = db_session.get(models.Submission, submission_id).test_id
+    parse_choices = answer_key.parse_choices
+    
+    def edited_meanwhile(question):
+        # A lecturer saves the question while the key is being built
+        answer_key.invalidate(test_id)
+        return parse_choices(question)
+    
+    monkeypatch.setattr(answer_key, "parse_choices", edited_meanwhile)
+    assert question_id in answer_key.answer_key(test_id)
+    monkeypatch.setattr(answer_key, "parse_choices", parse_choices)
+    
+    assert test_id not in answer_key._keys
+    answer_key.answer_key(test_id)
+    assert test_id in answer_key._keys
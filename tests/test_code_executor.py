@@ -0,0 +1,200 @@
+"""Code execution in each CODE_EXECUTION_MODE."""
+
+import os
+import pytest
+from server.services import code_executor
+
+MODES = ["forkserver", "harness", "subprocess"]
+
+SQUARE = "n = int(input())\nprint(n * n)\n"
+
+
+@pytest.fixture(params=MODES)
+def mode(request, monkeypatch):
+    monkeypatch.setattr(code_executor, "CODE_EXECUTION_MODE", request.param)
+    return request.param
+
+
+def test_program_cases(mode):
+    result = code_executor.execute_code(SQUARE, [
+        {"input": "3", "output": "9"},
+        {"input": "4", "output": "15"}
+    ])
+    
+    assert [test['passed'] for test in result['test_results']] == [True, False]
+    assert result['passed_count'] == 1
+    assert result['test_results'][1]['actual_output'] == "16"
+
+
+def test_program_reads_several_lines(mode):
+    code = "a = int(input())\nb = int(input())\nprint(a + b)\n"
+    result = code_executor.execute_code(code, [{"input": "2\n5", "output": "7"}])
+    
+    assert result['all_passed']
+
+
+def test_input_is_read_from_stdin_not_substituted(mode):
+    code = "import sys\nprint(sys.stdin.read().upper())\nprint('input()')\n"
+    result = code_executor.execute_code(code, [{"input": "abc", "output": "ABC\ninput()"}])
+    
+    assert result['all_passed']
+
+
+def test_reading_past_the_input_fails(mode):
+    result = code_executor.execute_code("input()\nprint(input())\n", [{"input": "one", "output": ""}])
+    
+    assert "EOFError" in result['test_results'][0]['error']
+
+
+def test_function_and_program_cases_mixed(mode):
+    code = (
+        "def square(n):\n"
+        "    return n * n\n"
+        "\n"
+        "if __name__ == '__main__':\n"
+        "    print(square(int(input())))\n"
+    )
+    result = code_executor.execute_code(code, [
+        {"function": "square", "args": [5], "kwargs": {}, "expected": 25},
+        {"input": "6", "output": "36"},
+        {"function": "square", "args": [2], "kwargs": {}, "expected": 5}
+    ])
+    
+    assert [test['passed'] for test in result['test_results']] == [True, True, False]
+
+
+def test_return_values_are_compared_structurally(mode):
+    code = "def pair(x):\n    return (x, x + 0.2)\n"
+    result = code_executor.execute_code(code, [
+        {"function": "pair", "args": [0.1], "kwargs": {}, "expected": [0.1, 0.3]},
+        {"function": "pair", "args": [], "kwargs": {"x": 1}, "expected": [1, 1.2]},
+        {"function": "pair", "args": [1], "kwargs": {}, "expected": [1, 1.3]}
+    ])
+    
+    assert [test['passed'] for test in result['test_results']] == [True, True, False]
+
+
+def test_missing_function_fails_the_case(mode):
+    result = code_executor.execute_code("def other():\n    return 1\n", [
+        {"function": "square", "args": [2], "kwargs": {}, "expected": 4}
+    ])
+    
+    test = result['test_results'][0]
+    assert not test['passed']
+    assert "square" in test['error']
+
+
+def test_runtime_error_fails_the_case(mode):
+    result = code_executor.execute_code("print('ok')\nraise ValueError('boom')", [{"input": "", "output": "ok"}])
+    
+    test = result['test_results'][0]
+    assert not test['passed']
+    assert "ValueError" in test['error']
+
+
+def test_timeout_stops_the_run(mode):
+    result = code_executor.execute_code("import time\ntime.sleep(30)\nprint('done')\n", [{"input": "", "output": "done"}], timeout=1)
+    
+    test = result['test_results'][0]
+    assert not test['passed']
+    assert test['error'] == "Execution timeout (1s)"
+
+
+def test_forked_runs_do_not_share_state(mode):
+    code = "import sys\nsys.modules.setdefault('seen', []).append(1)\nprint(len(sys.modules['seen']))\n"
+    
+    outputs = [code_executor.execute_code(code)['output'].strip() for _ in range(2)]
+    
+    assert outputs == ["1", "1"]
+
+
+def test_grade_code_submission_scores_passed_cases(mode):
+    grade = code_executor.grade_code_submission(SQUARE, [
+        {"input": "2", "output": "4"},
+        {"input": "5", "output": "25"},
+        {"input": "1", "output": "2"},
+        {"input": "0", "output": "0"}
+    ], 8)
+    
+    assert grade['score'] == 6.0
+
+
+def test_syntax_error_scores_nothing(mode):
+    grade = code_executor.grade_code_submission("print(", [{"input": "", "output": ""}], 5)
+    
+    assert grade['score'] == 0.0
+    assert grade['feedback'].startswith("Syntax error")
+
+
+@pytest.fixture
+def without_fork(monkeypatch):
+    """Harness mode on a platform without fork."""
+    monkeypatch.setattr(code_executor, "CODE_EXECUTION_MODE", "harness")
+    monkeypatch.delattr(os, "fork")
+
+
+def test_harness_without_fork_runs_in_a_fresh_interpreter(without_fork):
+    result = code_executor.execute_code(SQUARE, [
+        {"input": "7", "output": "49"},
+        {"input": "2", "output": "5"},
+        {"function": "square", "args": [3], "kwargs": {}, "expected": 9}
+    ])
+    
+    assert [test['passed'] for test in result['test_results']] == [True, False, False]
+
+
+def test_harness_without_fork_applies_the_policy(without_fork):
+    result = code_executor.execute_code("import missing_module\n", [{"input": "1", "output": "1"}] * 3,
+                                        policy={"stop_on_import_error": True})
+    
+    assert [test.get('skipped') is not None for test in result['test_results']] == [False, True, True]
+
+
+def test_harness_without_fork_cannot_forge_results(without_fork):
+    # Writes a report passing every case in place of the harness's own
+    code = (
+        "import json, os, sys\n"
+        "forged = {'returncode': 0, 'stdout': '9\\n', 'stderr': '', 'return_value': 9, 'timed_out': False}\n"
+        "sys.__stdout__.write(json.dumps([forged] * 3))\n"
+        "sys.__stdout__.flush()\n"
+        "os._exit(0)\n"
+    )
+    result = code_executor.execute_code(code, [
+        {"input": "3", "output": "9"},
+        {"input": "4", "output": "16"},
+        {"function": "square", "args": [5], "kwargs": {}, "expected": 25}
+    ])
+    
+    assert result['passed_count'] == 0
+
+
+def test_student_code_cannot_forge_results(mode):
+    code = (
+        "import json, os\n"
+        "forged = {'returncode': 0, 'stdout': '9\\n', 'stderr': '', 'return_value': 9, 'timed_out': False}\n"
+        "for fd in range(3, 20):\n"
+        "    try:\n"
+        "        os.write(fd, (json.dumps({'results': [forged] * 2}) + '\\n').encode())\n"
+        "    except OSError:\n"
+        "        pass\n"
+        "os._exit(0)\n"
+    )
+    result = code_executor.execute_code(code, [
+        {"input": "3", "output": "9"},
+        {"function": "square", "args": [3], "kwargs": {}, "expected": 9}
+    ])
+    
+    assert result['passed_count'] == 0
+
+
+def test_student_code_cannot_read_expected_results(mode):
+    code = (
+        "import gc\n"
+        "def answer():\n"
+        "    for obj in gc.get_objects():\n"
+        "        if isinstance(obj, dict) and 'expected' in obj:\n"
+        "            return obj['expected']\n"
+    )
+    result = code_executor.execute_code(code, [{"function": "answer", "args": [], "kwargs": {}, "expected": 4217}])
+    
+    assert not result['test_results'][0]['passed']
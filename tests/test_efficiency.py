@@ -0,0 +1,122 @@
+"""Efficiency scoring of code answers against the reference solution."""
+
+import pytest
+from server.database import db_session
+from server.services import efficiency, grader
+
+SQUARE = "n = int(input())\nprint(n * n)\n"
+SLOW_SQUARE = "n = int(input())\nsum(range(3 * 10 ** 6))\nprint(n * n)\n"
+CASES = [{"input": "3", "output": "9"}, {"input": "4", "output": "16"}]
+SETTINGS = {"weight": 0.5, "benchmark_cases": [2], "repeats": 3, "max_cpu_ratio": 2.0}
+PASSED = [{"passed": True}, {"passed": True}]
+BASELINE = {
+    "cases": [{"passed": True, "cpu_time": 0.03, "peak_memory_mb": 10.0}],
+    "floor": {"cpu_time": 0.01, "peak_memory_mb": 8.0}
+}
+
+
+def measured(cpu_time, peak_memory_mb=10.0, passed=True):
+    return [{"passed": passed, "error": None if passed else "Execution timeout (1s)",
+             "cpu_time": cpu_time, "peak_memory_mb": peak_memory_mb}]
+
+
+@pytest.mark.parametrize("settings", [
+    {"weight": 0, "benchmark_cases": [1], "max_cpu_ratio": 2},
+    {"weight": 0.5, "benchmark_cases": [3], "max_cpu_ratio": 2},
+    {"weight": 0.5, "benchmark_cases": [1]},
+    {"weight": 0.5, "benchmark_cases": [1], "max_cpu_ratio": 2, "repeats": 100},
+    {"weight": 0.5, "benchmark_cases": [1], "max_cpu_ratio": 2, "speed": 1}
+])
+def test_invalid_settings_are_rejected(settings):
+    assert efficiency.validate_settings(settings, CASES)
+
+
+def test_valid_settings_are_accepted():
+    assert efficiency.validate_settings(SETTINGS, CASES) == ""
+
+
+@pytest.mark.parametrize("cpu_time, points", [(0.05, 2.0), (0.03, 2.0), (0.09, 1.0), (0.17, 0.5)])
+def test_points_shrink_in_proportion_beyond_the_limit(cpu_time, points):
+    settings = dict(SETTINGS, baseline=BASELINE)
+    
+    awarded, summary, feedback = efficiency.score(settings, measured(cpu_time), 2.0, PASSED)
+    
+    assert awarded == points
+    assert summary['points'] == points
+    assert feedback.startswith(f"Efficiency: {points:g}/2 points")
+
+
+def test_failed_benchmark_earns_nothing():
+    awarded, summary, feedback = efficiency.score(dict(SETTINGS, baseline=BASELINE), measured(0.03, passed=False), 2.0, PASSED)
+    
+    assert awarded == 0.0
+    assert summary['measured'] is False
+    assert "Execution timeout" in feedback
+
+
+def test_wrong_benchmark_answer_earns_nothing():
+    test_results = [{"passed": True}, {"passed": False}]
+    
+    awarded, _, feedback = efficiency.score(dict(SETTINGS, baseline=BASELINE), measured(0.03), 2.0, test_results)
+    
+    assert awarded == 0.0
+    assert "no benchmark case produced the expected output" in feedback
+
+
+def test_slow_answer_loses_efficiency_points(make_test, make_user, make_submission):
+    test, (question,) = make_test({
+        "reference_solution": SQUARE, "test_cases": CASES, "points": 4,
+        "efficiency": dict(SETTINGS, max_cpu_ratio=5.0)  # leaves room for noise in tiny programs
+    })
+    fast = make_submission(test, make_user(), {question: {"code": SQUARE}})
+    slow = make_submission(test, make_user(), {question: {"code": SLOW_SQUARE}})
+    
+    fast_score = grader.auto_grade_code_answer(fast.answers[0], fast)
+    slow_score = grader.auto_grade_code_answer(slow.answers[0], slow)
+    db_session.commit()
+    
+    assert question.efficiency_baseline['cases'][0]['passed']
+    assert fast_score == 4.0
+    assert 2.0 <= slow_score < 3.0
+    assert slow.answers[0].efficiency['cpu_ratio'] > 5.0
+
+
+def test_fast_wrong_answer_earns_no_efficiency_points(make_test, make_user, make_submission):
+    test, (question,) = make_test({
+        "reference_solution": SQUARE, "test_cases": CASES, "points": 4, "efficiency": SETTINGS
+    })
+    submission = make_submission(test, make_user(), {question: {"code": "input()\nprint(9)\n"}})
+    
+    score = grader.auto_grade_code_answer(submission.answers[0], submission)
+    
+    assert score == 1.0  # half of the test-case share
+
+
+def test_efficiency_requires_a_reference_solution(lecturer):
+    _, client = lecturer
+    topic = client.post('/api/v1/topics', json={"name": "Loops"}).json
+    
+    response = client.post('/api/v1/questions', json={
+        "topic_id": topic['id'], "type": "code", "content": "Square a number",
+        "test_cases": CASES, "efficiency": SETTINGS
+    })
+    
+    assert response.status_code == 400
+    assert response.json['error'] == "Efficiency scoring requires a reference solution"
+
+
+def test_test_cases_must_keep_the_benchmark_cases(lecturer):
+    _, client = lecturer
+    topic = client.post('/api/v1/topics', json={"name": "Loops"}).json
+    question = client.post('/api/v1/questions', json={
+        "topic_id": topic['id'], "type": "code", "content": "Square a number",
+        "test_cases": CASES, "reference_solution": SQUARE, "efficiency": SETTINGS
+    }).json
+    
+    response = client.put(f"/api/v1/questions/{question['id']}", json={"test_cases": CASES[:1]})
+    
+    assert response.status_code == 400
+    assert response.json['error'] == "benchmark_cases must list test case numbers between 1 and 1"
+    assert client.put(f"/api/v1/questions/{question['id']}", json={
+        "test_cases": CASES + [{"input": "5", "output": "25"}]
+    }).json['efficiency'] == SETTINGS
@@ -0,0 +1,192 @@
+"""Saving the grades of a submission and finalizing the grades of a whole test."""
+
+import pytest
+from server.database import db_session
+from server.models import Answer, Grade, Submission
+from server.services import submission_totals
+from server.services.grades import finalize_test
+from shared.constants import (
+    QUESTION_TYPE_TEXT, SUBMISSION_STATUS_IN_PROGRESS, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+)
+
+
+@pytest.fixture
+def answers(make_test, make_user, make_submission):
+    """Ids of two ungraded answers, worth 4 and (in the test) 6 points."""
+    test, (short, long) = make_test(
+        {"type": QUESTION_TYPE_TEXT, "points": 4},
+        {"type": QUESTION_TYPE_TEXT, "points": 2, "test_points": 6}
+    )
+    submission = make_submission(test, make_user(), {short: {"answer_text": "a"}, long: {"answer_text": "b"}})
+    return [answer.id for answer in sorted(submission.answers, key=lambda answer: answer.question_id)]
+
+
+def scores(answer_ids):
+    db_session.expire_all()
+    return [(db_session.get(Answer, answer_id).score, db_session.get(Answer, answer_id).feedback)
+            for answer_id in answer_ids]
+
+
+def test_all_grades_are_saved(lecturer, answers):
+    _, client = lecturer
+    short, long = answers
+    
+    response = client.put('/api/v1/grading/answers', json=[
+        {"answer_id": short, "score": 4, "feedback": "Good"},
+        {"answer_id": long, "score": 5.5, "feedback": "Almost"}
+    ])
+    
+    assert response.status_code == 200, response.json
+    assert scores(answers) == [(4.0, "Good"), (5.5, "Almost")]
+
+
+def test_score_above_the_test_points_saves_nothing(lecturer, answers):
+    _, client = lecturer
+    short, long = answers
+    
+    response = client.put('/api/v1/grading/answers', json=[
+        {"answer_id": short, "score": 3, "feedback": "Fine"},
+        {"answer_id": long, "score": 7}
+    ])
+    
+    assert response.status_code == 400
+    assert response.json['errors'] == [{"answer_id": long, "error": "Score must be between 0 and 6.0"}]
+    assert scores(answers) == [(None, None), (None, None)]
+
+
+def test_unknown_answer_saves_nothing(lecturer, answers):
+    _, client = lecturer
+    
+    response = client.put('/api/v1/grading/answers', json=[
+        {"answer_id": answers[0], "score": 1},
+        {"answer_id": 999, "score": 1}
+    ])
+    
+    assert response.status_code == 404
+    assert response.json['answer_ids'] == [999]
+    assert scores(answers)[0] == (None, None)
+
+
+@pytest.mark.parametrize("grades", [
+    [],
+    {"answer_id": 1, "score": 1},
+    [{"score": 1}],
+    [{"answer_id": 1, "score": "full"}],
+    [{"answer_id": 1, "score": 1}, {"answer_id": 1, "score": 2}]
+])
+def test_malformed_requests_are_rejected(lecturer, answers, grades):
+    _, client = lecturer
+    
+    assert client.put('/api/v1/grading/answers', json=grades).status_code == 400
+
+
+def test_students_cannot_save_grades(make_user, login, answers):
+    client = login(make_user())
+    
+    response = client.put('/api/v1/grading/answers', json=[{"answer_id": answers[0], "score": 4}])
+    
+    assert response.status_code == 403
+    assert scores(answers)[0] == (None, None)
+
+
+@pytest.fixture
+def exam(make_test, make_user, make_submission):
+    """
+    A test worth 10 points taken by three students.
+    
+    Returns the test id and submission ids: one scored 6, one scored 3 out
+    of one graded answer and one still in progress.
+    """
+    def make():
+        test, (short, long) = make_test(
+            {"type": QUESTION_TYPE_TEXT, "points": 4},
+            {"type": QUESTION_TYPE_TEXT, "points": 2, "test_points": 6}
+        )
+        submissions = []
+        for answer_scores, status in (((3.0, 3.0), SUBMISSION_STATUS_SUBMITTED),
+                               ((3.0, None), SUBMISSION_STATUS_SUBMITTED),
+                               ((4.0, 6.0), SUBMISSION_STATUS_IN_PROGRESS)):
+            submission = make_submission(test, make_user(), {short: {"answer_text": "a"}, long: {"answer_text": "b"}},
+                                         status=status)
+            for answer, score in zip(sorted(submission.answers, key=lambda answer: answer.question_id), answer_scores):
+                submission_totals.set_score(answer, score)
+            submissions.append(submission.id)
+        db_session.commit()
+        return test.id, submissions
+    
+    return make
+
+
+def grades():
+    db_session.expire_all()
+    return {
+        grade.submission_id: (grade.total_score, grade.max_score, grade.percentage)
+        for grade in db_session.query(Grade)
+    }
+
+
+def status(submission_id):
+    return db_session.get(Submission, submission_id).status
+
+
+def test_finalize_grades_every_submitted_submission(exam, make_user):
+    test_id, (full, partial, in_progress) = exam()
+    lecturer = make_user("lecturer")
+    
+    summary = finalize_test(test_id, lecturer.id)
+    db_session.commit()
+    
+    assert summary == {"test_id": test_id, "max_score": 10.0, "finalized": 2}
+    assert grades() == {full: (6.0, 10.0, 60.0), partial: (3.0, 10.0, 30.0)}
+    assert [status(submission) for submission in (full, partial, in_progress)] == [
+        SUBMISSION_STATUS_GRADED, SUBMISSION_STATUS_GRADED, SUBMISSION_STATUS_IN_PROGRESS
+    ]
+    assert {grade.graded_by for grade in db_session.query(Grade)} == {lecturer.id}
+
+
+def test_finalizing_again_updates_grades_in_place(exam, make_user):
+    test_id, (full, partial, _) = exam()
+    lecturer_id = make_user("lecturer").id
+    finalize_test(test_id, lecturer_id)
+    db_session.commit()
+    
+    answer = db_session.query(Answer).filter_by(submission_id=partial, score=None).one()
+    submission_totals.set_score(answer, 5.0)
+    summary = finalize_test(test_id, lecturer_id)
+    db_session.commit()
+    
+    assert summary['finalized'] == 2
+    assert grades() == {full: (6.0, 10.0, 60.0), partial: (8.0, 10.0, 80.0)}
+    assert db_session.query(Grade).count() == 2
+
+
+def test_test_without_points_finalizes_to_zero_percent(make_test, make_user, make_submission):
+    test, (question,) = make_test({"type": QUESTION_TYPE_TEXT, "points": 0})
+    submission = make_submission(test, make_user(), {question: {"answer_text": "a"}})
+    
+    finalize_test(test.id, make_user("lecturer").id)
+    db_session.commit()
+    
+    assert grades() == {submission.id: (0.0, 0.0, 0.0)}
+
+
+def test_finalize_endpoint(lecturer, exam):
+    _, client = lecturer
+    test_id, (full, partial, _) = exam()
+    
+    response = client.post(f'/api/v1/grading/tests/{test_id}/finalize')
+    
+    assert response.status_code == 200, response.json
+    assert response.json['finalized'] == 2
+    assert set(grades()) == {full, partial}
+
+
+def test_finalize_endpoint_checks_test_and_role(lecturer, exam):
+    _, client = lecturer
+    test_id, _ = exam()
+    
+    assert client.post('/api/v1/grading/tests/999/finalize').status_code == 404
+    
+    anonymous = client.application.test_client()
+    assert anonymous.post(f'/api/v1/grading/tests/{test_id}/finalize').status_code == 401
+    assert grades() == {}
@@ -0,0 +1,107 @@
+"""Cached code grading results."""
+
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from server.services import code_executor, grading_cache
+
+SQUARE = "print(int(input()) ** 2)"
+CASES = [{"input": "3", "output": "9"}, {"input": "4", "output": "16"}]
+
+
+@pytest.fixture
+def executions(monkeypatch):
+    """Count the answers actually executed."""
+    executed = []
+    execute_code = code_executor.execute_code
+    
+    def counting(code, *args, **kwargs):
+        executed.append(code)
+        return execute_code(code, *args, **kwargs)
+    
+    monkeypatch.setattr(code_executor, "execute_code", counting)
+    return executed
+
+
+def passed_result():
+    return {"success": True, "all_passed": True, "passed_count": 1, "total_count": 1,
+            "test_results": [{"test_case": 1, "passed": True, "error": ""}]}
+
+
+def test_identical_answers_run_once(executions):
+    before = grading_cache.get_stats()
+    
+    first = code_executor.grade_code_submission(SQUARE, CASES, 4)
+    # Line endings and trailing whitespace do not change the key
+    second = code_executor.grade_code_submission(SQUARE.replace("\n", "\r\n") + "\n\n", CASES, 4)
+    
+    assert executions == [SQUARE]
+    assert first == second
+    assert first['score'] == 4.0
+    stats = grading_cache.get_stats()
+    assert (stats['hits'] - before['hits'], stats['misses'] - before['misses']) == (1, 1)
+    assert (stats['entries'], stats['total_hits']) == (1, 1)
+
+
+def test_changed_test_cases_miss(executions):
+    code_executor.grade_code_submission(SQUARE, CASES, 4)
+    code_executor.grade_code_submission(SQUARE, CASES + [{"input": "5", "output": "25"}], 4)
+    
+    assert len(executions) == 2
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    monkeypatch.setattr(grading_cache, "GRADING_CACHE_SIZE", 2)
+    grading_cache.store("first", passed_result())
+    grading_cache.store("second", passed_result())
+    assert grading_cache.lookup("first") is not None  # now more recent than "second"
+    
+    grading_cache.store("third", passed_result())
+    
+    assert grading_cache.lookup("second") is None
+    assert grading_cache.lookup("first") is not None
+    assert grading_cache.lookup("third") is not None
+    assert grading_cache.get_stats()['entries'] == 2
+
+
+@pytest.mark.parametrize("error", ["Execution timeout (5s)", "Execution error: Fork server is not responding"])
+def test_results_depending_on_server_load_are_not_cached(error):
+    result = passed_result()
+    result['test_results'][0].update(passed=False, error=error)
+    
+    grading_cache.store("key", result)
+    
+    assert grading_cache.lookup("key") is None
+
+
+def test_timed_out_answer_runs_again(executions):
+    code = "while True:\n    pass\n"
+    
+    for _ in range(2):
+        code_executor.grade_code_submission(code, [{"input": "", "output": "done"}], 1)
+    
+    assert executions == [code, code]
+
+
+def test_size_zero_disables_the_cache(monkeypatch, executions):
+    monkeypatch.setattr(grading_cache, "GRADING_CACHE_SIZE", 0)
+    
+    for _ in range(2):
+        code_executor.grade_code_submission(SQUARE, CASES, 4)
+    
+    assert len(executions) == 2
+    assert grading_cache.get_stats()['entries'] == 0
+
+
+def test_lookups_of_other_processes_are_counted():
+    grading_cache.lookup("missing")
+    
+    # A grading worker process looking up the same database
+    subprocess.run([sys.executable, "-c", (
+        "from server.services import grading_cache\n"
+        "grading_cache.lookup('missing')\n"
+        "grading_cache.lookup('missing')\n"
+    )], cwd=Path(__file__).parent.parent, check=True)
+    
+    assert grading_cache.get_stats()['misses'] == 3
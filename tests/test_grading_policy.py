@@ -0,0 +1,76 @@
+"""Early-exit grading policies."""
+
+import pytest
+from server.services import code_executor
+
+SLEEP = "import time\ntime.sleep(30)\n"
+CASES = [{"input": str(n), "output": "done"} for n in range(5)]
+
+
+@pytest.fixture(params=["forkserver", "harness", "subprocess"])
+def mode(request, monkeypatch):
+    monkeypatch.setattr(code_executor, "CODE_EXECUTION_MODE", request.param)
+    return request.param
+
+
+def test_consecutive_timeouts_stop_the_run(mode):
+    result = code_executor.execute_code(SLEEP, CASES, timeout=1, policy={"max_consecutive_timeouts": 2})
+    
+    tests = result['test_results']
+    assert [test['error'] for test in tests[:2]] == ["Execution timeout (1s)"] * 2
+    assert all(test['skipped'] and test['error'].startswith("Not run") for test in tests[2:])
+    assert result['passed_count'] == 0
+
+
+def test_import_error_stops_the_run(mode):
+    result = code_executor.execute_code("import no_such_module\n", CASES, policy={"stop_on_import_error": True})
+    
+    tests = result['test_results']
+    assert "ModuleNotFoundError" in tests[0]['error']
+    assert tests[-1]['skipped'] == "stopped because the program failed to import a module"
+
+
+def test_without_a_policy_every_case_runs(mode):
+    result = code_executor.execute_code("import no_such_module\n", CASES)
+    
+    assert all("ModuleNotFoundError" in test['error'] for test in result['test_results'])
+
+
+def test_feedback_names_the_policy():
+    grade = code_executor.grade_code_submission(SLEEP, CASES, 5, policy={"max_consecutive_timeouts": 1})
+    
+    assert grade['score'] == 0.0
+    assert "Grading stopped after 1 consecutive timeout(s)" in grade['feedback']
+
+
+@pytest.mark.parametrize("policy", [
+    {"max_consecutive_timeouts": -1},
+    {"max_consecutive_timeouts": True},
+    {"stop_on_import_error": "yes"},
+    {"stop_early": True},
+    [2]
+])
+def test_invalid_policies_are_rejected(lecturer, policy):
+    _, client = lecturer
+    topic = client.post('/api/v1/topics', json={"name": "Loops"}).json
+    
+    response = client.post('/api/v1/questions', json={
+        "topic_id": topic['id'], "type": "code", "content": "Square a number",
+        "test_cases": CASES, "grading_policy": policy
+    })
+    
+    assert response.status_code == 400
+
+
+def test_policy_is_stored_with_the_question(lecturer):
+    _, client = lecturer
+    topic = client.post('/api/v1/topics', json={"name": "Loops"}).json
+    policy = {"max_consecutive_timeouts": 2, "stop_on_import_error": True}
+    
+    response = client.post('/api/v1/questions', json={
+        "topic_id": topic['id'], "type": "code", "content": "Square a number",
+        "test_cases": CASES, "grading_policy": policy
+    })
+    
+    assert response.status_code == 201
+    assert response.json['grading_policy'] == policy
@@ -0,0 +1,192 @@
+"""Leases of grading jobs shared by competing workers."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+from server.database import db_session
+from server.models import Answer, GradingJob, Submission
+from server.services import grading_queue
+from shared.constants import (
+    GRADING_JOB_STATUS_QUEUED, GRADING_JOB_STATUS_RUNNING, GRADING_JOB_STATUS_DONE, GRADING_JOB_STATUS_FAILED
+)
+
+SQUARE = "print(int(input()) ** 2)"
+
+
+@pytest.fixture
+def queued_jobs(make_test, make_user, make_submission):
+    """Queue one grading job per student for a code question worth 2 points."""
+    def make(students=1, code=SQUARE):
+        test, (question,) = make_test({"test_cases": [{"input": "3", "output": "9"}], "points": 2})
+        for _ in range(students):
+            submission = make_submission(test, make_user(), {question: {"code": code}})
+            grading_queue.enqueue_submission(submission)
+        db_session.commit()
+        return [job_id for (job_id,) in db_session.query(GradingJob.id).order_by(GradingJob.id)]
+    
+    return make
+
+
+def expire_leases():
+    db_session.query(GradingJob).update({GradingJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    db_session.commit()
+
+
+class Worker:
+    """A local grading worker with its own thread, and so its own database session."""
+    
+    def __init__(self, name):
+        self.worker_id = grading_queue.LOCAL_WORKER_PREFIX + name
+        self.thread = ThreadPoolExecutor(max_workers=1)
+        self.jobs = []  # claimed GradingJob objects, as loaded by the claim
+    
+    def claim(self, limit=10):
+        return self.thread.submit(self._claim, limit).result()
+    
+    def _claim(self, limit):
+        self.jobs = grading_queue.claim_jobs(limit, self.worker_id)
+        return [job.id for job in self.jobs]
+    
+    def process(self):
+        self.thread.submit(grading_queue.process_jobs, self.jobs).result()
+    
+    def stop(self):
+        self.thread.submit(db_session.remove).result()
+        self.thread.shutdown()
+
+
+@pytest.fixture
+def workers():
+    started = []
+    
+    def start(name):
+        worker = Worker(name)
+        started.append(worker)
+        return worker
+    
+    yield start
+    for worker in started:
+        worker.stop()
+
+
+def test_competing_workers_claim_each_job_once(queued_jobs):
+    job_ids = queued_jobs(students=12)
+    claimed = []
+    lock = threading.Lock()
+    
+    def work(worker_id):
+        try:
+            while True:
+                try:
+                    jobs = grading_queue.claim_jobs(2, worker_id)
+                except SQLAlchemyError:
+                    # Locked database, as run_worker tolerates
+                    db_session.rollback()
+                    continue
+                if not jobs:
+                    return
+                with lock:
+                    claimed.extend((job.id, job.worker_id) for job in jobs)
+        finally:
+            db_session.remove()
+    
+    threads = [threading.Thread(target=work, args=(f"server-test-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(job_id for job_id, _ in claimed) == job_ids
+    assert db_session.query(GradingJob).filter_by(status=GRADING_JOB_STATUS_RUNNING).count() == len(job_ids)
+    owners = dict(db_session.query(GradingJob.id, GradingJob.worker_id))
+    assert all(owners[job_id] == worker_id for job_id, worker_id in claimed)
+
+
+def test_expired_lease_is_claimed_by_another_worker(queued_jobs, workers):
+    (job_id,) = queued_jobs()
+    first, second = workers("first"), workers("second")
+    
+    assert first.claim() == [job_id]
+    assert second.claim() == []
+    
+    expire_leases()
+    assert second.claim() == [job_id]
+    
+    job = db_session.get(GradingJob, job_id)
+    assert job.status == GRADING_JOB_STATUS_RUNNING
+    assert job.worker_id == second.worker_id
+    assert job.attempts == 2
+    assert job.error == f"Lease expired on worker {first.worker_id}"
+
+
+def test_result_of_expired_lease_is_discarded(queued_jobs, workers):
+    (job_id,) = queued_jobs()
+    first, second = workers("first"), workers("second")
+    first.claim()
+    expire_leases()
+    second.claim()
+    token = db_session.get(GradingJob, job_id).lease_token
+    db_session.remove()
+    
+    # The first worker finishes after losing its lease
+    first.process()
+    
+    job = db_session.get(GradingJob, job_id)
+    assert job.status == GRADING_JOB_STATUS_RUNNING
+    assert job.lease_token == token
+    assert db_session.get(Answer, job.answer_id).score is None
+    db_session.remove()
+    
+    second.process()
+    
+    job = db_session.get(GradingJob, job_id)
+    assert job.status == GRADING_JOB_STATUS_DONE
+    assert job.lease_token is None
+    answer = db_session.get(Answer, job.answer_id)
+    assert answer.score == 2.0
+    assert db_session.get(Submission, answer.submission_id).total_score == 2.0
+
+
+def test_expired_lease_fails_after_max_attempts(queued_jobs, workers, monkeypatch):
+    monkeypatch.setattr(grading_queue, "GRADING_MAX_ATTEMPTS", 2)
+    (job_id,) = queued_jobs()
+    first, second, third = workers("first"), workers("second"), workers("third")
+    
+    first.claim()
+    expire_leases()
+    second.claim()
+    expire_leases()
+    
+    assert third.claim() == []
+    job = db_session.get(GradingJob, job_id)
+    assert job.status == GRADING_JOB_STATUS_FAILED
+    assert job.finished_at is not None
+    assert job.error == f"Lease expired on worker {second.worker_id}"
+
+
+def test_requeue_running_releases_only_local_workers(queued_jobs, workers):
+    local_job, remote_job = queued_jobs(students=2)
+    workers(grading_queue.default_worker_id()).claim(limit=1)
+    grading_queue.claim_jobs(1, "remote-worker")
+    db_session.remove()
+    
+    assert grading_queue.requeue_running() == 1
+    
+    assert db_session.get(GradingJob, local_job).status == GRADING_JOB_STATUS_QUEUED
+    assert db_session.get(GradingJob, remote_job).status == GRADING_JOB_STATUS_RUNNING
+
+
+def test_remote_result_after_expired_lease_is_rejected(queued_jobs):
+    (job_id,) = queued_jobs()
+    (first,) = grading_queue.lease_jobs("remote-first", 1)
+    expire_leases()
+    (second,) = grading_queue.lease_jobs("remote-second", 1)
+    
+    accepted, outcome = grading_queue.complete_job(
+        job_id, first['lease_token'], first['args_hash'], {"test_results": []}
+    )
+    
+    assert (accepted, outcome) == (False, "Lease is no longer held")
+    assert db_session.get(GradingJob, job_id).lease_token == second['lease_token']
@@ -0,0 +1,156 @@
+"""Similarity index of code answers."""
+
+import pytest
+from server.database import db_session
+from server import models
+from server.services import plagiarism
+from shared.constants import SUBMISSION_STATUS_IN_PROGRESS
+
+ORIGINAL = '''
+def mean(values):
+    """Average of a list."""
+    total = 0
+    for value in values:
+        total += value
+    return total / len(values)
+
+numbers = [int(x) for x in input().split()]
+print(round(mean(numbers), 2))
+'''
+
+# Renamed, reformatted and commented
+DISGUISED = '''
+def average(xs):
+    s = 0   # running sum
+    for x in xs:
+        s += x
+    return s/len(xs)
+
+
+nums = [int(t) for t in input().split()]
+print(round(average(nums), 2))
+'''
+
+UNRELATED = '''
+words = input().split()
+counts = {}
+for word in words:
+    counts[word.lower()] = counts.get(word.lower(), 0) + 1
+for word, count in sorted(counts.items()):
+    print(word, count)
+'''
+
+
+def test_renaming_and_formatting_do_not_change_fingerprints():
+    assert plagiarism.fingerprints(ORIGINAL) == plagiarism.fingerprints(DISGUISED)
+    assert not plagiarism.fingerprints(ORIGINAL) & plagiarism.fingerprints(UNRELATED)
+
+
+def test_short_code_has_no_fingerprints():
+    assert plagiarism.fingerprints("print(1)") == set()
+
+
+def test_only_the_start_of_long_code_is_fingerprinted(monkeypatch):
+    monkeypatch.setattr(plagiarism, "SIMILARITY_MAX_CODE_BYTES", len(ORIGINAL) + 10)
+    
+    assert plagiarism.fingerprints(ORIGINAL + UNRELATED) == plagiarism.fingerprints(ORIGINAL)
+
+
+@pytest.fixture
+def students(make_test, make_user, make_submission, login):
+    """Start one submission per given code; returns the test id and a client and submission id per student."""
+    def make(*codes):
+        test, (question,) = make_test({"test_cases": [{"input": "1 2", "output": "1.5"}]})
+        test_id, question_id = test.id, question.id
+        started = []
+        for code in codes:
+            # Logging in ends the session, so the test and question are loaded again
+            user = make_user()
+            submission = make_submission(db_session.get(models.Test, test_id), user, {
+                db_session.get(models.Question, question_id): {"code": code}
+            }, status=SUBMISSION_STATUS_IN_PROGRESS)
+            submission_id = submission.id
+            started.append((login(user), submission_id))
+        return test_id, started
+    
+    return make
+
+
+def test_submitted_copies_are_matched(lecturer, students):
+    _, lecturer_client = lecturer
+    test_id, started = students(ORIGINAL, UNRELATED, DISGUISED)
+    for client, submission_id in started:
+        assert client.post(f'/api/v1/submissions/{submission_id}/submit').status_code == 200
+    # Submitting leaves indexing to the grading workers
+    assert lecturer_client.get(f'/api/v1/grading/tests/{test_id}/similarity').json['matches'] == []
+    
+    assert plagiarism.index_pending() == {"indexed": 3, "matches": 1, "failed": []}
+    (match,) = lecturer_client.get(f'/api/v1/grading/tests/{test_id}/similarity').json['matches']
+    
+    assert match['similarity'] == 1.0
+    assert [side['submission_id'] for side in match['answers']] == [started[0][1], started[2][1]]
+    assert plagiarism.index_pending()['indexed'] == 0
+
+
+def test_answer_that_fails_to_index_stays_unindexed(make_test, make_user, make_submission, monkeypatch):
+    test, (question,) = make_test({"test_cases": [{"input": "1 2", "output": "1.5"}]})
+    broken, fine = (make_submission(test, make_user(), {question: {"code": code}}).answers[0].id
+                    for code in (ORIGINAL, DISGUISED))
+    index_answer = plagiarism.index_answer
+    
+    def fail_on_broken(answer, user_id):
+        if answer.id == broken:
+            raise RecursionError("too deep")
+        return index_answer(answer, user_id)
+    
+    monkeypatch.setattr(plagiarism, "index_answer", fail_on_broken)
+    
+    assert plagiarism.index_pending() == {"indexed": 1, "matches": 0, "failed": [broken]}
+    db_session.expire_all()
+    assert [db_session.get(models.Answer, answer_id).similarity_indexed for answer_id in (broken, fine)] == [False, True]
+    assert plagiarism.index_pending(skip=[broken])['indexed'] == 0
+
+
+def test_answers_of_the_same_student_are_not_matched(make_test, make_user, make_submission):
+    test, (question,) = make_test({"test_cases": [{"input": "1 2", "output": "1.5"}]})
+    student = make_user()
+    for _ in range(2):
+        make_submission(test, student, {question: {"code": ORIGINAL}})
+    
+    assert plagiarism.index_pending()['indexed'] == 2
+    assert db_session.query(models.SimilarityMatch).count() == 0
+
+
+def test_common_fingerprints_do_not_make_candidates(make_test, make_user, make_submission, monkeypatch):
+    monkeypatch.setattr(plagiarism, "SIMILARITY_MAX_POSTINGS", 1)
+    test, (question,) = make_test({"test_cases": [{"input": "1 2", "output": "1.5"}]})
+    for _ in range(3):
+        make_submission(test, make_user(), {question: {"code": ORIGINAL}})
+    plagiarism.index_pending()
+    
+    # Only the second answer saw a fingerprint held by a single other answer
+    assert db_session.query(models.SimilarityMatch).count() == 1
+
+
+def test_answers_submitted_before_the_index_are_indexed_on_request(lecturer, make_test, make_user, make_submission):
+    _, client = lecturer
+    test, (question,) = make_test({"test_cases": [{"input": "1 2", "output": "1.5"}]})
+    for code in (ORIGINAL, DISGUISED):
+        make_submission(test, make_user(), {question: {"code": code}})
+    test_id = test.id
+    
+    response = client.post(f'/api/v1/grading/tests/{test_id}/similarity')
+    
+    assert response.json == {"test_id": test_id, "indexed": 2, "matches": 1}
+    assert len(client.get(f'/api/v1/grading/tests/{test_id}/similarity').json['matches']) == 1
+    assert client.post(f'/api/v1/grading/tests/{test_id}/similarity').json['indexed'] == 0
+
+
+def test_short_answers_are_indexed_once(make_test, make_user, make_submission):
+    test, (question,) = make_test({"test_cases": [{"input": "1", "output": "1"}]})
+    make_submission(test, make_user(), {question: {"code": "print(input())"}})
+    
+    assert plagiarism.index_test(test.id)['indexed'] == 1
+    db_session.commit()
+    
+    assert plagiarism.index_test(test.id)['indexed'] == 0
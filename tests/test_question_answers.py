@@ -0,0 +1,68 @@
+"""Paging through the answers to one question for grade-by-question."""
+
+import pytest
+from shared.constants import QUESTION_TYPE_TEXT, SUBMISSION_STATUS_IN_PROGRESS, SUBMISSION_STATUS_SUBMITTED
+
+
+@pytest.fixture
+def answered(make_test, make_user, make_submission):
+    """Five submitted answers and one in progress; returns the URL and the submitted answer ids."""
+    test, (question, other) = make_test({"type": QUESTION_TYPE_TEXT, "points": 2}, {"type": QUESTION_TYPE_TEXT})
+    answer_ids = []
+    for n in range(6):
+        status = SUBMISSION_STATUS_IN_PROGRESS if n == 3 else SUBMISSION_STATUS_SUBMITTED
+        submission = make_submission(test, make_user(), {
+            question: {"answer_text": f"answer {n}"}, other: {"answer_text": "other"}
+        }, status=status)
+        if status == SUBMISSION_STATUS_SUBMITTED:
+            answer_ids.append(next(answer.id for answer in submission.answers if answer.question_id == question.id))
+    return f"/api/v1/grading/tests/{test.id}/questions/{question.id}/answers", answer_ids
+
+
+def test_pages_cover_every_submitted_answer_once(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered
+    
+    seen, after, pages = [], 0, 0
+    while after is not None:
+        page = client.get(url, query_string={"after": after, "limit": 2}).json
+        seen += [answer['id'] for answer in page['answers']]
+        after = page['next_after']
+        pages += 1
+    
+    assert seen == answer_ids
+    assert pages == 3
+
+
+def test_only_requested_fields_are_returned(lecturer, answered):
+    _, client = lecturer
+    url, answer_ids = answered
+    
+    page = client.get(url, query_string={"fields": "score,student", "limit": 1}).json
+    
+    (answer,) = page['answers']
+    assert set(answer) == {"id", "submission_id", "score", "student"}
+    assert answer['student']['username'].startswith("student")
+    assert page['question']['points'] == 2
+    assert page['next_after'] == answer_ids[0]
+
+
+@pytest.mark.parametrize("query", [{"limit": 0}, {"limit": 1000}, {"fields": "score,password_hash"}])
+def test_invalid_parameters_are_rejected(lecturer, answered, query):
+    _, client = lecturer
+    url, _ = answered
+    
+    assert client.get(url, query_string=query).status_code == 400
+
+
+def test_question_must_be_in_the_test(lecturer, answered):
+    _, client = lecturer
+    url, _ = answered
+    
+    assert client.get(url.replace("/questions/", "/questions/9")).status_code == 404
+
+
+def test_students_cannot_list_answers(make_user, login, answered):
+    url, _ = answered
+    
+    assert login(make_user()).get(url).status_code == 403
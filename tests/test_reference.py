@@ -0,0 +1,120 @@
+"""Reference solutions: calibrated per-case timeouts and precomputed expected outputs."""
+
+import time
+import pytest
+from server.services import code_executor, reference
+
+SQUARE = "n = int(input())\nprint(n * n)\n"
+CASES = [{"input": "3", "output": "9"}, {"input": "4", "output": "16"}]
+
+
+@pytest.fixture
+def question(make_test):
+    _, (question,) = make_test({"reference_solution": SQUARE, "test_cases": CASES, "points": 2})
+    return question
+
+
+def test_case_timeouts_are_clamped(monkeypatch):
+    monkeypatch.setattr(reference, "CODE_TIMEOUT", 2)
+    
+    timeouts = reference.case_timeouts([0.001, 0.1, 5.0, None])
+    
+    assert timeouts == [reference.CODE_TIMEOUT_FLOOR, 1.0, 2.0, 2.0]
+
+
+def test_calibration_times_every_case(question):
+    timings = reference.calibrate(question)
+    
+    assert len(timings) == 2
+    assert all(seconds is not None for seconds in timings)
+    assert question.reference_timings['cases'] == timings
+
+
+def test_calibration_is_reused_until_the_test_cases_change(question):
+    reference.calibrate(question)
+    first = question.reference_timings
+    
+    reference.calibrate(question)
+    assert question.reference_timings is first
+    
+    question.test_cases = CASES + [{"input": "5", "output": "25"}]
+    reference.calibrate(question)
+    assert question.reference_timings['key'] != first['key']
+    assert len(question.reference_timings['cases']) == 3
+
+
+def test_changed_reference_is_timed_again(question):
+    reference.calibrate(question)
+    key = question.reference_timings['key']
+    
+    question.reference_solution = "print(int(input()) ** 2)\n"
+    reference.calibrate(question)
+    
+    assert question.reference_timings['key'] != key
+
+
+def test_questions_without_reference_use_the_flat_timeout(make_test):
+    _, (question,) = make_test({"test_cases": CASES})
+    
+    assert reference.question_timeouts(question) is None
+    assert question.reference_timings is None
+
+
+def test_looping_answer_fails_within_the_calibrated_timeout(question):
+    timeouts = reference.question_timeouts(question)
+    
+    started = time.monotonic()
+    result = code_executor.execute_code("import time\ntime.sleep(30)\n", CASES, case_timeouts=timeouts)
+    
+    assert [test['timeout'] for test in result['test_results']] == timeouts
+    assert all(not test['passed'] for test in result['test_results'])
+    assert time.monotonic() - started < code_executor.CODE_TIMEOUT
+
+
+def test_reference_outputs_become_the_expected_outputs(make_test):
+    _, (question,) = make_test({
+        "reference_solution": (
+            "def pair(x):\n"
+            "    return (x, x * x)\n"
+            "\n"
+            "if __name__ == '__main__':\n"
+            "    print(int(input()) * 2)\n"
+        ),
+        "test_cases": [
+            {"input": "3"},
+            {"input": "4", "output": "9"},
+            {"function": "pair", "args": [2], "kwargs": {}}
+        ]
+    })
+    
+    expected = reference.refresh(question)
+    
+    assert [entry['output'] for entry in expected['cases']] == ["6", "8", [2, 4]]
+    assert expected['mismatches'] == [2]
+    assert expected['checksum']
+
+
+def test_only_changed_cases_are_run_again(question):
+    reference.refresh(question)
+    first = question.expected_outputs['checksum']
+    
+    question.test_cases = [CASES[0], {"input": "5"}, CASES[1]]
+    expected = reference.refresh(question)
+    
+    assert expected['recomputed'] == 1
+    assert [entry['output'] for entry in expected['cases']] == ["9", "25", "16"]
+    assert expected['checksum'] != first
+
+
+def test_answers_are_graded_against_the_reference(make_test):
+    _, (question,) = make_test({
+        "reference_solution": SQUARE,
+        "test_cases": [{"input": "3", "output": "10"}, {"input": "4"}]
+    })
+    
+    grade = code_executor.grade_code_submission(
+        SQUARE, question.test_cases, 2,
+        expected_outputs=reference.question_expected_outputs(question)
+    )
+    
+    assert grade['score'] == 2.0
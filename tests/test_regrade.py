@@ -0,0 +1,134 @@
+"""Stored per-test-case results and regrading of changed test cases."""
+
+import pytest
+from server.database import db_session
+from server.models import Answer, GradingJob
+from server.services import code_executor, grader, grading_queue
+
+SQUARE = "n = int(input())\nprint(n * n)\n"
+CASES = [{"input": "2", "output": "4"}, {"input": "3", "output": "9"}]
+# Loops forever on inputs starting with "slow"
+ECHO = "s = input()\nwhile s.startswith('slow'):\n    pass\nprint(s)\n"
+
+
+def echo_case(text):
+    return {"input": text, "output": text, "timeout": 0.5}
+
+
+@pytest.fixture
+def executions(monkeypatch):
+    """Number of test cases executed."""
+    count = [0]
+    real = code_executor.execute_code
+    
+    def execute_code(code, test_cases=None, *args, **kwargs):
+        count[0] += len(test_cases or [])
+        return real(code, test_cases, *args, **kwargs)
+    
+    monkeypatch.setattr(code_executor, "execute_code", execute_code)
+    return count
+
+
+@pytest.fixture
+def graded(make_test, make_user, make_submission):
+    """Answers to a code question, auto-graded once."""
+    def make(codes, **question):
+        test, (question,) = make_test(question)
+        for code in codes:
+            submission = make_submission(test, make_user(), {question: {"code": code}})
+            grader.auto_grade_code_answer(submission.answers[0], submission)
+        db_session.commit()
+        return question
+    
+    return make
+
+
+def regrade(question):
+    """Queue the answers to a question for regrading and run the queued jobs."""
+    summary = grading_queue.enqueue_question(question.id)
+    db_session.commit()
+    grading_queue.process_jobs(grading_queue.claim_jobs(10))
+    db_session.expire_all()
+    return summary
+
+
+def scores(question):
+    return sorted(answer.score for answer in db_session.query(Answer).filter_by(question_id=question.id))
+
+
+def test_only_new_test_cases_run(graded, executions):
+    question = graded([SQUARE, "print(int(input()) * 2)\n"], test_cases=CASES, points=6)
+    executions[0] = 0
+    assert scores(question) == [3.0, 6.0]
+    question.test_cases = CASES + [{"input": "4", "output": "16"}]
+    db_session.commit()
+    
+    assert regrade(question)['queued'] == 2
+    
+    assert executions[0] == 2
+    assert scores(question) == [2.0, 6.0]
+
+
+def test_changed_code_runs_every_case(graded, executions):
+    question = graded([SQUARE, "print(int(input()) * 2)\n"], test_cases=CASES, points=6)
+    executions[0] = 0
+    answer = db_session.query(Answer).filter_by(question_id=question.id, score=3.0).one()
+    answer.code = "print(int(input()) ** 2)\n"
+    db_session.commit()
+    
+    regrade(question)
+    
+    assert executions[0] == 2
+    assert scores(question) == [6.0, 6.0]
+
+
+def test_unchanged_question_runs_nothing(graded, executions):
+    question = graded([SQUARE, "print(int(input()) * 2)\n"], test_cases=CASES, points=6)
+    executions[0] = 0
+    
+    regrade(question)
+    
+    assert executions[0] == 0
+    assert scores(question) == [3.0, 6.0]
+
+
+def test_policy_applies_to_the_full_case_order(graded):
+    policy = {"max_consecutive_timeouts": 2}
+    question = graded([ECHO], test_cases=[echo_case("a"), echo_case("b")], points=5, grading_policy=policy)
+    # The new cases time out two at a time among themselves, but never twice in a row
+    question.test_cases = [echo_case("slow1"), echo_case("a"), echo_case("slow2"), echo_case("b"), echo_case("slow3")]
+    db_session.commit()
+    
+    regrade(question)
+    
+    answer = db_session.query(Answer).filter_by(question_id=question.id).one()
+    assert answer.score == 2.0
+    assert "consecutive" not in answer.feedback
+
+
+def test_policy_stop_in_stored_results_runs_nothing(graded, executions):
+    policy = {"max_consecutive_timeouts": 2}
+    cases = [echo_case("slow1"), echo_case("slow2"), echo_case("a")]
+    question = graded([ECHO], test_cases=cases, points=4, grading_policy=policy)
+    executions[0] = 0
+    question.test_cases = cases + [echo_case("b")]
+    db_session.commit()
+    
+    regrade(question)
+    
+    answer = db_session.query(Answer).filter_by(question_id=question.id).one()
+    assert executions[0] == 0
+    assert answer.score == 0.0
+    assert "stopped after 2 consecutive timeout(s)" in answer.feedback
+
+
+def test_regrade_endpoint_queues_submitted_answers(lecturer, graded):
+    _, client = lecturer
+    question_id = graded([SQUARE, "print(int(input()) * 2)\n"], test_cases=CASES, points=6).id
+    
+    response = client.post(f'/api/v1/grading/questions/{question_id}/regrade')
+    
+    assert response.status_code == 202
+    assert response.json == {"question_id": question_id, "queued": 2, "already_pending": 0, "finalized_submissions": []}
+    assert db_session.query(GradingJob).count() == 2
+    assert client.post(f'/api/v1/grading/questions/{question_id}/regrade').json['already_pending'] == 2
@@ -0,0 +1,156 @@
+"""Students running their code on their own input during a test."""
+
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from server.services import student_runs
+from shared.constants import SUBMISSION_STATUS_IN_PROGRESS, SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED
+
+SQUARE = "n = int(input())\nprint(n * n)\n"
+
+
+@pytest.fixture(autouse=True)
+def fresh_runs(monkeypatch):
+    """Forget rate limits and cached runs of earlier tests, whose user ids repeat."""
+    monkeypatch.setattr(student_runs, "_history", {})
+    monkeypatch.setattr(student_runs, "_results", student_runs.OrderedDict())
+
+
+@pytest.fixture
+def student(make_test, make_user, make_submission, login):
+    """A student's test in progress and a client logged in as them, returning (client, run URL)."""
+    def make(status=SUBMISSION_STATUS_IN_PROGRESS, question_type="code", **test_fields):
+        test, (question,) = make_test({"type": question_type, "test_cases": [{"input": "3", "output": "9"}]})
+        for name, value in test_fields.items():
+            setattr(test, name, value)
+        user = make_user()
+        submission = make_submission(test, user, {}, status=status)
+        url = f"/api/v1/submissions/{submission.id}/answers/{question.id}/run"
+        return login(user), url
+    
+    return make
+
+
+def test_run_returns_the_output(student):
+    client, url = student()
+    
+    response = client.post(url, json={"code": SQUARE, "input": "7"})
+    
+    assert response.status_code == 200
+    assert response.json['output'].strip() == "49"
+    assert response.json['cached'] is False
+
+
+def test_identical_runs_are_cached(student):
+    client, url = student()
+    client.post(url, json={"code": SQUARE, "input": "7"})
+    
+    response = client.post(url, json={"code": SQUARE, "input": "7"})
+    
+    assert response.json['cached'] is True
+
+
+def test_concurrent_identical_runs_share_one_execution(monkeypatch):
+    executions = []
+    real = student_runs._execute
+    
+    def execute(code, stdin):
+        executions.append(code)
+        return real(code, stdin)
+    
+    monkeypatch.setattr(student_runs, "_execute", execute)
+    code = "import time\ntime.sleep(0.5)\nprint('done')\n"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(student_runs.run(code))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(executions) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True]
+    assert all(result['output'].strip() == "done" for result, _ in results)
+
+
+def test_failed_run_is_reported_to_every_waiting_request_and_not_cached(monkeypatch):
+    started = threading.Event()
+    
+    def execute(code, stdin):
+        started.set()
+        time.sleep(0.2)
+        raise OSError("no executor")
+    
+    monkeypatch.setattr(student_runs, "_execute", execute)
+    results = []
+    owner = threading.Thread(target=lambda: results.append(student_runs.run(SQUARE, "2")))
+    owner.start()
+    started.wait()
+    results.append(student_runs.run(SQUARE, "2"))
+    owner.join()
+    
+    assert [result['error'] for result, _ in results] == ["Run failed: no executor"] * 2
+    assert student_runs.run_key(SQUARE, "2") not in student_runs._results
+
+
+def test_runs_are_rate_limited(student, monkeypatch):
+    monkeypatch.setattr(student_runs, "STUDENT_RUN_RATE", 2)
+    client, url = student()
+    for n in range(2):
+        assert client.post(url, json={"code": SQUARE, "input": str(n)}).status_code == 200
+    
+    response = client.post(url, json={"code": SQUARE, "input": "5"})
+    
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+
+def test_syntax_errors_do_not_count_against_the_limit(student, monkeypatch):
+    monkeypatch.setattr(student_runs, "STUDENT_RUN_RATE", 1)
+    client, url = student()
+    
+    response = client.post(url, json={"code": "print(", "input": ""})
+    
+    assert response.status_code == 200
+    assert response.json['success'] is False
+    assert client.post(url, json={"code": SQUARE, "input": "2"}).status_code == 200
+
+
+@pytest.mark.parametrize("status", [SUBMISSION_STATUS_SUBMITTED, SUBMISSION_STATUS_GRADED])
+def test_finished_submission_cannot_be_run(student, status):
+    client, url = student(status=status)
+    
+    response = client.post(url, json={"code": SQUARE, "input": "7"})
+    
+    assert response.status_code == 400
+    assert response.json['error'] == "Submission is not in progress"
+
+
+@pytest.mark.parametrize("window, error", [
+    ({"available_until": datetime.utcnow() - timedelta(minutes=1)}, "Test no longer available"),
+    ({"available_from": datetime.utcnow() + timedelta(hours=1)}, "Test not yet available")
+])
+def test_runs_are_limited_to_the_test_window(student, window, error):
+    client, url = student(**window)
+    
+    response = client.post(url, json={"code": SQUARE, "input": "7"})
+    
+    assert response.status_code == 400
+    assert response.json['error'] == error
+
+
+def test_only_code_questions_can_be_run(student):
+    client, url = student(question_type="text")
+    
+    response = client.post(url, json={"code": SQUARE, "input": "7"})
+    
+    assert response.status_code == 400
+
+
+def test_other_students_cannot_run_the_answer(student):
+    _, url = student()
+    other, _ = student()
+    
+    response = other.post(url, json={"code": SQUARE, "input": "7"})
+    
+    assert response.status_code == 403
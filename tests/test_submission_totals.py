@@ -0,0 +1,148 @@
+"""Running score totals of submissions."""
+
+import pytest
+from server.database import db_session
+from server import models
+from server.models import Answer, Submission
+from server.services import submission_totals
+from server.services.answer_key import score_submission
+from shared.constants import QUESTION_TYPE_MULTIPLE_CHOICE, QUESTION_TYPE_TEXT, SUBMISSION_STATUS_IN_PROGRESS
+
+
+@pytest.fixture
+def graded_test(make_test, make_user, make_submission):
+    """A test of three text questions worth 2, 3 and 5 points, and one submission answering all of them."""
+    test, questions = make_test(*({"type": QUESTION_TYPE_TEXT, "points": points} for points in (2, 3, 5)))
+    submission = make_submission(test, make_user(), {question: {"answer_text": "answer"} for question in questions})
+    answers = db_session.query(Answer).filter_by(submission_id=submission.id).order_by(Answer.question_id).all()
+    return test, submission, answers
+
+
+def totals(submission_id):
+    db_session.expire_all()
+    submission = db_session.get(Submission, submission_id)
+    return submission.total_score, submission.graded_count, submission.max_score
+
+
+def test_new_submission_knows_its_max_score(graded_test):
+    _, submission, _ = graded_test
+    
+    assert totals(submission.id) == (0.0, 0, 10.0)
+
+
+def test_set_score_adjusts_totals(graded_test):
+    _, submission, (first, second, third) = graded_test
+    
+    submission_totals.set_score(first, 2.0)
+    submission_totals.set_score(second, 1.5)
+    db_session.commit()
+    assert totals(submission.id) == (3.5, 2, 10.0)
+    
+    # Rescoring replaces the old score; unscoring removes it
+    submission_totals.set_score(second, 3.0)
+    submission_totals.set_score(first, None)
+    db_session.commit()
+    assert totals(submission.id) == (3.0, 1, 10.0)
+    
+    submission_totals.set_score(third, 0.0)
+    db_session.commit()
+    assert totals(submission.id) == (3.0, 2, 10.0)
+
+
+def test_recompute_agrees_with_running_totals(graded_test):
+    test, submission, (first, second, _) = graded_test
+    submission_totals.set_score(first, 2.0)
+    submission_totals.set_score(second, 2.5)
+    db_session.commit()
+    running = totals(submission.id)
+    
+    db_session.query(Submission).update({Submission.total_score: 0.0, Submission.graded_count: 0})
+    submission_totals.recompute(test.id)
+    db_session.commit()
+    
+    assert totals(submission.id) == running
+
+
+def test_answers_outside_the_test_do_not_count(graded_test, make_test):
+    test, submission, (first, _, _) = graded_test
+    _, (other,) = make_test({"type": QUESTION_TYPE_TEXT, "points": 4})
+    stray = Answer(submission_id=submission.id, question_id=other.id, answer_text="answer")
+    db_session.add(stray)
+    db_session.flush()
+    
+    submission_totals.set_score(first, 2.0)
+    submission_totals.set_score(stray, 4.0)
+    db_session.commit()
+    
+    assert totals(submission.id) == (2.0, 1, 10.0)
+    submission_totals.recompute(test.id)
+    db_session.commit()
+    assert totals(submission.id) == (2.0, 1, 10.0)
+
+
+def test_recompute_picks_up_changed_test_points(graded_test):
+    test, submission, (first, _, _) = graded_test
+    submission_totals.set_score(first, 2.0)
+    db_session.query(models.TestQuestion).filter_by(test_id=test.id, question_id=first.question_id).update(
+        {models.TestQuestion.points: 4.0}
+    )
+    
+    submission_totals.recompute(test.id)
+    db_session.commit()
+    
+    assert totals(submission.id) == (2.0, 1, 12.0)
+
+
+def test_grading_endpoints_update_totals(lecturer, graded_test):
+    _, submission, answers = graded_test
+    _, client = lecturer
+    submission_id, (first, second, third) = submission.id, [answer.id for answer in answers]
+    
+    response = client.put(f'/api/v1/grading/answers/{first}', json={"score": 2})
+    assert response.status_code == 200, response.json
+    response = client.put('/api/v1/grading/answers', json=[
+        {"answer_id": second, "score": 1},
+        {"answer_id": third, "score": 4, "feedback": "Almost"}
+    ])
+    assert response.status_code == 200, response.json
+    
+    assert totals(submission_id) == (7.0, 3, 10.0)
+
+
+def test_rejected_bulk_grades_leave_totals_alone(lecturer, graded_test):
+    _, submission, (first, second, _) = graded_test
+    _, client = lecturer
+    
+    response = client.put('/api/v1/grading/answers', json=[
+        {"answer_id": first.id, "score": 2},
+        {"answer_id": second.id, "score": 30}
+    ])
+    
+    assert response.status_code == 400
+    assert totals(submission.id) == (0.0, 0, 10.0)
+
+
+def test_lecturers_see_provisional_totals(lecturer, graded_test):
+    test, submission, (first, _, _) = graded_test
+    _, client = lecturer
+    submission_totals.set_score(first, 1.5)
+    db_session.commit()
+    
+    (listed,) = client.get(f'/api/v1/submissions?test_id={test.id}').json
+    
+    assert (listed['total_score'], listed['graded_count'], listed['max_score']) == (1.5, 1, 10.0)
+
+
+def test_multiple_choice_scoring_updates_totals(make_test, make_user, make_submission):
+    choices = ["red", "green", "blue"]
+    test, (right, wrong) = make_test(*({
+        "type": QUESTION_TYPE_MULTIPLE_CHOICE, "choices": choices, "correct_answer": "green", "points": 2
+    } for _ in range(2)))
+    submission = make_submission(test, make_user(), {
+        right: {"answer_text": "green"}, wrong: {"answer_text": "blue"}
+    }, status=SUBMISSION_STATUS_IN_PROGRESS)
+    
+    assert score_submission(submission) == 2
+    db_session.commit()
+    
+    assert totals(submission.id) == (2.0, 2, 4.0)
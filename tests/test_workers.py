@@ -0,0 +1,108 @@
+"""HTTP endpoints for standalone grading workers."""
+
+import pytest
+from server.app import app
+from server.database import db_session
+from server.models import Answer, GradingJob
+from server.routes import workers
+from server.services import code_executor, grading_cache, grading_queue
+from server.services.grading_worker import run_job
+from shared.constants import GRADING_JOB_STATUS_DONE
+
+TOKEN = "worker-secret"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client sending the worker token."""
+    monkeypatch.setattr(workers, "GRADING_WORKER_TOKEN", TOKEN)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {TOKEN}"
+    return client
+
+
+@pytest.fixture
+def queue(make_test, make_user, make_submission):
+    """Queue a grading job for each given answer to a code question worth 2 points."""
+    def make(*codes):
+        test, (question,) = make_test({"test_cases": [{"input": "3", "output": "9"}], "points": 2})
+        for code in codes:
+            grading_queue.enqueue_submission(make_submission(test, make_user(), {question: {"code": code}}))
+        db_session.commit()
+        return [job_id for (job_id,) in db_session.query(GradingJob.id).order_by(GradingJob.id)]
+    
+    return make
+
+
+def test_workers_are_disabled_without_a_token(queue):
+    queue("print(9)")
+    
+    response = app.test_client().post('/api/v1/workers/lease', json={"worker_id": "remote"})
+    
+    assert response.status_code == 403
+
+
+def test_wrong_token_is_rejected(client, queue):
+    queue("print(9)")
+    
+    response = client.post('/api/v1/workers/lease', json={"worker_id": "remote"},
+                           headers={"Authorization": "Bearer guess"})
+    
+    assert response.status_code == 401
+
+
+def test_leased_job_is_graded_from_the_reported_result(client, queue):
+    (job_id,) = queue("print(int(input()) ** 2)")
+    
+    (job,) = client.post('/api/v1/workers/lease', json={"worker_id": "remote", "limit": 4}).json['jobs']
+    response = client.post(f"/api/v1/workers/jobs/{job_id}/result", json={
+        "lease_token": job['lease_token'], "args_hash": job['args_hash'], "result": run_job(job)
+    })
+    
+    assert response.status_code == 200
+    assert response.json['status'] == GRADING_JOB_STATUS_DONE
+    assert db_session.get(Answer, db_session.get(GradingJob, job_id).answer_id).score == 2.0
+
+
+def test_cached_results_are_scored_without_leasing(client, queue, monkeypatch):
+    first, second = queue("print(int(input()) ** 2)", "print(int(input()) ** 2)")
+    (job,) = client.post('/api/v1/workers/lease', json={"worker_id": "remote", "limit": 1}).json['jobs']
+    client.post(f"/api/v1/workers/jobs/{first}/result", json={
+        "lease_token": job['lease_token'], "args_hash": job['args_hash'], "result": run_job(job)
+    })
+    hits = grading_cache.get_stats()['hits']
+    monkeypatch.setattr(code_executor, "execute_code", lambda *args, **kwargs: pytest.fail("executed"))
+    
+    response = client.post('/api/v1/workers/lease', json={"worker_id": "remote"})
+    
+    assert response.json['jobs'] == []
+    db_session.expire_all()
+    assert db_session.get(GradingJob, second).status == GRADING_JOB_STATUS_DONE
+    assert db_session.get(Answer, db_session.get(GradingJob, second).answer_id).score == 2.0
+    assert grading_cache.get_stats()['hits'] == hits + 1
+
+
+def test_answers_that_do_not_compile_are_not_leased(client, queue):
+    (job_id,) = queue("print(")
+    
+    response = client.post('/api/v1/workers/lease', json={"worker_id": "remote"})
+    
+    assert response.json['jobs'] == []
+    job = db_session.get(GradingJob, job_id)
+    assert job.status == GRADING_JOB_STATUS_DONE
+    assert db_session.get(Answer, job.answer_id).score == 0.0
+
+
+def test_result_for_a_changed_answer_is_requeued(client, queue):
+    (job_id,) = queue("print(int(input()) ** 2)")
+    (job,) = client.post('/api/v1/workers/lease', json={"worker_id": "remote"}).json['jobs']
+    answer_id = db_session.get(GradingJob, job_id).answer_id
+    db_session.get(Answer, answer_id).code = "print(int(input()) * 3)"
+    db_session.commit()
+    
+    response = client.post(f"/api/v1/workers/jobs/{job_id}/result", json={
+        "lease_token": job['lease_token'], "args_hash": job['args_hash'], "result": run_job(job)
+    })
+    
+    assert response.json['status'] == "requeued"
+    assert db_session.get(Answer, answer_id).score is None